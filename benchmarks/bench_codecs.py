@@ -0,0 +1,64 @@
+"""
+Compare persist/load time and archive size of the model archive codecs.
+
+Usage::
+
+    python benchmarks/bench_codecs.py [--repeat 3] [--codecs gzip zstd ...]
+"""
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+from fixtures import MODELS
+
+from h1st.model.repository.codec import CODECS
+from h1st.model.repository.model_repository import ModelRepository
+from h1st.model.repository.storage.local import LocalStorage
+
+
+def bench(model, codec, level, repeat):
+    persist_times, load_times = [], []
+    with tempfile.TemporaryDirectory() as path:
+        repo = ModelRepository(storage=LocalStorage(path), codec=codec, compresslevel=level)
+        for _ in range(repeat):
+            start = time.perf_counter()
+            version = repo.persist(model)
+            persist_times.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            repo.load(model.__class__(), version)
+            load_times.append(time.perf_counter() - start)
+
+        size = os.path.getsize(repo._storage._to_key(repo._get_key(model, version)))
+
+    return min(persist_times), min(load_times), size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--codecs', nargs='+', default=list(CODECS))
+    parser.add_argument('--level', type=int, default=None)
+    parser.add_argument('--models', nargs='+', default=list(MODELS))
+    args = parser.parse_args()
+    logging.getLogger('h1st').setLevel(logging.WARNING)
+
+    print(f"{'model':<16}{'codec':<8}{'persist (s)':>12}{'load (s)':>12}{'size (KB)':>12}")
+    for model_name in args.models:
+        model = MODELS[model_name]()
+        for codec in args.codecs:
+            if not CODECS[codec]().available():
+                print(f"{model_name:<16}{codec:<8}{'not installed':>36}")
+                continue
+
+            persist_time, load_time, size = bench(model, codec, args.level, args.repeat)
+            print(
+                f"{model_name:<16}{codec:<8}{persist_time:>12.3f}{load_time:>12.3f}"
+                f"{size / 2 ** 10:>12.1f}"
+            )
+
+
+if __name__ == '__main__':
+    main()
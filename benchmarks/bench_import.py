@@ -0,0 +1,66 @@
+"""
+Measure the import time and memory footprint of H1st modules, each in a fresh interpreter.
+
+Usage::
+
+    python benchmarks/bench_import.py [--repeat 5] [--modules h1st.model.model ...]
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+DEFAULT_MODULES = [
+    'h1st.model.model',
+    'h1st.model.rule_based_model',
+    'h1st.model.ml_model',
+    'h1st.model.repository.model_repository',
+    'h1st.h1flow.h1flow',
+]
+
+HEAVY_MODULES = ['tensorflow', 'sklearn', 'skfuzzy', 'shap', 'lime', 's3fs']
+
+SCRIPT = """
+import json, resource, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    'seconds': elapsed,
+    'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'heavy_modules': [m for m in {heavy} if m in sys.modules],
+}}))
+"""
+
+
+def measure(module, repeat):
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, '-c', SCRIPT.format(module=module, heavy=HEAVY_MODULES)],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+
+    return min(runs, key=lambda run: run['seconds'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--modules', nargs='+', default=DEFAULT_MODULES)
+    args = parser.parse_args()
+
+    print(f"{'module':<44}{'import (s)':>12}{'max RSS (MB)':>14}  heavy modules")
+    for module in args.modules:
+        run = measure(module, args.repeat)
+        print(
+            f"{module:<44}{run['seconds']:>12.3f}{run['max_rss_mb']:>14.1f}  "
+            f"{', '.join(run['heavy_modules']) or '-'}"
+        )
+
+
+if __name__ == '__main__':
+    main()
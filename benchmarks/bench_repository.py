@@ -0,0 +1,295 @@
+"""
+Time ModelRepository persist/load per phase against several storage backends.
+
+Each case persists and loads a representative model and records the wall time of
+``persist`` and ``load``, the time spent in each phase, the bytes written to and read
+from storage and the peak RSS of the process. Phases are timed exclusively, e.g. the
+uploads of blobs done while creating a manifest count as ``upload`` only, and are
+summed over threads, so with parallel (de)serialization they may add up to more than
+the wall time. Results are printed as JSON.
+
+Backends:
+
+- ``local``: ``LocalStorage`` in a temporary folder
+- ``memory``: fsspec's in-memory filesystem, an S3 stand-in without network
+- ``s3``: ``S3Storage`` against a local moto server, requires ``moto[server]``
+
+Usage::
+
+    python benchmarks/bench_repository.py [--models random_forest kswe ...]
+        [--backends local memory s3] [--repeat 3] [--dedup] [--output results.json]
+"""
+import argparse
+import contextlib
+import json
+import logging
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+import traceback
+import uuid
+from collections import defaultdict
+from unittest import mock
+
+from fixtures import MODELS
+
+from h1st.model.repository import model_repository
+from h1st.model.repository.model_repository import ModelRepository
+from h1st.model.repository.storage.fsspec_storage import FsspecStorage
+from h1st.model.repository.storage.local import LocalStorage
+
+BACKENDS = ['local', 'memory', 's3']
+
+PERSIST_PHASES = ['serialize', 'archive', 'upload']
+LOAD_PHASES = ['download', 'extract', 'deserialize']
+
+
+class PhaseTimer:
+    """
+    Accumulate the exclusive time and the bytes of instrumented calls per phase
+    """
+
+    def __init__(self):
+        self.seconds = defaultdict(float)
+        self.bytes = defaultdict(int)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def wrap(self, phase, func, count=None):
+        """
+        :param phase: name of the phase
+        :param func: function to time
+        :param count: function returning the number of bytes of a call from its
+            arguments and result
+        """
+        def timed(*args, **kwargs):
+            stack = self._local.__dict__.setdefault('stack', [])
+            active = self._local.__dict__.setdefault('active', set())
+            # e.g. get_bytes_many may call get_bytes, count the bytes once
+            outermost = phase not in active
+            active.add(phase)
+            stack.append(0.0)
+            start = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                nested = stack.pop()
+                if outermost:
+                    active.discard(phase)
+                if stack:
+                    stack[-1] += elapsed
+                with self._lock:
+                    self.seconds[phase] += elapsed - nested
+            if count is not None and outermost:
+                with self._lock:
+                    self.bytes[phase] += count(args, result)
+            return result
+
+        return timed
+
+    def reset(self):
+        self.seconds.clear()
+        self.bytes.clear()
+
+
+class RSSMonitor:
+    """
+    Sample the resident set size of the process in a background thread
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.peak = current_rss()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+
+def current_rss():
+    """
+    Return the resident set size of the process in bytes
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        # no procfs, fall back to the peak RSS of the whole process
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+
+@contextlib.contextmanager
+def moto_endpoint():
+    from moto.server import ThreadedMotoServer
+
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    server = ThreadedMotoServer(port=0, verbose=False)
+    server.start()
+    try:
+        host, port = server.get_host_and_port()
+        yield f'http://{host}:{port}'
+    finally:
+        server.stop()
+
+
+@contextlib.contextmanager
+def open_storage(backend, s3_endpoint=None):
+    """
+    Create an empty storage of a backend and remove its content on exit
+    """
+    if backend == 'local':
+        with tempfile.TemporaryDirectory() as path:
+            yield LocalStorage(path)
+    elif backend == 'memory':
+        storage = FsspecStorage(f'memory://bench-{uuid.uuid4().hex}')
+        try:
+            yield storage
+        finally:
+            if storage.fs.exists(storage.root):
+                storage.fs.rm(storage.root, recursive=True)
+    elif backend == 's3':
+        from h1st.model.repository.storage.s3 import S3Storage
+
+        bucket = f'bench-{uuid.uuid4().hex[:12]}'
+        storage = S3Storage(
+            bucket, 'models', storage_options={'client_kwargs': {'endpoint_url': s3_endpoint}}
+        )
+        storage.fs.mkdir(bucket)
+        yield storage
+    else:
+        raise ValueError(f'Unsupported backend {backend}, available backends are: {BACKENDS}')
+
+
+@contextlib.contextmanager
+def instrument(repo, timer):
+    """
+    Time the phases of persist and load of ``repo`` and make it the default repository
+    """
+    storage = repo._storage
+    with contextlib.ExitStack() as stack:
+        # composite models, e.g. KSWE, persist their components with the default repository
+        stack.enter_context(mock.patch.object(ModelRepository, 'MODEL_REPO', repo, create=True))
+        patch = lambda target, name, phase, count=None: stack.enter_context(
+            mock.patch.object(target, name, timer.wrap(phase, getattr(target, name), count))
+        )
+        patch(repo._serder, 'serialize', 'serialize')
+        patch(repo._serder, 'deserialize', 'deserialize')
+        patch(model_repository, '_tar_create', 'archive')
+        patch(model_repository, '_tar_extract', 'extract')
+        patch(repo, '_create_manifest', 'archive')
+        patch(repo, '_extract_manifest', 'extract')
+        patch(storage, 'set_bytes', 'upload', lambda args, result: len(args[1]))
+        patch(storage, 'get_bytes', 'download', lambda args, result: len(result))
+        patch(
+            storage,
+            'get_bytes_many',
+            'download',
+            lambda args, result: sum(len(value) for value in result),
+        )
+        yield
+
+
+def bench(model_name, model, backend, args, s3_endpoint=None):
+    """
+    Persist and load ``model`` ``args.repeat`` times and return the fastest runs
+    """
+    timer = PhaseTimer()
+    results = {'persist': None, 'load': None}
+    with open_storage(backend, s3_endpoint) as storage:
+        repo = ModelRepository(storage=storage, codec=args.codec, dedup=args.dedup)
+        with instrument(repo, timer):
+            for _ in range(args.repeat):
+                for operation in ['persist', 'load']:
+                    timer.reset()
+                    with RSSMonitor() as rss:
+                        baseline = rss.peak
+                        start = time.perf_counter()
+                        if operation == 'persist':
+                            version = model.persist()
+                        else:
+                            model.__class__().load(version)
+                        elapsed = time.perf_counter() - start
+
+                    phases = PERSIST_PHASES if operation == 'persist' else LOAD_PHASES
+                    run = {
+                        'seconds': elapsed,
+                        'phases': {phase: timer.seconds[phase] for phase in phases},
+                        'bytes_written' if operation == 'persist' else 'bytes_read': (
+                            timer.bytes['upload' if operation == 'persist' else 'download']
+                        ),
+                        'peak_rss_mb': rss.peak / 2 ** 20,
+                        'rss_increase_mb': (rss.peak - baseline) / 2 ** 20,
+                    }
+                    if results[operation] is None or elapsed < results[operation]['seconds']:
+                        results[operation] = run
+
+    return {
+        'model': model_name,
+        'backend': backend,
+        'codec': args.codec,
+        'dedup': args.dedup,
+        **results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--models', nargs='+', default=list(MODELS))
+    parser.add_argument('--backends', nargs='+', default=BACKENDS, choices=BACKENDS)
+    parser.add_argument('--codec', default='gzip')
+    parser.add_argument('--dedup', action='store_true')
+    parser.add_argument('--output', help='file to write the JSON results to')
+    args = parser.parse_args()
+    logging.getLogger('h1st').setLevel(logging.WARNING)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    results = []
+    with contextlib.ExitStack() as stack:
+        s3_endpoint = stack.enter_context(moto_endpoint()) if 's3' in args.backends else None
+        for model_name in args.models:
+            try:
+                model = MODELS[model_name]()
+            except Exception as ex:
+                results.append({'model': model_name, 'error': f'build failed: {ex!r}'})
+                continue
+
+            for backend in args.backends:
+                print(f'{model_name} on {backend} ...', file=sys.stderr)
+                try:
+                    results.append(bench(model_name, model, backend, args, s3_endpoint))
+                except Exception as ex:
+                    traceback.print_exc()
+                    results.append({'model': model_name, 'backend': backend, 'error': repr(ex)})
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+"""
+Representative H1st models used by the benchmark scripts.
+"""
+import numpy as np
+import pandas as pd
+from sklearn.datasets import make_classification
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import train_test_split
+
+from h1st.model.ml_model import MLModel
+from h1st.model.kswe import KSWEModeler
+from h1st.model.fuzzy import (
+    FuzzyModeler,
+    FuzzyRules,
+    FuzzyVariables,
+    FuzzyMembership as fm,
+)
+
+
+class RandomForestModel(MLModel):
+    def predict(self, input_data):
+        return {'predictions': self.base_model.predict(input_data['X'])}
+
+
+class KerasModel(MLModel):
+    def __init__(self):
+        # the architecture is created before loading the weights
+        self.base_model = self.get_model_arch()
+
+    @staticmethod
+    def get_model_arch(n_features=20, width=512):
+        import tensorflow as tf
+
+        return tf.keras.Sequential([
+            tf.keras.Input(shape=(n_features,)),
+            tf.keras.layers.Dense(width, activation='relu'),
+            tf.keras.layers.Dense(width, activation='relu'),
+            tf.keras.layers.Dense(1, activation='sigmoid'),
+        ])
+
+    def predict(self, input_data):
+        return {'predictions': self.base_model.predict(input_data['X'], verbose=0)}
+
+
+class DictModel(MLModel):
+    def predict(self, input_data):
+        return {
+            'predictions': {
+                name: model.predict(input_data['X'])
+                for name, model in self.base_model.items()
+            }
+        }
+
+
+def make_data(n_samples=20000, n_features=20, random_state=0):
+    X, y = make_classification(
+        n_samples=n_samples,
+        n_features=n_features,
+        n_informative=10,
+        random_state=random_state,
+    )
+    return {'X': X, 'y': y}
+
+
+def build_random_forest_model(n_estimators=200, data=None):
+    data = data or make_data()
+    model = RandomForestModel()
+    model.base_model = RandomForestClassifier(
+        n_estimators=n_estimators, random_state=0, n_jobs=-1
+    ).fit(data['X'], data['y'])
+    model.stats = {'feature_means': data['X'].mean(axis=0)}
+    model.metrics = {'accuracy': 1.0}
+    return model
+
+
+def build_dict_model(n_models=50, data=None):
+    data = data or make_data(n_samples=2000)
+    model = DictModel()
+    model.base_model = {
+        f'segment_{i}': LogisticRegression(max_iter=200).fit(data['X'], data['y'])
+        for i in range(n_models)
+    }
+    return model
+
+
+def build_fuzzy_model():
+    variables = FuzzyVariables()
+    for name in ['var1', 'var2']:
+        variables.add(
+            var_name=name,
+            var_type='antecedent',
+            var_range=np.arange(0, 10, 0.5),
+            membership_funcs=[
+                ('normal', fm.GAUSSIAN, [3, 3.3]),
+                ('abnormal', fm.TRIANGLE, [8, 15, 15]),
+            ],
+        )
+    variables.add(
+        var_name='conclusion1',
+        var_type='consequent',
+        var_range=np.arange(0, 10, 0.5),
+        membership_funcs=[
+            ('no', fm.TRAPEZOID, [0, 0, 4, 6]),
+            ('yes', fm.TRAPEZOID, [4, 6, 10, 10]),
+        ],
+    )
+
+    rules = FuzzyRules()
+    rules.add(
+        rule_name='rule1',
+        if_term=variables.get('var1')['abnormal'] & variables.get('var2')['abnormal'],
+        then_term=variables.get('conclusion1')['yes'],
+    )
+    rules.add(
+        rule_name='rule2',
+        if_term=variables.get('var1')['normal'],
+        then_term=variables.get('conclusion1')['no'],
+    )
+    return FuzzyModeler().build_model(variables, rules)
+
+
+def build_kswe_model(n_bins=4):
+    X, y = make_classification(
+        n_samples=6000, n_features=8, n_informative=5, random_state=0
+    )
+    X = pd.DataFrame(X, columns=[f'f{i}' for i in range(X.shape[1])])
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, pd.Series(y), test_size=0.4, random_state=0
+    )
+    features = ['f0', 'f1', 'f2']
+    return KSWEModeler().build_model(
+        input_data={
+            'X_train': X_train,
+            'y_train': y_train,
+            'X_test': X_test,
+            'y_test': y_test,
+        },
+        segmentation_config={
+            'min_segment_size': 50,
+            'features': features,
+            'n_bins': {feature: n_bins for feature in features},
+        },
+    )
+
+
+def build_keras_model(data=None):
+    data = data or make_data(n_samples=2000)
+    model = KerasModel()
+    model.base_model.compile(loss='binary_crossentropy', optimizer='adam')
+    model.base_model.fit(data['X'], data['y'], epochs=1, verbose=0)
+    return model
+
+
+MODELS = {
+    'random_forest': build_random_forest_model,
+    'dict_of_models': build_dict_model,
+    'fuzzy': build_fuzzy_model,
+    'kswe': build_kswe_model,
+    'keras': build_keras_model,
+}
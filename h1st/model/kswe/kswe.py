@@ -1,6 +1,6 @@
 from datetime import datetime
 import logging
-from typing import Dict, List
+from typing import Dict
 import ulid
 
 import numpy as np
@@ -8,6 +8,7 @@ import pandas as pd
 
 from h1st.model.predictive_model import PredictiveModel
 from h1st.model.model import Model
+from h1st.model.repository.model_repository import ModelRepository
 
 
 class KSWE(PredictiveModel):
@@ -56,35 +57,43 @@ class KSWE(PredictiveModel):
             now_str = now.strftime('%Y%m%d-%H%M')
             version = f'{str(ulid.new())[:4]}-{now_str}'
 
-        self.stats['version'] = version
-        self.stats['ensemble_version'] = self.ensemble.persist(version+'_ensemble')
-        self.stats['ensemble_class'] = self.ensemble.__class__
-        self.stats['segmentor_version'] = self.segmentor.persist(version+'_segmentor')
-        self.stats['segmentor_class'] = self.segmentor.__class__
-
-        sub_model_info = {}
-        for name, sub_model in self.sub_models.items():
-            v = sub_model.persist(version+f'_{name}')
-            sub_model_info[name] = {'version': v, 'model_class': sub_model.__class__}
-        self.stats['sub_model_info'] = sub_model_info
-        super().persist(version)
+        # ensemble, segmentor and sub models are stored in the archive of this version
+        repo = ModelRepository.get_model_repo(self)
+        with repo.bundle(self, version) as bundle:
+            self.stats['version'] = version
+            self.stats['ensemble_version'] = self.ensemble.persist(version+'_ensemble')
+            self.stats['ensemble_class'] = self.ensemble.__class__
+            self.stats['segmentor_version'] = self.segmentor.persist(version+'_segmentor')
+            self.stats['segmentor_class'] = self.segmentor.__class__
+
+            names = list(self.sub_models.keys())
+            versions = bundle.map(
+                lambda name: self.sub_models[name].persist(version+f'_{name}'), names
+            )
+            sub_model_info = {}
+            for name, v in zip(names, versions):
+                sub_model_info[name] = {'version': v, 'model_class': self.sub_models[name].__class__}
+            self.stats['sub_model_info'] = sub_model_info
+            super().persist(version)
         return version
 
     def load(self, version: str=None) -> None:
-        super().load(version)
-        ensemble_class = self.stats['ensemble_class']
-        ensemble_version = self.stats['ensemble_version']
-        self.ensemble = ensemble_class().load(ensemble_version)
-
-        segmentor_class = self.stats['segmentor_class']
-        segmentor_version = self.stats['segmentor_version']
-        self.segmentor = segmentor_class().load(segmentor_version)
-
-        sub_models = {}
-        for name, info in self.stats['sub_model_info'].items():
-            sub_model = info['model_class']().load(info['version'])
-            sub_models[name] = sub_model
-        self.sub_models = sub_models
+        repo = ModelRepository.get_model_repo(self)
+        with repo.open_bundle(self, version) as bundle:
+            super().load(bundle.version)
+            ensemble_class = self.stats['ensemble_class']
+            ensemble_version = self.stats['ensemble_version']
+            self.ensemble = ensemble_class().load(ensemble_version)
+
+            segmentor_class = self.stats['segmentor_class']
+            segmentor_version = self.stats['segmentor_version']
+            self.segmentor = segmentor_class().load(segmentor_version)
+
+            infos = self.stats['sub_model_info']
+            sub_models = bundle.map(
+                lambda info: info['model_class']().load(info['version']), infos.values()
+            )
+            self.sub_models = dict(zip(infos.keys(), sub_models))
         return self
 
     # Make it backward compatible.
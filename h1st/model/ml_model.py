@@ -1,6 +1,7 @@
 from typing import Any
 
 from .predictive_model import PredictiveModel
+from .repository.lazy import resolve_attr
 
 
 class MLModel(PredictiveModel):
@@ -66,7 +67,7 @@ class MLModel(PredictiveModel):
 
     @property
     def base_model(self) -> Any:
-        return getattr(self, "__base_model", None)
+        return resolve_attr(self, "__base_model")
 
     @base_model.setter
     def base_model(self, value):
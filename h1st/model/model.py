@@ -1,9 +1,14 @@
+from concurrent.futures import Future
 from typing import Any, Dict
 
+import ulid
+
 from h1st.h1flow.h1step_containable import NodeContainable
 from h1st.trust.trustable import Trustable
 
+from h1st.model.repository.background import snapshot_model
 from h1st.model.repository.model_repository import ModelRepository
+from h1st.model.repository.lazy import resolve_attr
 from h1st.model.modeler import Modelable
 
 
@@ -47,7 +52,7 @@ class Model(NodeContainable, Trustable, Modelable):
     ## TODO: Need a better naming and the definition of the property
     @property
     def stats(self):
-        return getattr(self, "__stats__", None)
+        return resolve_attr(self, "__stats__")
 
     @stats.setter
     def stats(self, value) -> Dict:
@@ -57,13 +62,13 @@ class Model(NodeContainable, Trustable, Modelable):
     def metrics(self):
         if not hasattr(self, "__metrics__"):
             setattr(self, "__metrics__", {})
-        return getattr(self, "__metrics__")
+        return resolve_attr(self, "__metrics__")
 
     @metrics.setter
     def metrics(self, value) -> Dict:
         setattr(self, "__metrics__", value)
 
-    def persist(self, version=None) -> str:
+    def persist(self, version=None, base_version=None) -> str:
         """
         Persist this model's properties to the ModelRepository. Currently, only `stats`, `metrics`, `model` properties are supported.
 
@@ -71,10 +76,32 @@ class Model(NodeContainable, Trustable, Modelable):
         Currently, only sklearn and tensorflow-keras are supported.
 
         :param version: model version, leave blank for autogeneration
+        :param base_version: a previous version, e.g. `latest`, to persist a delta of,
+            see `ModelRepository.persist`
         :returns: model version
         """
         repo = ModelRepository.get_model_repo(self)
-        return repo.persist(model=self, version=version)
+        return repo.persist(model=self, version=version, base_version=base_version)
+
+    def persist_async(self, version=None, base_version=None) -> Future:
+        """
+        Persist this model in the background, see `ModelRepository.persist_async`.
+
+        `persist` runs on a snapshot of this model, so models overriding `persist` are
+        saved the same way. Do not modify atomic models in place until the returned
+        future is done. `version` is set to the new version right away.
+
+        :param version: model version, leave blank for autogeneration
+        :param base_version: a previous version to persist a delta of, only passed to
+            `persist` when set so that models overriding it without this argument work
+        :returns: a `concurrent.futures.Future` of the model version
+        """
+        repo = ModelRepository.get_model_repo(self)
+        version = version or str(ulid.new())
+        kwargs = {} if base_version is None else {"base_version": base_version}
+        future = repo.submit(snapshot_model(self).persist, version, **kwargs)
+        self.version = version
+        return future
 
     def load(self, version: str = None) -> Any:
         """
@@ -55,11 +55,10 @@ end Note
 @enduml
 """
 
-import logging
 from typing import Dict, List
 import pandas as pd
-from h1st.model.ensemble.stack_ensemble import StackEnsemble
 from h1st.model.predictive_model import PredictiveModel
+from h1st.model.repository.model_repository import ModelRepository
 
 
 class Oracle(PredictiveModel):
@@ -144,44 +143,51 @@ class Oracle(PredictiveModel):
         """
         persist all pieces of oracle and store versions & classes
         """
-        model_details = {}
-        version = self.ensembler.persist(version)
-        model_details['ensembler_class'] = self.ensembler.__class__
-        model_details['ensembler_version'] = version
-
-        student_classes = []
-        student_versions = []
-        for student in self.students:
-            version = student.persist(version)
-            student_classes.append(student.__class__)
-            student_versions.append(version)
-
-        model_details['student_classes'] = student_classes
-        model_details['student_versions'] = student_versions
-        model_details['teacher_class'] = self.teacher.__class__
-        model_details['teacher_version'] = self.teacher.persist(version)
-        self.stats['model_details'] =  model_details
-
-        super().persist(version)
+        # all pieces are stored in the archive of the oracle version
+        repo = ModelRepository.get_model_repo(self)
+        with repo.bundle(self, version) as bundle:
+            version = bundle.version
+            model_details = {}
+            version = self.ensembler.persist(version)
+            model_details['ensembler_class'] = self.ensembler.__class__
+            model_details['ensembler_version'] = version
+
+            student_classes = []
+            student_versions = []
+            for student in self.students:
+                version = student.persist(version)
+                student_classes.append(student.__class__)
+                student_versions.append(version)
+
+            model_details['student_classes'] = student_classes
+            model_details['student_versions'] = student_versions
+            model_details['teacher_class'] = self.teacher.__class__
+            model_details['teacher_version'] = self.teacher.persist(version)
+            self.stats['model_details'] =  model_details
+
+            super().persist(version)
         return version
 
     def load(self, version: str = None) -> None:
         """
         load all pieces of oracle, return complete oracle
         """
-        super().load(version)
-        info = self.stats['model_details']
-        ensembler = info['ensembler_class']().load(
-            info['ensembler_version']
-        )
-        teacher = info['teacher_class']().load(
-            info['teacher_version']
-        )
-
-        students = []
-        for sclass, sversion in zip(info['student_classes'],
-                                    info['student_versions']):
-            students.append(sclass().load(sversion))
+        repo = ModelRepository.get_model_repo(self)
+        with repo.open_bundle(self, version) as bundle:
+            super().load(bundle.version)
+            info = self.stats['model_details']
+            ensembler = info['ensembler_class']().load(
+                info['ensembler_version']
+            )
+            teacher = info['teacher_class']().load(
+                info['teacher_version']
+            )
+
+            students = bundle.map(
+                lambda sclass, sversion: sclass().load(sversion),
+                info['student_classes'],
+                info['student_versions'],
+            )
 
         self.ensembler = ensembler
         self.students = students
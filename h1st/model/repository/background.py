@@ -0,0 +1,110 @@
+import copy
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+
+import ulid
+
+from h1st.model.repository.cache import _clone_state
+
+logger = logging.getLogger(__name__)
+
+
+def snapshot_model(model):
+    """
+    Return a copy of a model whose property dicts and lists can be modified freely
+    """
+    clone = copy.copy(model)
+    clone.__dict__.update(_clone_state(model.__dict__))
+    return clone
+
+
+class AsyncPersistMixin:
+    """
+    Background persists of ``ModelRepository``
+    """
+
+    def persist_async(self, model, version=None, base_version=None):
+        """
+        Save a model to the model repository in the background
+
+        The model is snapshotted before returning: its properties and their lists and
+        dicts are copied, but atomic models are shared with the snapshot, so do not
+        modify them in place until the future is done. ``model.version`` is set to the
+        new version right away.
+
+        :param model: target model
+        :param version: version name, leave blank for autogeneration
+        :param base_version: a previous version to persist a delta of, see ``persist``
+        :returns: a ``concurrent.futures.Future`` of the model version
+        """
+        version = version or str(ulid.new())
+        future = self.submit(self.persist, snapshot_model(model), version, base_version)
+        model.version = version
+        return future
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Run a persist function on the background pool of ``persist_async``
+
+        Blocks while ``max_pending`` calls are queued or running. Inside a bundle,
+        ``func`` runs immediately so that it is written with the bundle.
+
+        :returns: a ``concurrent.futures.Future`` of the result of ``func``
+        """
+        if self._get_bundle() is not None:
+            future = Future()
+            try:
+                future.set_result(func(*args, **kwargs))
+            except Exception as ex:
+                future.set_exception(ex)
+            return future
+
+        self._pending_slots.acquire()
+        try:
+            with self._pending_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self._async_workers, thread_name_prefix="h1st-persist"
+                    )
+                future = self._executor.submit(func, *args, **kwargs)
+                self._pending.add(future)
+        except BaseException:
+            self._pending_slots.release()
+            raise
+
+        future.add_done_callback(self._on_persisted)
+        return future
+
+    def _on_persisted(self, future):
+        with self._pending_lock:
+            self._pending.discard(future)
+        self._pending_slots.release()
+
+        if future.exception() is not None:
+            logger.error("Background persist failed: %s" % future.exception())
+
+    def flush(self, timeout=None):
+        """
+        Wait for all background persists
+
+        :param timeout: maximum number of seconds to wait, leave blank to wait until done
+        :raises: the exception of the first failed persist, ``TimeoutError`` if some
+            persists are still running after ``timeout``
+        """
+        pending, not_done = self._wait_pending(timeout)
+        if not_done:
+            raise TimeoutError(f"{len(not_done)} persists are still running")
+
+        for future in pending:
+            if future.exception() is not None:
+                raise future.exception()
+
+    def _wait_pending(self, timeout=None):
+        """
+        Wait for the background persists submitted so far, returns them along with the
+        ones still running after ``timeout``
+        """
+        with self._pending_lock:
+            pending = list(self._pending)
+
+        return pending, wait(pending, timeout=timeout).not_done
@@ -0,0 +1,113 @@
+import copy
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+
+class ModelCache:
+    """
+    Thread-safe LRU cache of deserialized model states.
+
+    Entries are keyed by the repository key of a model, i.e. its class and resolved
+    version, and hold the persisted attributes of the model instance right after it
+    was deserialized. The cache is bounded by the number of entries and by their
+    total size, as estimated by the caller, e.g. the size of the extracted files. On a hit the state is applied to the target model as a cheap clone:
+    lists and dicts are copied but the atomic models they contain are shared between
+    all loaded instances, so they must be treated as read-only.
+    """
+
+    def __init__(self, maxsize: int = 32, max_bytes: Optional[int] = None):
+        """
+        :param maxsize: maximum number of model versions kept in memory
+        :param max_bytes: maximum total size of the cached versions, leave blank for
+            no limit. Versions larger than this are not cached.
+        """
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._states = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict]:
+        """
+        Return a clone of the cached state or None if the key is not cached
+
+        :param key: repository key of the model version
+        """
+        with self._lock:
+            state = self._states.get(key)
+            if state is None:
+                self.misses += 1
+                return None
+
+            self._states.move_to_end(key)
+            self.hits += 1
+
+        return _clone_state(state)
+
+    def put(self, key: str, state: Dict, nbytes: int = 0) -> None:
+        """
+        Cache a model state, evicting the least recently used entries when full
+
+        :param key: repository key of the model version
+        :param state: persisted attributes of the model
+        :param nbytes: estimated size of the state
+        """
+        with self._lock:
+            self._discard(key)
+            if self.max_bytes is not None and nbytes > self.max_bytes:
+                return
+
+            self._states[key] = _clone_state(state)
+            self._sizes[key] = nbytes
+            self.nbytes += nbytes
+            while len(self._states) > self.maxsize or (
+                self.max_bytes is not None and self.nbytes > self.max_bytes
+            ):
+                self._discard(next(iter(self._states)))
+                self.evictions += 1
+
+    def invalidate(self, key: str) -> None:
+        """
+        Drop a cached model version
+        """
+        with self._lock:
+            self._discard(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._states.clear()
+            self._sizes.clear()
+            self.nbytes = 0
+
+    def info(self) -> Dict:
+        """
+        Return hit/miss metrics of the cache
+        """
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / requests if requests else 0.0,
+                "size": len(self._states),
+                "maxsize": self.maxsize,
+                "bytes": self.nbytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    def _discard(self, key):
+        if self._states.pop(key, None) is not None:
+            self.nbytes -= self._sizes.pop(key)
+
+
+def _clone_state(state):
+    return {
+        name: copy.copy(value) if isinstance(value, (dict, list)) else value
+        for name, value in state.items()
+    }
@@ -0,0 +1,164 @@
+import gzip
+import lzma
+import importlib
+from typing import BinaryIO, Optional
+
+
+class Codec:
+    """
+    Base class for the compression codecs used by model archives.
+
+    A codec wraps a binary file object into a compressing writer or a
+    decompressing reader. Codecs are recognized on load by the magic bytes
+    at the beginning of the archive, so the reader does not need to know how
+    an archive was written.
+    """
+
+    name = None
+    magic = b""
+    module = None
+
+    def __init__(self, level: Optional[int] = None):
+        self.level = level
+
+    def available(self) -> bool:
+        """
+        Return true if the libraries needed by this codec are installed
+        """
+        if self.module is None:
+            return True
+
+        try:
+            importlib.import_module(self.module)
+            return True
+        except ImportError:
+            return False
+
+    def open(self, fileobj: BinaryIO, mode: str) -> BinaryIO:
+        """
+        Wrap ``fileobj`` into a (de)compressing file object
+
+        :param fileobj: underlying binary file object
+        :param mode: ``rb`` or ``wb``
+        """
+        raise NotImplementedError()
+
+
+class NoneCodec(Codec):
+    """
+    Plain tar archive without compression
+    """
+
+    name = "none"
+
+    def open(self, fileobj, mode):
+        return _Unclosable(fileobj)
+
+
+class GzipCodec(Codec):
+    name = "gzip"
+    magic = b"\x1f\x8b"
+
+    def open(self, fileobj, mode):
+        level = 9 if self.level is None else self.level
+        return gzip.GzipFile(fileobj=fileobj, mode=mode, compresslevel=level)
+
+
+class XzCodec(Codec):
+    name = "xz"
+    magic = b"\xfd7zXZ\x00"
+
+    def open(self, fileobj, mode):
+        if "w" in mode:
+            return lzma.LZMAFile(fileobj, mode, preset=self.level)
+        return lzma.LZMAFile(fileobj, mode)
+
+
+class ZstdCodec(Codec):
+    name = "zstd"
+    magic = b"\x28\xb5\x2f\xfd"
+    module = "zstandard"
+
+    def open(self, fileobj, mode):
+        import zstandard
+
+        if "w" in mode:
+            level = 3 if self.level is None else self.level
+            compressor = zstandard.ZstdCompressor(level=level, threads=-1)
+            return compressor.stream_writer(fileobj, closefd=False)
+        return zstandard.ZstdDecompressor().stream_reader(fileobj, closefd=False)
+
+
+class Lz4Codec(Codec):
+    name = "lz4"
+    magic = b"\x04\x22\x4d\x18"
+    module = "lz4"
+
+    def open(self, fileobj, mode):
+        import lz4.frame
+
+        if "w" in mode:
+            level = 0 if self.level is None else self.level
+            return lz4.frame.LZ4FrameFile(fileobj, mode, compression_level=level)
+        return lz4.frame.LZ4FrameFile(fileobj, mode)
+
+
+class _Unclosable:
+    """
+    Pass-through file wrapper which leaves the underlying file open on close
+    """
+
+    def __init__(self, fileobj):
+        self._fileobj = fileobj
+
+    def __getattr__(self, name):
+        return getattr(self._fileobj, name)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+CODECS = {
+    codec.name: codec for codec in [NoneCodec, GzipCodec, XzCodec, ZstdCodec, Lz4Codec]
+}
+
+MAGIC_SIZE = max(len(codec.magic) for codec in CODECS.values())
+
+
+def get_codec(name: str = "gzip", level: Optional[int] = None) -> Codec:
+    """
+    Create a codec by name
+
+    :param name: one of ``none``, ``gzip``, ``xz``, ``zstd`` and ``lz4``
+    :param level: compression level, leave blank for the codec's default
+    """
+    name = name or "none"
+    if name not in CODECS:
+        raise ValueError(
+            f"Unsupported codec {name}, available codecs are: {', '.join(CODECS)}"
+        )
+
+    codec = CODECS[name](level)
+    if not codec.available():
+        raise ImportError(
+            f"The {name} codec requires the {codec.module} package to be installed"
+        )
+
+    return codec
+
+
+def detect_codec(header: bytes) -> Codec:
+    """
+    Return the codec of an archive from its first bytes
+    """
+    for codec_class in CODECS.values():
+        if codec_class.magic and header.startswith(codec_class.magic):
+            return get_codec(codec_class.name)
+
+    return NoneCodec()
@@ -1,4 +1,6 @@
 import os
+import ast
+import json
 import importlib
 import pathlib
 import inspect
@@ -9,9 +11,13 @@ import logging
 from concurrent.futures import ProcessPoolExecutor
 from h1st.core.context import discover_h1st_project
 from h1st.model.model import Model
+from h1st.model.repository.storage.utils import atomic_open
 
 logger = logging.getLogger(__name__)
 MODEL_FILE_NAME = re.compile(r"^[^_].*_(classifier|detector|model).py$")
+MODEL_CLASS = "h1st.model.model.Model"
+PARAM_TYPES = {"str", "int", "float"}
+CACHE_VERSION = 1
 
 
 def _discover_module(data):
@@ -71,24 +77,268 @@ def _discover_module(data):
     return result
 
 
+def _analyze_module(filename, module_name):
+    """
+    Return the top-level classes and imports of a module without importing it
+    """
+    with open(filename, "rb") as f:
+        tree = ast.parse(f.read(), filename=str(filename))
+
+    package = module_name.rpartition(".")[0]
+    if os.path.basename(filename) == "__init__.py" and not module_name.endswith(".__init__"):
+        package = module_name
+
+    imports, classes = {}, {}
+    for node in _iter_top_level(tree.body):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                if alias.asname:
+                    imports[alias.asname] = alias.name
+                else:
+                    name = alias.name.split(".")[0]
+                    imports[name] = name
+        elif isinstance(node, ast.ImportFrom):
+            module = node.module or ""
+            if node.level:
+                parent = package.split(".")[:len(package.split(".")) - node.level + 1]
+                module = ".".join(part for part in parent + [module] if part)
+            for alias in node.names:
+                if alias.name != "*":
+                    imports[alias.asname or alias.name] = f"{module}.{alias.name}"
+        elif isinstance(node, ast.ClassDef):
+            init = next(
+                (
+                    item for item in node.body
+                    if isinstance(item, ast.FunctionDef) and item.name == "__init__"
+                ),
+                None,
+            )
+            classes[node.name] = {
+                "bases": [_get_dotted_name(base) for base in node.bases],
+                "params": _get_params(init) if init is not None else None,
+            }
+
+    return {"imports": imports, "classes": classes}
+
+
+def _iter_top_level(body):
+    # classes and imports guarded by if/try blocks are defined at module level too
+    for node in body:
+        if isinstance(node, (ast.If, ast.Try)):
+            yield from _iter_top_level(node.body)
+            yield from _iter_top_level(node.orelse)
+            for handler in getattr(node, "handlers", []):
+                yield from _iter_top_level(handler.body)
+            yield from _iter_top_level(getattr(node, "finalbody", []))
+        else:
+            yield node
+
+
+def _get_dotted_name(node):
+    if isinstance(node, ast.Subscript):  # e.g. Generic[T]
+        node = node.value
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        value = _get_dotted_name(node.value)
+        return f"{value}.{node.attr}" if value else None
+    return None
+
+
+def _get_params(init):
+    """
+    Return the parameters of an ``__init__`` definition like ``inspect.signature`` of
+    the class does, i.e. without ``self``
+    """
+    args = init.args
+    positional = args.posonlyargs + args.args
+    defaults = [None] * (len(positional) - len(args.defaults)) + args.defaults
+    arguments = list(zip(positional, defaults))[1:]
+    if args.vararg:
+        arguments.append((args.vararg, None))
+    arguments += list(zip(args.kwonlyargs, args.kw_defaults))
+    if args.kwarg:
+        arguments.append((args.kwarg, None))
+
+    params = []
+    for arg, default in arguments:
+        annotation = arg.annotation
+        params.append({
+            "name": arg.arg,
+            "default": _literal(default),
+            # to be filled by UI later
+            "type": annotation.id if isinstance(annotation, ast.Name)
+            and annotation.id in PARAM_TYPES else None,
+            "min": None,
+            "max": None,
+            "choice": [],
+        })
+    return params
+
+
+def _literal(node):
+    if node is None:
+        return None
+    try:
+        value = ast.literal_eval(node)
+        json.dumps(value)
+        return value
+    except (ValueError, TypeError, SyntaxError):
+        # not a JSON literal, e.g. a call or a set
+        return None
+
+
+class _StaticResolver:
+    """
+    Resolve the base classes of the project's classes through the source of the
+    project and of h1st, to find the subclasses of ``Model`` without importing them
+    """
+
+    def __init__(self, search_paths, cache):
+        """
+        :param search_paths: list of (top-level package name or None, folder) where
+            the modules are looked up, None for any top-level module of the folder
+        :param cache: dict of the analysis of files keyed by path
+        """
+        self.search_paths = search_paths
+        self.cache = cache
+        self._modules = {}
+        self._models = {MODEL_CLASS: True}
+
+    def get_module(self, module_name):
+        if module_name not in self._modules:
+            filename = self._find_module(module_name)
+            self._modules[module_name] = (
+                self.analyze(filename, module_name) if filename else None
+            )
+        return self._modules[module_name]
+
+    def analyze(self, filename, module_name):
+        filename = str(filename)
+        mtime = os.path.getmtime(filename)
+        entry = self.cache.get(filename)
+        if entry is None or entry["mtime"] != mtime or entry["module"] != module_name:
+            try:
+                analysis = _analyze_module(filename, module_name)
+            except (SyntaxError, ValueError, OSError):
+                logger.exception(f"Unable to parse module {module_name}")
+                analysis = {"imports": {}, "classes": {}}
+            entry = {"mtime": mtime, "module": module_name, "analysis": analysis}
+            self.cache[filename] = entry
+
+        self._modules[module_name] = entry["analysis"]
+        return entry["analysis"]
+
+    def is_model(self, qualname):
+        """
+        Return true if the fully qualified class name is a subclass of ``Model``
+        """
+        if qualname not in self._models:
+            self._models[qualname] = False  # guard against cyclic definitions
+            definition = self.get_class(qualname)
+            if definition is not None:
+                module_name, cls = definition
+                self._models[qualname] = any(
+                    self.is_model(base) for base in self.get_bases(module_name, cls)
+                )
+        return self._models[qualname]
+
+    def get_params(self, qualname, seen=()):
+        """
+        Return the constructor parameters of a class, inherited from its first base
+        defining ``__init__``
+        """
+        definition = self.get_class(qualname)
+        if definition is None or qualname in seen:
+            return []
+
+        module_name, cls = definition
+        if cls["params"] is not None:
+            return cls["params"]
+        for base in self.get_bases(module_name, cls):
+            params = self.get_params(base, seen + (qualname,))
+            if params:
+                return params
+        return []
+
+    def get_bases(self, module_name, cls):
+        return [
+            self.qualify(module_name, base) for base in cls["bases"] if base is not None
+        ]
+
+    def qualify(self, module_name, dotted_name):
+        """
+        Return the fully qualified name of a name used in a module
+        """
+        head, _, tail = dotted_name.partition(".")
+        module = self.get_module(module_name) or {"imports": {}, "classes": {}}
+        if head in module["classes"]:
+            qualname = f"{module_name}.{head}"
+        else:
+            qualname = module["imports"].get(head, head)
+        return f"{qualname}.{tail}" if tail else qualname
+
+    def get_class(self, qualname, depth=0):
+        """
+        Return the module name and the definition of a class, following re-exports
+        """
+        module_name, _, name = qualname.rpartition(".")
+        module = self.get_module(module_name) if module_name else None
+        if module is None or depth > 10:
+            return None
+        if name in module["classes"]:
+            return module_name, module["classes"][name]
+        if name in module["imports"]:
+            return self.get_class(module["imports"][name], depth + 1)
+        return None
+
+    def _find_module(self, module_name):
+        parts = module_name.split(".")
+        for top_level, folder in self.search_paths:
+            if top_level is not None and parts[0] != top_level:
+                continue
+            path = pathlib.Path(folder, *parts)
+            for filename in [path.with_suffix(".py"), path / "__init__.py"]:
+                if filename.is_file():
+                    return filename
+        return None
+
+
 class ModelExplorer:
     """
     Utility class to discover model class in a project
     """
 
-    def __init__(self, cwd=None):
+    def __init__(self, cwd=None, mode="static", cache_path=None):
+        """
+        :param cwd: folder of the project, leave blank for the current directory
+        :param mode: ``static`` parses the model files to find the subclasses of
+            ``Model`` they define without importing anything. ``import`` imports each
+            model module in a pool of processes, which is much slower but also finds
+            classes created dynamically, and the model classes they import.
+        :param cache_path: file caching the parsed model files in static mode, keyed by
+            path and modification time so unchanged files are not parsed again. Leave
+            blank for ``.h1st/model_discovery.json`` in the project folder, set to
+            ``False`` to disable the cache.
+        """
+        if mode not in ("static", "import"):
+            raise ValueError(f"Unsupported discovery mode {mode}, use static or import")
+
         self.cwd = cwd
+        self.mode = mode
+        self.cache_path = cache_path
 
     def discover_models(self):
         project_root, _ = discover_h1st_project(self.cwd)
         if not project_root:
             project_root = os.getcwd()
 
-        if project_root not in sys.path:
-            sys.path.append(str(project_root))
-
         project_root = pathlib.Path(project_root)
-        model_files = []
+        if self.mode == "static":
+            return self._discover_static(project_root)
+
+        if str(project_root) not in sys.path:
+            sys.path.append(str(project_root))
 
         if (project_root / "__init__.py").exists():
             sys.path.append(str(project_root.parent))
@@ -100,6 +350,61 @@ class ModelExplorer:
         else:
             package_root = ""
 
+        result = {}
+        with ProcessPoolExecutor(max_workers=4) as pool:
+            for res in pool.map(
+                _discover_module, self._find_model_files(project_root, package_root)
+            ):
+                result.update(res)
+
+        return result
+
+    def _discover_static(self, project_root):
+        package_root = project_root.name if (project_root / "__init__.py").exists() else ""
+        cache_path = self.cache_path
+        if cache_path is None:
+            cache_path = project_root / ".h1st" / "model_discovery.json"
+
+        cache = self._read_cache(cache_path) if cache_path else {}
+        resolver = _StaticResolver(
+            [
+                (package_root, project_root.parent) if package_root else (None, project_root),
+                # h1st/model/model.py
+                ("h1st", pathlib.Path(inspect.getfile(Model)).parents[2]),
+            ],
+            cache,
+        )
+
+        result = {}
+        for module_name, filename in self._find_model_files(project_root, package_root):
+            module = resolver.analyze(filename, module_name)
+            for name in module["classes"]:
+                fullname = f"{module_name}.{name}"
+                if not resolver.is_model(fullname):
+                    continue
+
+                params = resolver.get_params(fullname)
+                result[fullname] = {
+                    'id': fullname,
+                    'name': name,
+                    'tunable': len(params) > 0,
+                    'last_modified': os.path.getmtime(filename),
+                    'filename': filename,
+                    'hyperparameters': params,
+                    # to be fillled by UI
+                    'selected_metric': None,
+                    'options': {},
+                }
+
+        if cache_path:
+            self._write_cache(cache_path, cache)
+        return result
+
+    def _find_model_files(self, project_root, package_root):
+        """
+        Return the module name and path of the files of a project which may define models
+        """
+        model_files = []
         for f in project_root.glob("*.py"):
             if MODEL_FILE_NAME.match(f.name):
                 model_files.append(f)
@@ -117,12 +422,22 @@ class ModelExplorer:
 
             model_files[i] = (model_package, model_file)
 
-        result = {}
-        with ProcessPoolExecutor(max_workers=4) as pool:
-            for res in pool.map(_discover_module, model_files):
-                result.update(res)
+        return model_files
 
-        return result
+    def _read_cache(self, cache_path):
+        try:
+            with open(cache_path) as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return cache["files"] if cache.get("version") == CACHE_VERSION else {}
+
+    def _write_cache(self, cache_path, files):
+        try:
+            with atomic_open(str(cache_path)) as f:
+                f.write(json.dumps({"version": CACHE_VERSION, "files": files}).encode())
+        except OSError:
+            logger.warning(f"Unable to write the model discovery cache {cache_path}")
 
 
 if __name__ == "__main__":
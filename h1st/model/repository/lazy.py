@@ -0,0 +1,98 @@
+import threading
+from typing import Any, Callable
+
+
+class LazyValue:
+    """
+    Placeholder of a model component which is deserialized on first use.
+
+    The loader runs at most once, even when several threads access the component
+    concurrently.
+    """
+
+    def __init__(self, loader: Callable[[], Any]):
+        self._loader = loader
+        self._value = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def get(self) -> Any:
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self._value = self._loader()
+                    self._loaded = True
+                    self._loader = None
+
+        return self._value
+
+
+class LazyDict(dict):
+    """
+    Dict of model components whose values are deserialized on first access
+
+    Copies made with ``copy.copy`` keep the values that were not accessed yet lazy,
+    while ``dict(d)``, ``{**d}``, pickling and deep copies resolve them.
+    """
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        if isinstance(value, LazyValue):
+            value = value.get()
+            super().__setitem__(key, value)
+        return value
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def pop(self, key, *args):
+        return resolve(super().pop(key, *args))
+
+    def values(self):
+        return [self[key] for key in self]
+
+    def items(self):
+        return [(key, self[key]) for key in self]
+
+    def __iter__(self):
+        # dict(d) and {**d} only read the values through __getitem__ when the subclass
+        # overrides __iter__, otherwise they copy the raw lazy values
+        return iter(dict.keys(self))
+
+    def keys(self):
+        return dict.keys(self)
+
+    def copy(self):
+        return self.__copy__()
+
+    def __copy__(self):
+        clone = LazyDict()
+        dict.update(clone, super().items())
+        return clone
+
+    def __reduce__(self):
+        return LazyDict, (dict(self.items()),)
+
+
+def resolve(value: Any) -> Any:
+    """
+    Return the deserialized value of a possibly lazy component
+    """
+    if isinstance(value, LazyValue):
+        return value.get()
+    return value
+
+
+def resolve_attr(obj: Any, name: str, default: Any = None) -> Any:
+    """
+    Return an attribute of ``obj``, replacing a lazy value with its deserialized value
+    """
+    value = getattr(obj, name, default)
+    if isinstance(value, LazyValue):
+        value = value.get()
+        setattr(obj, name, value)
+    return value
@@ -0,0 +1,147 @@
+import io
+import os
+import json
+import shutil
+import hashlib
+import logging
+import functools
+
+from h1st.model.repository.codec import MAGIC_SIZE, detect_codec, get_codec
+from h1st.model.repository.storage.base import SEP
+
+MANIFEST_HEADER = b"h1st-manifest/1\n"
+logger = logging.getLogger(__name__)
+
+
+class ManifestMixin:
+    """
+    Content-addressed layout of ``ModelRepository``: the files of a version are
+    stored once under their SHA-256 digest in the ``_blobs`` namespace and the version
+    itself is a manifest of digests
+    """
+
+    def _get_base_digests(self, model, base_version):
+        """
+        Return the digests of the files of a version stored as a manifest, mapped to
+        the codec of their blob when it is recorded
+        """
+        if base_version == "latest":
+            base_version = self._latest.resolve(self._get_key(model, "latest"))
+
+        data = self._storage.get_bytes(self._get_key(model, base_version))
+        if not data.startswith(MANIFEST_HEADER):
+            logger.info(
+                "Base version %s is an archive, all files are checked for existence"
+                % base_version
+            )
+            return {}
+
+        manifest = json.loads(data[len(MANIFEST_HEADER):])
+        return {info["digest"]: info.get("codec") for info in manifest["files"].values()}
+
+    def _create_manifest(self, serialized_dir, known_digests=None):
+        """
+        Upload the files of a serialized model as content-addressed blobs
+
+        :param known_digests: digests of blobs known to be stored, e.g. the files of a
+            base version, which are not checked for existence, mapped to the codec of
+            the blob if known
+        :returns: manifest listing the digest of each file
+        """
+        paths = [
+            os.path.join(root, name)
+            for root, _, names in os.walk(serialized_dir)
+            for name in names
+        ]
+        digests = self._serder._map(_file_digest, paths)
+        known_digests = known_digests or {}
+        exists = {self._get_blob_key(d): True for d in known_digests}
+        blob_keys = list(dict.fromkeys(
+            self._get_blob_key(d) for d in digests if d not in known_digests
+        ))
+        exists.update(zip(blob_keys, self._storage.exists_many(blob_keys)))
+
+        uploads = {}
+        for path, digest in zip(paths, digests):
+            blob_key = self._get_blob_key(digest)
+            if not exists[blob_key]:
+                uploads.setdefault(blob_key, path)
+
+        def file_info(path, digest):
+            info = {"digest": digest, "size": os.path.getsize(path)}
+            # blobs stored by earlier persists may use another codec, which is
+            # detected on load if the base version does not record it
+            if self._get_blob_key(digest) in uploads:
+                info["codec"] = self._codec.name
+            elif known_digests.get(digest):
+                info["codec"] = known_digests[digest]
+            return info
+
+        logger.info(
+            "Uploading %d of %d files, the others are already stored"
+            % (len(uploads), len(paths))
+        )
+        self._serder._map(self._upload_blob, uploads.values(), uploads.keys())
+
+        manifest = {
+            "files": {
+                os.path.relpath(path, serialized_dir).replace(os.sep, "/"): file_info(
+                    path, digest
+                )
+                for path, digest in zip(paths, digests)
+            },
+        }
+        return MANIFEST_HEADER + json.dumps(manifest, indent=1).encode()
+
+    def _extract_manifest(self, data, target):
+        manifest = json.loads(data[len(MANIFEST_HEADER):])
+        for rel_path in manifest["files"]:
+            path = os.path.abspath(os.path.join(target, rel_path))
+            if os.path.commonpath([os.path.abspath(target), path]) != os.path.abspath(target):
+                raise ValueError("Attempted Path Traversal in Manifest")
+
+        files = manifest["files"]
+        blob_keys = list(dict.fromkeys(
+            self._get_blob_key(info["digest"]) for info in files.values()
+        ))
+        blobs = dict(zip(blob_keys, self._storage.get_bytes_many(blob_keys)))
+        self._serder._map(
+            self._write_blob,
+            [blobs[self._get_blob_key(info["digest"])] for info in files.values()],
+            [os.path.join(target, rel_path) for rel_path in files],
+            [info.get("codec") for info in files.values()],
+        )
+
+    def _upload_blob(self, path, blob_key):
+        buffer = io.BytesIO()
+        with open(path, "rb") as f, self._codec.open(buffer, "wb") as cf:
+            shutil.copyfileobj(f, cf)
+        self._storage.set_bytes(blob_key, buffer.getvalue())
+
+    def _write_blob(self, blob, path, codec=None):
+        """
+        Decompress a blob into ``path``
+
+        :param codec: name of the codec of the blob, leave blank to detect it
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        codec = get_codec(codec) if codec else detect_codec(blob[:MAGIC_SIZE])
+        buffer = io.BytesIO(blob)
+        with codec.open(buffer, "rb") as cf, open(path, "wb") as f:
+            shutil.copyfileobj(cf, f)
+
+    def _get_blob_key(self, digest):
+        return f"{self._get_blob_namespace()}{SEP}{digest[:2]}{SEP}{digest}"
+
+    def _get_blob_namespace(self):
+        if self._NAMESPACE:
+            return f"{self._NAMESPACE}{SEP}_blobs"
+        return "_blobs"
+
+
+def _file_digest(path):
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(functools.partial(f.read, 1024 * 1024), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
@@ -1,388 +1,89 @@
 import os
+import json
+import time
+import hashlib
+import shutil
 import tarfile
 import tempfile
 import logging
 import importlib
-from distutils import dir_util
+import atexit
+import functools
+import threading
+import contextlib
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 
-import yaml
 import ulid
-import joblib
-import skfuzzy
-import tensorflow
-import sklearn
 
+from h1st.model.repository.background import AsyncPersistMixin
+from h1st.model.repository.cache import ModelCache
+from h1st.model.repository.manifest import MANIFEST_HEADER, ManifestMixin
+from h1st.model.repository.resolver import LatestResolver, LatestWatcher
+from h1st.model.repository.serde import ModelSerDe
+from h1st.model.repository.shared import SharedModelStore
+from h1st.model.repository.versions import VERSION_INDEX, VersionIndexMixin
+from h1st.model.repository.codec import MAGIC_SIZE, detect_codec, get_codec
 from h1st.model.repository.storage.s3 import S3Storage
 from h1st.model.repository.storage.local import LocalStorage
+from h1st.model.repository.storage.fsspec_storage import FsspecStorage
+from h1st.model.repository.storage.base import SEP
 
-SEP = "::"
+BUNDLE_REF_HEADER = b"h1st-bundle-ref/1\n"
+BUNDLE_COMPONENTS = "components"
 logger = logging.getLogger(__name__)
 
 
-class ModelSerDe:
-    STATS_PATH = "stats.joblib"
-    METRICS_PATH = "metrics.joblib"
-    RULE_DETAILS_PATH = "rule_details.joblib"
-    RULE_ENGINE_PATH = "rule_engine.joblib"
-    METAINFO_FILE = "METAINFO.yaml"
+_ACTIVE_BUNDLE = contextvars.ContextVar("h1st_model_bundle", default=None)
 
-    def _is_builtin_class_instance(self, obj):
-        return (
-            obj.__class__.__module__ == "builtins"
-            or obj.__class__.__module__ == "__builtin__"
-        )
-
-    def _serialize_basic_obj(self, d, path, obj_file):
-        joblib.dump(d, os.path.join(path, obj_file))
-
-    def _deserialize_basic_obj(self, path, obj_file):
-        return joblib.load(os.path.join(path, obj_file))
-
-    def _serialize_dict(self, d, path, dict_file):
-        joblib.dump(d, path + "/%s" % dict_file)
-
-    def _deserialize_dict(self, path, dict_file):
-        return joblib.load(path + "/%s" % dict_file)
-
-    def _get_rule_engine_type(self, rules):
-        if isinstance(rules, skfuzzy.control.ControlSystemSimulation) or isinstance(
-            rules, skfuzzy.control.controlsystem.ControlSystemSimulation
-        ):
-            return "skfuzzy"
-        else:
-            return "custom"
-
-    def _get_model_type(self, model):
-        if isinstance(model, sklearn.base.BaseEstimator):
-            return "sklearn"
-        if isinstance(model, tensorflow.keras.Model):
-            return "tensorflow-keras"
-        if model is None:
-            return "custom"
-
-    def _get_supported_rule_engines(self):
-        return set(["skfuzzy"])
-
-    def _serialize_rule_engine(self, rules, path, rules_name="rules"):
-        rule_engine_type = self._get_rule_engine_type(rules)
 
-        if rule_engine_type == "skfuzzy":
-            rules_path = "%s.joblib" % rules_name
-            joblib.dump(rules, path + "/%s" % rules_path)
-        else:
-            raise ValueError("Unsupported model!!!")
-
-        return rule_engine_type, rules_path
+class _Bundle:
+    """
+    Folder of a composite model version opened with ``ModelRepository.bundle`` or
+    ``ModelRepository.open_bundle``
+    """
 
-    def _deserialize_rule_engine(self, model, path, rule_engine_type, rules_path):
-        if rule_engine_type == "skfuzzy":
-            model = joblib.load(path + "/%s" % rules_path)
-        else:
-            model = joblib.load(path + "/%s" % rules_path)
-
-        return model
-
-    def _serialize_single_model(self, model, path, model_name="model"):
-        model_type = self._get_model_type(model)
-
-        if model_type == "sklearn":
-            model_path = "%s.joblib" % model_name
-            joblib.dump(model, path + "/%s" % model_path)
-        elif model_type == "tensorflow-keras":
-            model_path = model_name
-            os.makedirs(path + "/%s" % model_path, exist_ok=True)
-            model.save_weights(path + "/%s/weights" % model_path)
-        elif model_type == "custom":
-            model_path = model_name  # XXX
-        else:
-            raise ValueError("Unsupported model!!!")
-
-        return model_type, model_path
-
-    def _deserialize_single_model(self, model, path, model_type, model_path):
-        if model_type == "sklearn":
-            # This is a sklearn model
-            model = joblib.load(path + "/%s" % model_path)
-            # print(str(type(model)))
-        elif model_type == "tensorflow-keras":
-            model.load_weights(path + "/%s/weights" % model_path).expect_partial()
-        elif model_type == "custom":
-            model = None
-
-        return model
-
-    def serialize(self, model, path):
-        """
-        Serialize a H1ST model's model property to disk.
-
-        :param model: H1ST Model
-        :param path: path to save models to
-        """
-        from h1st.model.ml_model import MLModel
-        from h1st.model.rule_based_model import RuleBasedModel
-
-        meta_info = {}
-
-        if model.metrics:
-            logger.info("Saving metrics property...")
-            meta_info["metrics"] = self.METRICS_PATH
-            self._serialize_dict(model.metrics, path, self.METRICS_PATH)
-
-        if model.stats is not None:
-            logger.info("Saving stats property...")
-            meta_info["stats"] = self.STATS_PATH
-            self._serialize_dict(model.stats, path, self.STATS_PATH)
-
-        if isinstance(model, MLModel):
-            if model.base_model:
-                logger.info("Saving model property...")
-                if type(model.base_model) == list:
-                    meta_info["models"] = []
-                    for i, model in enumerate(model.base_model):
-                        model_type, model_path = self._serialize_single_model(
-                            model, path, "model_%d" % i
-                        )
-                        meta_info["models"].append(
-                            {"model_type": model_type, "model_path": model_path}
-                        )
-                elif type(model.base_model) == dict:
-                    meta_info["models"] = {}
-                    for k, model in model.base_model.items():
-                        model_type, model_path = self._serialize_single_model(
-                            model, path, "model_%s" % k
-                        )
-                        meta_info["models"][k] = {
-                            "model_type": model_type,
-                            "model_path": model_path,
-                        }
-                else:
-                    # this is a single model
-                    model_type, model_path = self._serialize_single_model(
-                        model.base_model, path
-                    )
-                    meta_info["models"] = [
-                        {"model_type": model_type, "model_path": model_path}
-                    ]
-            else:
-                logger.error(".base_model was not assigned.")
-
-        elif isinstance(model, RuleBasedModel):
-
-            if model.rule_details is not None:
-                logger.info("Saving rule_details property...")
-                meta_info["rule_details"] = self.RULE_DETAILS_PATH
-                self._serialize_dict(model.rule_details, path, self.RULE_DETAILS_PATH)
-
-            if model.rule_engine is not None:
-                logger.info("Saving rule_engine property...")
-                if type(model.rule_engine) in self._get_supported_rule_engines():
-                    rule_engine_type, rules_path = self._serialize_rule_engine(
-                        model.rule_engine, path
-                    )
-                    meta_info["rule_engine"] = [
-                        {"rules_type": rule_engine_type, "rules_path": rules_path}
-                    ]
-                elif (
-                    type(model.rule_engine) == list
-                    and type(model.rule_engine[0]) in self._get_supported_rule_engines()
-                ):
-                    meta_info["rule_engine"] = []
-                    for i, rules in enumerate(model.rule_engine):
-                        rule_engine_type, rules_path = self._serialize_rule_engine(
-                            rules, path, f"rules_{i}"
-                        )
-                        meta_info["rule_engine"].append(
-                            {"rules_type": rule_engine_type, "rules_path": rules_path}
-                        )
-                elif (
-                    type(model.rule_engine) == dict
-                    and type(list(model.rule_engine.values())[0])
-                    in self._get_supported_rule_engines()
-                ):
-                    meta_info["rule_engine"] = {}
-                    for key, rules in model.rule_engine.items():
-                        rule_engine_type, rules_path = self._serialize_rule_engine(
-                            rules, path, f"rules_{i}"
-                        )
-                        meta_info["rule_engine"][key] = {
-                            "rules_type": rule_engine_type,
-                            "rules_path": rules_path,
-                        }
-                elif self._is_builtin_class_instance(model.rule_engine):
-                    self._serialize_basic_obj(
-                        model.rule_engine, path, self.RULE_ENGINE_PATH
-                    )
-                    meta_info["rule_engine"] = {
-                        "rules_type": type(model.rule_engine),
-                        "rule_path": self.RULE_ENGINE_PATH,
-                    }
-                else:
-                    logging.warn(
-                        (
-                            "This rule engine is custom, so may not work well with "
-                            "joblib which is the python package that we use to persist rules."
-                        )
-                    )
-                    self._serialize_basic_obj(
-                        model.rule_engine, path, self.RULE_ENGINE_PATH
-                    )
-                    meta_info["rule_engine"] = {
-                        "rules_type": type(model.rule_engine),
-                        "rule_path": self.RULE_ENGINE_PATH,
-                    }
-
-            else:
-                logger.warning(".rule_engine was not assigned.")
-
-        elif hasattr(model, "base_model"):
-            logger.warning(
-                (
-                    "Your .base_model will not be persisted. "
-                    "If you want to persist your .base_model, "
-                    "must inherit from h1st.MLModel."
-                )
-            )
+    def __init__(self, repository, path, root_key, version, components=None):
+        """
+        :param components: list the (model, version) of the components persisted into
+            the bundle are appended to, shared by nested bundles
+        """
+        self.repository = repository
+        self.path = path
+        self.root_key = root_key
+        self.version = version
+        self.components = [] if components is None else components
 
-        elif hasattr(model, "rules"):
-            logger.warning(
-                (
-                    "Your .rules will not be persisted. "
-                    "If you want to persist your .rules, "
-                    "must inherit from h1st.RuleBasedModel."
-                )
-            )
+    def is_root(self, model):
+        return self.repository._get_key(model, self.version) == self.root_key
 
-        if len(meta_info) == 0:
-            logger.info(
-                "Model persistence currently supports only stats, "
-                "model and metrics properties."
-            )
-            logger.info(
-                "Make sure you store stastistic in stats property, "
-                "models in model property and model metrics in metrics one."
-            )
+    def get_path(self, key):
+        """
+        Return the folder of a model version in the bundle
+        """
+        if key == self.root_key:
+            return self.path
 
-        with open(os.path.join(path, self.METAINFO_FILE), "w") as file:
-            yaml.dump(meta_info, file)
+        key = key.replace("/", "_").replace("..", "__").replace(SEP, "/")
+        return os.path.join(self.path, BUNDLE_COMPONENTS, key)
 
-    def deserialize(self, model, path):
+    def map(self, func, *iterables):
         """
-        Populate a H1ST model's model property with saved atomic models.
-
-        :param model: H1ST Model
-        :param path: path to model folder
+        Apply ``func`` over the iterables in a thread pool which keeps the bundle
+        active, e.g. to persist or load components concurrently
         """
-        # Read METAINFO
-        with open(os.path.join(path, self.METAINFO_FILE), "r") as file:
-            meta_info = yaml.load(file, Loader=yaml.Loader)
+        args = list(zip(*iterables))
+        if self.repository._serder.max_workers == 1 or len(args) <= 1:
+            return [func(*arg) for arg in args]
 
-        if "metrics" in meta_info.keys():
-            model.metrics = self._deserialize_dict(path, self.METRICS_PATH)
+        with ThreadPoolExecutor(max_workers=self.repository._serder.max_workers) as pool:
+            futures = [
+                pool.submit(contextvars.copy_context().run, func, *arg) for arg in args
+            ]
+            return [future.result() for future in futures]
 
-        if "stats" in meta_info.keys():
-            model.stats = self._deserialize_dict(path, self.STATS_PATH)
 
-        if "models" in meta_info.keys():
-            model_infos = meta_info["models"]
-            org_model = model.base_model  # original model object from Model class
-            if type(model_infos) == list:
-                if len(model_infos) == 1:
-                    # Single model
-                    model_info = model_infos[0]
-                    # print(model_info)
-                    model_type = model_info["model_type"]
-                    model_path = model_info["model_path"]
-                    model.base_model = self._deserialize_single_model(
-                        org_model, path, model_type, model_path
-                    )
-                else:
-                    # A list of models
-                    model.base_model = []
-                    org_model = org_model or [None for _ in range(len(model_infos))]
-                    for i, model_info in enumerate(model_infos):
-                        model_type = model_info["model_type"]
-                        model_path = model_info["model_path"]
-                        model.base_model.append(
-                            self._deserialize_single_model(
-                                org_model[i], path, model_type, model_path
-                            )
-                        )
-
-            elif type(model_infos) == dict:
-                # A dict of models
-                model.base_model = {}
-                org_model = org_model or {k: None for k in model_infos.keys()}
-                for model_name, model_info in model_infos.items():
-                    model_type = model_info["model_type"]
-                    model_path = model_info["model_path"]
-                    model.base_model[model_name] = self._deserialize_single_model(
-                        org_model[model_name], path, model_type, model_path
-                    )
-            else:
-                raise ValueError("Not a valid H1ST Model METAINFO file!")
-
-        if "rule_details" in meta_info.keys():
-            model.rule_details = self._deserialize_dict(path, self.RULE_DETAILS_PATH)
-
-        if "rule_engine" in meta_info.keys():
-            rules_infos = meta_info["rule_engine"]
-            org_rules = model.rule_engine
-            if type(rules_infos) == list:
-                if rules_infos[0]["rules_type"] in self._get_supported_rule_engines():
-                    if len(rules_infos) == 1:
-                        model.rule_engine = self._deserialize_rule_engine(
-                            org_rules,
-                            path,
-                            rules_infos[0]["rules_type"],
-                            rules_infos[0]["rules_path"],
-                        )
-                    else:
-                        model.rule_engine = []
-                        org_rules = org_rules or [None for _ in range(len(rules_infos))]
-                        for i, model_info in enumerate(rules_infos):
-                            model_type = model_info["model_type"]
-                            model_path = model_info["model_path"]
-                            model.rule_engine.append(
-                                self._deserialize_rule_engine(
-                                    org_rules[i],
-                                    path,
-                                    rules_infos[i]["rules_type"],
-                                    rules_infos[i]["rules_path"],
-                                )
-                            )
-            elif type(rules_infos) == dict:
-                if "rules_type" in rules_infos:
-                    if not self._is_builtin_class_instance(rules_infos["rules_type"]):
-                        logging.warn(
-                            (
-                                "This rule engine is custom, so may not work well with "
-                                "joblib which is the python package that we use to persist rules."
-                            )
-                        )
-                    model.rule_engine = self._deserialize_basic_obj(
-                        path, self.RULE_ENGINE_PATH
-                    )
-                else:
-                    if (
-                        list(rules_infos.values())[0]["rules_type"]
-                        in self._get_supported_rule_engines()
-                    ):
-                        model.rule_engine = {}
-                        org_rules = org_rules or {k: None for k in rules_infos.keys()}
-                        for rules_name, rules_info in rules_infos.items():
-                            model.rule_engine[
-                                rules_name
-                            ] = self._deserialize_rule_engine(
-                                org_rules[rules_name],
-                                path,
-                                rules_info["rules_type"],
-                                rules_info["rules_path"],
-                            )
-            else:
-                raise ValueError("Not a valid H1ST Model METAINFO file!")
-
-
-class ModelRepository:
+class ModelRepository(ManifestMixin, VersionIndexMixin, AsyncPersistMixin):
     """
     Model repository allows user to persist and load model to different storage system.
 
@@ -396,57 +97,339 @@ class ModelRepository:
 
     _DEFAULT_STORAGE = S3Storage
 
-    def __init__(self, storage=None):
+    def __init__(
+        self,
+        storage=None,
+        codec="gzip",
+        compresslevel=None,
+        max_workers=None,
+        cache_size=0,
+        cache_max_bytes=2 ** 30,
+        mmap_dir=None,
+        lazy=False,
+        dedup=False,
+        async_workers=2,
+        max_pending=8,
+        latest_ttl=0,
+        shared_store=None,
+    ):
+        """
+        :param storage: storage instance, s3:// url, url of another fsspec filesystem,
+            e.g. ``gcs://bucket/models`` or ``memory://models``, or local folder
+        :param codec: compression codec of model archives, one of ``none``, ``gzip``,
+            ``xz``, ``zstd`` and ``lz4``. The codec is detected on load so archives
+            written with different codecs can live in the same repository.
+        :param compresslevel: compression level, leave blank for the codec's default
+        :param max_workers: number of threads used to (de)serialize collections of models
+        :param cache_size: number of loaded model versions kept in an in-memory LRU cache,
+            0 disables the cache. Cached models share their atomic models, see ``ModelCache``.
+        :param cache_max_bytes: maximum total size of the cached versions, estimated by
+            the size of their extracted files, None for no limit
+        :param mmap_dir: local folder to extract loaded versions into, leave blank to use
+            temporary folders. When set, sklearn models and ``stats`` are memory-mapped
+            read-only from this folder so processes loading the same version share its
+            pages through the OS page cache. Versions are expected to be immutable.
+        :param lazy: only read METAINFO.yaml on load and deserialize each model component
+            on its first access, see ``ModelSerDe``
+        :param dedup: store each serialized file once under its SHA-256 digest in the
+            ``_blobs`` namespace and persist versions as a small manifest of digests.
+            Files already in the repository, e.g. unchanged sub-models, are not uploaded
+            again. Blobs are shared between versions, whatever the codec they were
+            written with, and are not removed by ``delete``.
+            Archives and manifests can be loaded whatever this setting.
+        :param async_workers: number of background threads of ``persist_async``
+        :param max_pending: maximum number of background persists queued or running,
+            ``persist_async`` blocks when it is reached
+        :param latest_ttl: number of seconds the version of ``latest`` is cached in
+            memory when loading without a version, 0 reads it from storage on every
+            load. See ``watch`` to be notified of new versions instead.
+        :param shared_store: a ``SharedModelStore``, or the folder of one, to extract
+            loaded versions into instead of temporary folders. Like with ``mmap_dir``,
+            arrays are memory-mapped read-only. Each load not served by the cache takes
+            a reference on the version, see ``release``. Use it to load models once in
+            the parent process of forked workers and share their memory with them.
+        """
         if isinstance(storage, str) and "s3://" in storage:
             storage = storage.replace("s3://", "").strip("/") + "/"
             bucket, prefix = storage.split("/", 1)
             storage = S3Storage(bucket, prefix.strip("/"))
             self._NAMESPACE = ""
+        elif isinstance(storage, str) and "://" in storage:
+            storage = FsspecStorage(storage)
+            self._NAMESPACE = ""
         elif isinstance(storage, str):  # local folder
             storage = LocalStorage(storage)
             self._NAMESPACE = ""
 
         self._storage = storage or ModelRepository._DEFAULT_STORAGE()
-        self._serder = ModelSerDe()
+        if isinstance(shared_store, str):
+            shared_store = SharedModelStore(shared_store)
 
-    def persist(self, model, version=None):
+        self._serder = ModelSerDe(
+            max_workers=max_workers,
+            mmap_mode="r" if mmap_dir or shared_store is not None else None,
+            lazy=lazy,
+        )
+        self._codec = get_codec(codec, compresslevel)
+        self._cache = ModelCache(cache_size, cache_max_bytes) if cache_size else None
+        self._mmap_dir = mmap_dir
+        self._shared_store = shared_store
+        self._dedup = dedup
+        self._async_workers = async_workers
+        self._executor = None
+        self._pending = set()
+        self._pending_slots = threading.BoundedSemaphore(max_pending)
+        self._pending_lock = threading.Lock()
+        self._pointer_lock = threading.RLock()
+        self._latest = LatestResolver(self._storage, latest_ttl)
+
+    def persist(self, model, version=None, base_version=None):
         """
         Save a model to the model repository
 
         :param model: target model
         :param version: version name, leave blank for autogeneration
+        :param base_version: a previous version of the model, e.g. ``latest``, to persist
+            a delta of. The new version is stored as a manifest, like with ``dedup``,
+            which reuses the files of the base version that did not change, so only
+            the changed files are uploaded and checked for existence.
         :returns: model version
         """
         # assert isinstance(model, Model)
         # TODO: use version format: v_20200714-1203
         version = version or str(ulid.new())
 
+        bundle = self._get_bundle()
+        if bundle is not None:
+            # written to storage with the whole bundle
+            serialized_dir = bundle.get_path(self._get_key(model, version))
+            os.makedirs(serialized_dir, exist_ok=True)
+            self._serder.serialize(model, serialized_dir)
+            bundle.components.append((model, version))
+            model.version = version
+            return version
+
         try:
             # serialize a model to a temporary folder and then clean up later
             tmpdir = tempfile.mkdtemp()
             serialized_dir = os.path.join(tmpdir, "serialized")
-            tar_file = os.path.join(tmpdir, "model.tar")
             os.makedirs(serialized_dir)
 
             self._serder.serialize(model, serialized_dir)
-            _tar_create(tar_file, serialized_dir)
+            self._store(model, version, serialized_dir, base_version)
+            model.version = version
+        finally:
+            shutil.rmtree(tmpdir)
 
-            with open(tar_file, mode="rb") as f:
-                self._storage.set_bytes(
-                    self._get_key(model, version),
-                    f.read(),
-                )
+        return version
+
+    def _store(self, model, version, serialized_dir, base_version=None, bundle=None):
+        """
+        Write a serialized model folder to storage and point ``latest`` to it
+
+        :param bundle: the ``_Bundle`` the folder is the root of, its components are
+            stored before ``latest`` of ``model`` is updated
+        """
+        key = self._get_key(model, version)
+        self._invalidate(key)
+
+        if base_version is not None:
+            data = self._create_manifest(
+                serialized_dir, self._get_base_digests(model, base_version)
+            )
+        elif self._dedup:
+            data = self._create_manifest(serialized_dir)
+        else:
+            with tempfile.TemporaryDirectory() as tmpdir:
+                tar_file = os.path.join(tmpdir, "model.tar")
+                _tar_create(tar_file, serialized_dir, self._codec)
+                with open(tar_file, mode="rb") as f:
+                    data = f.read()
+
+        self._storage.set_bytes(key, data)
+        components = self._store_components(bundle) if bundle is not None else None
+        self._update_pointers(model, version, data, components)
 
-                self._storage.set_obj(
-                    self._get_key(model, "latest"),
-                    version,
+    def _store_components(self, bundle):
+        """
+        Point the keys of the components of a stored bundle to their folder in it
+        and update their ``latest`` pointers
+
+        :returns: the keys of the components
+        """
+        keys = []
+        for model, version in bundle.components:
+            key = self._get_key(model, version)
+            if key == bundle.root_key:
+                continue
+
+            self._invalidate(key)
+            path = os.path.relpath(bundle.get_path(key), bundle.path).replace(os.sep, "/")
+            data = BUNDLE_REF_HEADER + json.dumps(
+                {"bundle": bundle.root_key, "path": path}
+            ).encode()
+            self._storage.set_bytes(key, data)
+            self._update_pointers(model, version, data)
+            keys.append(key)
+        return keys
+
+    def _delete_components(self, root_key, keys):
+        """
+        Delete the references of the components of a deleted bundle, unless they were
+        persisted again on their own
+        """
+        refs = []
+        for key in keys:
+            try:
+                data = self._storage.get_bytes(key)
+            except KeyError:
+                continue
+            if (
+                data.startswith(BUNDLE_REF_HEADER)
+                and json.loads(data[len(BUNDLE_REF_HEADER):])["bundle"] == root_key
+            ):
+                refs.append(key)
+
+        self._storage.delete_many(refs)
+        now = time.time()
+        for key in refs:
+            self._invalidate(key)
+            namespace, version = key.rsplit(SEP, 1)
+            with self._pointer_lock, self._storage.lock(f"{namespace}{SEP}{VERSION_INDEX}"):
+                self._append_namespace_index(
+                    namespace, {"version": version, "timestamp": now, "deleted": True}
                 )
 
-                model.version = version
+    def _invalidate(self, key):
+        """
+        Drop the copies of a version kept in memory or extracted locally
+        """
+        if self._cache is not None:
+            self._cache.invalidate(key)
+
+        if self._mmap_dir is not None:
+            mmap_path = self._get_mmap_path(key)
+            if os.path.exists(mmap_path):
+                shutil.rmtree(mmap_path)
+
+        if self._shared_store is not None:
+            self._shared_store.remove(key)
+
+    def _update_pointers(self, model, version, data, components=None):
+        """
+        Point ``latest`` to a stored version and add it to the version index
+
+        :param components: keys of the components of a bundle, deleted with it
+        """
+        record = {
+            "version": version,
+            "timestamp": time.time(),
+            "size": len(data),
+            "checksum": "sha256:" + hashlib.sha256(data).hexdigest(),
+            "manifest": data.startswith(MANIFEST_HEADER),
+        }
+        if components:
+            record["components"] = components
+
+        # persists of the same model may finish concurrently in other threads or processes
+        with self._pointer_lock, self._storage.lock(self._get_key(model, VERSION_INDEX)):
+            self._storage.set_obj(
+                self._get_key(model, "latest"),
+                version,
+            )
+            self._latest.update(self._get_key(model, "latest"), version)
+            self._append_index(model, record)
+
+    @contextlib.contextmanager
+    def bundle(self, model, version=None):
+        """
+        Persist a composite model and its components as a single version.
+
+        Inside the context, ``persist`` calls of this repository, including the ones
+        made by the components' own ``persist`` methods, serialize into a shared folder.
+        The folder is written to storage as one archive under the key of ``model`` on
+        exit, along with a single update of its ``latest`` pointer. The key of each
+        component then holds a small reference to its folder in the archive and its
+        ``latest`` pointer is updated, so components can also be loaded on their own.
+        Nothing is written if the block raises. Nested bundles contribute to the
+        outermost one.
+
+            .. code-block:: python
+
+                with repo.bundle(self, version) as bundle:
+                    self.stats["sub_model_versions"] = bundle.map(
+                        lambda i, sub_model: sub_model.persist(f"{bundle.version}_{i}"),
+                        range(len(self.sub_models)),
+                        self.sub_models,
+                    )
+                    repo.persist(self, bundle.version)
+
+        :param model: the composite model
+        :param version: version name, leave blank for autogeneration
+        """
+        version = version or str(ulid.new())
+        active = self._get_bundle()
+        if active is not None:
+            yield _Bundle(self, active.path, active.root_key, version, active.components)
+            return
+
+        tmpdir = tempfile.mkdtemp()
+        try:
+            serialized_dir = os.path.join(tmpdir, "serialized")
+            os.makedirs(serialized_dir)
+
+            bundle = _Bundle(self, serialized_dir, self._get_key(model, version), version)
+            token = _ACTIVE_BUNDLE.set(bundle)
+            try:
+                yield bundle
+            finally:
+                _ACTIVE_BUNDLE.reset(token)
+
+            self._store(model, version, serialized_dir, bundle=bundle)
+            model.version = version
         finally:
-            dir_util.remove_tree(tmpdir)
+            shutil.rmtree(tmpdir)
 
-        return version
+    @contextlib.contextmanager
+    def open_bundle(self, model, version=None):
+        """
+        Load a composite model persisted with ``bundle``.
+
+        The version is downloaded once and ``load`` calls of this repository inside the
+        context read the components from it. Components missing from the bundle, e.g.
+        of versions persisted separately before bundles existed, are loaded from storage.
+
+        :param model: the composite model
+        :param version: version name, leave blank to load the latest version
+        """
+        if version is None:
+            version = self._latest.resolve(self._get_key(model, "latest"))
+
+        active = self._get_bundle()
+        if active is not None:
+            yield _Bundle(self, active.path, active.root_key, version)
+            return
+
+        key = self._get_key(model, version)
+        logger.info("Loading bundle %s ...." % version)
+        if self._shared_store is not None:
+            serialized_dir = self._shared_store.attach(key, functools.partial(self._fetch, key))
+        elif self._mmap_dir is not None:
+            serialized_dir = self._extract_shared(key)
+        else:
+            serialized_dir = self._extract_tmp(key)
+
+        token = _ACTIVE_BUNDLE.set(_Bundle(self, serialized_dir, key, version))
+        try:
+            yield _ACTIVE_BUNDLE.get()
+        finally:
+            _ACTIVE_BUNDLE.reset(token)
+
+    def _get_bundle(self):
+        bundle = _ACTIVE_BUNDLE.get()
+        if bundle is not None and bundle.repository is self:
+            return bundle
+        return None
 
     def load(self, model, version=None):
         """
@@ -456,39 +439,123 @@ class ModelRepository:
         :param version: version name, leave blank to load the latest version
         """
         # assert isinstance(model, Model)
+        bundle = self._get_bundle()
+        if version is None and bundle is not None and bundle.is_root(model):
+            version = bundle.version
+
         if version is None:
-            version = self._storage.get_obj(self._get_key(model, "latest"))
+            version = self._latest.resolve(self._get_key(model, "latest"))
+
+        key = self._get_key(model, version)
+        if self._cache is not None:
+            state = self._cache.get(key)
+            if state is not None:
+                logger.info("Loading version %s from cache ...." % version)
+                for prop, value in state.items():
+                    setattr(model, prop, value)
+                model.version = version
+                return
 
         logger.info("Loading version %s ...." % version)
 
-        try:
-            tmpdir = tempfile.mkdtemp()
-            serialized_dir = os.path.join(tmpdir, "serialized")
-            tar_file = os.path.join(tmpdir, "model.tar")
-            os.makedirs(serialized_dir)
+        bundled_dir = bundle.get_path(key) if bundle is not None else None
+        if bundled_dir and os.path.exists(os.path.join(bundled_dir, ModelSerDe.METAINFO_FILE)):
+            serialized_dir = bundled_dir
+        elif self._shared_store is not None:
+            serialized_dir = self._shared_store.attach(key, functools.partial(self._fetch, key))
+        elif self._mmap_dir is not None:
+            serialized_dir = self._extract_shared(key)
+        else:
+            serialized_dir = self._extract_tmp(key)
 
-            with open(tar_file, "wb") as f:
-                f.write(self._storage.get_bytes(self._get_key(model, version)))
+        state = self._serder.deserialize(model, serialized_dir)
+        model.version = version
 
-            _tar_extract(tar_file, serialized_dir)
-            self._serder.deserialize(model, serialized_dir)
-            model.version = version
+        if self._cache is not None:
+            # only the persisted properties, not the runtime attributes of this instance
+            self._cache.put(key, state, _dir_size(serialized_dir))
+
+    def _extract_tmp(self, key):
+        """
+        Download and extract a model archive into a temporary folder
+        """
+        tmpdir = tempfile.mkdtemp()
+
+        # We get error from Tensorflow telling that it could not find the folder
+        # Unsuccessful TensorSliceReader constructor: Failed to get matching files on
+        # /var/folders/wb/40304xlx477cfjzbk386l2gr0000gn/T/tmpwcrvm2e2/model/weights:
+        # Not found: /var/folders/wb/40304xlx477cfjzbk386l2gr0000gn/T/tmpwcrvm2e2/model; No such file or directory [Op:RestoreV2]
+        #
+        # so instead of removing the folder after loading, register the function to
+        # clean it up when the interpreter quits
+        atexit.register(shutil.rmtree, tmpdir, ignore_errors=True)
+
+        serialized_dir = os.path.join(tmpdir, "serialized")
+        os.makedirs(serialized_dir)
+
+        self._fetch(key, serialized_dir)
+        return serialized_dir
+
+    def _extract_shared(self, key):
+        """
+        Extract a model archive once into the mmap folder shared by all processes
+        """
+        serialized_dir = self._get_mmap_path(key)
+        if os.path.exists(os.path.join(serialized_dir, ModelSerDe.METAINFO_FILE)):
+            return serialized_dir
+
+        os.makedirs(self._mmap_dir, exist_ok=True)
+        tmpdir = tempfile.mkdtemp(dir=self._mmap_dir, prefix=".tmp-")
+        try:
+            extracted_dir = os.path.join(tmpdir, "serialized")
+            self._fetch(key, extracted_dir)
+
+            os.makedirs(os.path.dirname(serialized_dir), exist_ok=True)
+            try:
+                os.rename(extracted_dir, serialized_dir)
+            except OSError:
+                # another process extracted the same version in the meantime
+                if not os.path.exists(serialized_dir):
+                    raise
         finally:
-            # We get error from Tensorflow telling that it could not find the folder
-            # Unsuccessful TensorSliceReader constructor: Failed to get matching files on
-            # /var/folders/wb/40304xlx477cfjzbk386l2gr0000gn/T/tmpwcrvm2e2/model/weights:
-            # Not found: /var/folders/wb/40304xlx477cfjzbk386l2gr0000gn/T/tmpwcrvm2e2/model; No such file or directory [Op:RestoreV2]
-            #
-            # dir_util.remove_tree(tmpdir)
+            shutil.rmtree(tmpdir)
+
+        return serialized_dir
+
+    def _fetch(self, key, target):
+        """
+        Download a model version, stored as an archive or a manifest, into ``target``
+        """
+        data = self._storage.get_bytes(key)
+        if data.startswith(MANIFEST_HEADER):
+            self._extract_manifest(data, target)
+            return
+
+        if data.startswith(BUNDLE_REF_HEADER):
+            # a component persisted in a bundle, extract it from the bundle
+            ref = json.loads(data[len(BUNDLE_REF_HEADER):])
+            with tempfile.TemporaryDirectory() as tmpdir:
+                bundle_dir = os.path.join(tmpdir, "serialized")
+                self._fetch(ref["bundle"], bundle_dir)
+                path = os.path.abspath(os.path.join(bundle_dir, ref["path"]))
+                if os.path.commonpath([os.path.abspath(bundle_dir), path]) != os.path.abspath(
+                    bundle_dir
+                ):
+                    raise ValueError("Attempted Path Traversal in Bundle Reference")
+                shutil.copytree(path, target, dirs_exist_ok=True)
+            return
 
-            # instead, register the function to clean it up when the interpreter quits
-            import atexit
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tar_file = os.path.join(tmpdir, "model.tar")
+            with open(tar_file, "wb") as f:
+                f.write(data)
+            del data
 
-            def clean_tmpdir(tmpdir):
-                # print('Clean up %s'  % tmpdir)
-                dir_util.remove_tree(tmpdir)
+            _tar_extract(tar_file, target)
 
-            atexit.register(clean_tmpdir, tmpdir=tmpdir)
+    def _get_mmap_path(self, key):
+        key = key.replace("/", "_").replace("..", "__").replace(SEP, "/")
+        return os.path.join(self._mmap_dir, key)
 
     def delete(self, model, version):
         """
@@ -498,8 +565,74 @@ class ModelRepository:
         :param version: target version
         """
         # assert isinstance(model, Model) or isinstance(model, type)
-        assert version != "latest"  # magic key
-        self._storage.delete(self._get_key(model, version))
+        assert version not in ("latest", VERSION_INDEX)  # magic keys
+        key = self._get_key(model, version)
+        # the components of a bundle are deleted with it
+        components = next(
+            (
+                info.get("components", [])
+                for info in self.list_versions(model)
+                if info["version"] == version
+            ),
+            [],
+        )
+        self._invalidate(key)
+        self._storage.delete(key)
+        with self._pointer_lock, self._storage.lock(self._get_key(model, VERSION_INDEX)):
+            self._append_index(model, {
+                "version": version, "timestamp": time.time(), "deleted": True
+            })
+        self._delete_components(key, components)
+
+    def release(self, model, version):
+        """
+        Drop the reference taken on a version of the ``shared_store`` by loading it.
+        The version is removed from the store once no process references it.
+
+        :param model: model instance or the model class
+        :param version: loaded version
+        """
+        if self._shared_store is None:
+            raise RuntimeError("The repository has no shared store")
+        self._shared_store.release(self._get_key(model, version))
+
+    def watch(self, model, callback, interval=10.0, current=None):
+        """
+        Call ``callback`` with the new version whenever the latest version of a model
+        changes, e.g. to hot-reload it in a server:
+
+            .. code-block:: python
+
+                watcher = repo.watch(MyModel, lambda version: model.load(version))
+                ...
+                watcher.stop()
+
+        The ``latest`` pointer is polled from a daemon thread, which also refreshes the
+        cached version used by ``load``.
+
+        :param model: model instance or model class
+        :param callback: function called with the new version
+        :param interval: number of seconds between two polls
+        :param current: version already loaded, leave blank to call back with the
+            current latest version first
+        :returns: the started ``LatestWatcher``, call its ``stop`` method to stop it
+        """
+        key = self._get_key(model, "latest")
+
+        def read():
+            version = self._storage.get_obj(key)
+            self._latest.update(key, version)
+            return version
+
+        watcher = LatestWatcher(read, callback, interval, current)
+        watcher.start()
+        return watcher
+
+    def cache_info(self):
+        """
+        Return the hit/miss metrics of the load cache or None if the cache is disabled
+        """
+        return self._cache.info() if self._cache is not None else None
 
     def download(self, model, version, path):
         """
@@ -509,17 +642,9 @@ class ModelRepository:
         :param version: version name
         :param path: target folder to extract the model archive
         """
-        with tempfile.NamedTemporaryFile(mode="wb") as f:
-            f.write(self._storage.get_bytes(self._get_key(model, version)))
-            f.flush()
-            f.seek(0)
-
-            _tar_extract(f.name, path)
-
+        self._fetch(self._get_key(model, version), path)
         return path
 
-    # TODO: list all versions
-
     def _get_key(self, model, version):
         model_class = model if isinstance(model, type) else model.__class__
         model_name = model_class.__module__ + "." + model_class.__name__
@@ -573,43 +698,73 @@ class ModelRepository:
             if not repo_path:
                 raise RuntimeError("Please set MODEL_REPO_PATH in config.py")
 
-            setattr(cls, "MODEL_REPO", ModelRepository(storage=repo_path))
+            cache_size = int(os.environ.get("H1ST_MODEL_CACHE_SIZE", 0))
+            cache_max_bytes = int(os.environ.get("H1ST_MODEL_CACHE_MAX_BYTES", 2 ** 30))
+            shared_store = os.environ.get("H1ST_SHARED_MODEL_STORE") or None
+            setattr(
+                cls,
+                "MODEL_REPO",
+                ModelRepository(
+                    storage=repo_path,
+                    cache_size=cache_size,
+                    cache_max_bytes=cache_max_bytes,
+                    shared_store=shared_store,
+                ),
+            )
 
         return getattr(cls, "MODEL_REPO")
 
 
-def _tar_create(target, source):
+def _dir_size(path):
+    return sum(
+        os.path.getsize(os.path.join(root, filename))
+        for root, _, filenames in os.walk(path)
+        for filename in filenames
+    )
+
+
+def _tar_create(target, source, codec=None):
     """
     Helper function to create a tar archive
+
+    :param target: path of the archive to create
+    :param source: folder to archive
+    :param codec: compression codec, gzip by default
     """
-    with tarfile.open(target, "w:gz") as tf:
-        tf.add(source, arcname="", recursive=True)
+    codec = codec or get_codec("gzip")
+    pax_headers = {"h1st.codec": codec.name}
+    if codec.level is not None:
+        pax_headers["h1st.compresslevel"] = str(codec.level)
+
+    with open(target, "wb") as f, codec.open(f, "wb") as cf:
+        with tarfile.open(
+            fileobj=cf, mode="w|", format=tarfile.PAX_FORMAT, pax_headers=pax_headers
+        ) as tf:
+            tf.add(source, arcname="", recursive=True)
 
     return target
 
 
 def _tar_extract(source, target):
     """
-    Helper function to extract a tar archive
+    Helper function to extract a tar archive, the codec is detected from the archive header
     """
-    with tarfile.open(source) as tf:
-        def is_within_directory(directory, target):
-            
-            abs_directory = os.path.abspath(directory)
-            abs_target = os.path.abspath(target)
-        
-            prefix = os.path.commonprefix([abs_directory, abs_target])
-            
-            return prefix == abs_directory
-        
-        def safe_extract(tar, path=".", members=None, *, numeric_owner=False):
-        
-            for member in tar.getmembers():
-                member_path = os.path.join(path, member.name)
-                if not is_within_directory(path, member_path):
+    def is_within_directory(directory, target):
+        abs_directory = os.path.abspath(directory)
+        abs_target = os.path.abspath(target)
+
+        prefix = os.path.commonprefix([abs_directory, abs_target])
+
+        return prefix == abs_directory
+
+    with open(source, "rb") as f:
+        codec = detect_codec(f.read(MAGIC_SIZE))
+        f.seek(0)
+
+        with codec.open(f, "rb") as cf, tarfile.open(fileobj=cf, mode="r|") as tf:
+            for member in tf:
+                member_path = os.path.join(target, member.name)
+                if not is_within_directory(target, member_path):
                     raise Exception("Attempted Path Traversal in Tar File")
-        
-            tar.extractall(path, members, numeric_owner) 
-            
-        
-        safe_extract(tf, target)
+
+                tf.extract(member, target, numeric_owner=False)
@@ -0,0 +1,120 @@
+import time
+import logging
+import threading
+from typing import Any, Callable, Optional
+
+from h1st.model.repository.storage.base import Storage
+
+logger = logging.getLogger(__name__)
+
+
+class LatestResolver:
+    """
+    In-process cache of the ``latest`` pointers of a repository.
+
+    A pointer is read from storage at most once per ``ttl`` seconds, so loading the
+    latest version of a model in a request handler does not hit the storage every
+    time. Versions persisted by this process are visible right away, versions
+    persisted by other processes after at most ``ttl`` seconds.
+    """
+
+    def __init__(self, storage: Storage, ttl: float = 0):
+        """
+        :param storage: storage of the pointers
+        :param ttl: number of seconds a pointer is cached, 0 disables the cache
+        """
+        self.storage = storage
+        self.ttl = ttl
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, key: str) -> str:
+        """
+        Return the version a ``latest`` pointer refers to
+
+        :param key: repository key of the pointer
+        :raises KeyError: if no version was persisted
+        """
+        if self.ttl > 0:
+            with self._lock:
+                cached = self._versions.get(key)
+            if cached is not None and time.monotonic() - cached[1] < self.ttl:
+                return cached[0]
+
+        version = self.storage.get_obj(key)
+        self.update(key, version)
+        return version
+
+    def update(self, key: str, version: str) -> None:
+        """
+        Record the current value of a pointer
+        """
+        if self.ttl > 0:
+            with self._lock:
+                self._versions[key] = (version, time.monotonic())
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            self._versions.pop(key, None)
+
+
+class LatestWatcher(threading.Thread):
+    """
+    Background thread polling a ``latest`` pointer and calling back on changes.
+
+    Each poll reads the single pointer object, whatever the number of versions.
+    """
+
+    def __init__(
+        self,
+        read: Callable[[], Any],
+        callback: Callable[[str], None],
+        interval: float = 10.0,
+        current: Optional[str] = None,
+    ):
+        """
+        :param read: function returning the current version
+        :param callback: function called with the new version when it changes
+        :param interval: number of seconds between two polls
+        :param current: version the caller already has, leave blank to call back with
+            the version found by the first poll
+        """
+        super().__init__(name="h1st-latest-watcher", daemon=True)
+        self.read = read
+        self.callback = callback
+        self.interval = interval
+        self.version = current
+        self._stopped = threading.Event()
+
+    def run(self):
+        while True:
+            self.poll()
+            if self._stopped.wait(self.interval):
+                return
+
+    def poll(self) -> None:
+        """
+        Read the pointer once and call back if it changed
+        """
+        try:
+            version = self.read()
+        except KeyError:
+            return  # nothing persisted yet
+        except Exception as ex:
+            logger.warning("Could not read the latest version: %s" % ex)
+            return
+
+        if version != self.version:
+            self.version = version
+            try:
+                self.callback(version)
+            except Exception:
+                logger.exception("Latest version callback failed")
+
+    def stop(self) -> None:
+        """
+        Stop polling, the callback is not called after this returns unless it is running
+        """
+        self._stopped.set()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join()
@@ -0,0 +1,76 @@
+import time
+import datetime
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+
+class RetentionPolicy:
+    """
+    Select the versions of a model to keep.
+
+    A version is kept if any rule keeps it: it is among the ``keep_last`` most recent
+    versions, it was persisted less than ``keep_newer_than`` ago or it has one of the
+    ``keep_tags``. The version ``latest`` points to is always kept.
+
+        .. code-block:: python
+
+            policy = RetentionPolicy(keep_last=5, keep_newer_than=timedelta(days=30),
+                                     keep_tags={"production"})
+            report = repo.gc(MyModel, policy, dry_run=True)
+    """
+
+    def __init__(
+        self,
+        keep_last: Optional[int] = None,
+        keep_newer_than: Union[datetime.timedelta, float, None] = None,
+        keep_tags: Optional[Iterable[str]] = None,
+    ):
+        """
+        :param keep_last: number of most recent versions to keep
+        :param keep_newer_than: age, as a timedelta or a number of seconds, under which
+            versions are kept
+        :param keep_tags: versions with any of these tags are kept, see
+            ``ModelRepository.tag``
+        """
+        if keep_last is None and keep_newer_than is None and not keep_tags:
+            raise ValueError("A retention policy needs at least one rule")
+
+        if isinstance(keep_newer_than, datetime.timedelta):
+            keep_newer_than = keep_newer_than.total_seconds()
+
+        self.keep_last = keep_last
+        self.keep_newer_than = keep_newer_than
+        self.keep_tags = set(keep_tags or [])
+
+    def select(
+        self, versions: List[Dict], latest: Optional[str] = None, now: Optional[float] = None
+    ) -> Tuple[List[Dict], List[Dict]]:
+        """
+        Split versions into the ones to keep and the ones to delete
+
+        :param versions: version infos as returned by ``ModelRepository.list_versions``,
+            oldest first
+        :param latest: version the ``latest`` pointer refers to
+        :param now: current time, leave blank to use the system clock
+        :returns: the versions to keep and the versions to delete, oldest first
+        """
+        now = time.time() if now is None else now
+        recent = set()
+        if self.keep_last:
+            recent = {info["version"] for info in versions[-self.keep_last:]}
+
+        keep, delete = [], []
+        for info in versions:
+            timestamp = info.get("timestamp")
+            kept = (
+                info["version"] == latest
+                or info["version"] in recent
+                or (
+                    self.keep_newer_than is not None
+                    # versions of unknown age are not deleted on age
+                    and (timestamp is None or now - timestamp < self.keep_newer_than)
+                )
+                or bool(self.keep_tags & set(info.get("tags", [])))
+            )
+            (keep if kept else delete).append(info)
+
+        return keep, delete
@@ -0,0 +1,545 @@
+import os
+import logging
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+import yaml
+import joblib
+
+from h1st.model.repository.lazy import LazyDict, LazyValue
+from h1st.model.repository.serializers import SERIALIZERS
+
+logger = logging.getLogger(__name__)
+
+
+class ModelSerDe:
+    """
+    Serialize H1st models into a folder described by METAINFO.yaml.
+
+    Atomic models are written by the serializer registered for their type in
+    ``h1st.model.repository.serializers.SERIALIZERS``.
+    """
+
+    STATS_PATH = "stats.joblib"
+    METRICS_PATH = "metrics.joblib"
+    RULE_DETAILS_PATH = "rule_details.joblib"
+    RULE_ENGINE_PATH = "rule_engine.joblib"
+    METAINFO_FILE = "METAINFO.yaml"
+
+    # formats of the values written out of the stats, metrics and rule_details dicts
+    TABLE_FORMATS = ("pandas-parquet", "pandas-series-parquet", "numpy")
+    TABLE_MIN_BYTES = 64 * 1024
+
+    def __init__(self, max_workers=None, mmap_mode=None, lazy=False):
+        """
+        :param max_workers: number of threads used to (de)serialize lists and dicts of
+            models or rule engines, leave blank for the ``ThreadPoolExecutor`` default
+            and set to 1 to work sequentially
+        :param mmap_mode: ``joblib.load`` memory-map mode of sklearn models and ``stats``,
+            e.g. ``r`` to share read-only arrays between processes
+        :param lazy: defer the deserialization of each component, i.e. ``metrics``,
+            ``stats``, ``rule_details``, ``rule_engine`` and ``base_model`` or each entry
+            of a dict ``base_model``, to its first access
+        """
+        self.max_workers = max_workers
+        self.mmap_mode = mmap_mode
+        self.lazy = lazy
+        self.serializers = SERIALIZERS
+
+    def _map(self, func, *iterables):
+        """
+        Apply ``func`` over the iterables in a thread pool, results keep the input order
+        """
+        args = list(zip(*iterables))
+        if self.max_workers == 1 or len(args) <= 1:
+            return [func(*arg) for arg in args]
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            return list(pool.map(func, *zip(*args)))
+
+    def _is_builtin_class_instance(self, obj):
+        return (
+            obj.__class__.__module__ == "builtins"
+            or obj.__class__.__module__ == "__builtin__"
+        )
+
+    def _serialize_basic_obj(self, d, path, obj_file):
+        joblib.dump(d, os.path.join(path, obj_file))
+
+    def _deserialize_basic_obj(self, path, obj_file):
+        return joblib.load(os.path.join(path, obj_file))
+
+    def _serialize_dict(self, d, path, dict_file):
+        """
+        Dump a dict property with joblib, large DataFrame, Series and ndarray values
+        nested in dicts and lists are written to ``<dict name>_tables/`` in their own
+        format and replaced with a reference in the joblib file
+        """
+        tables = []
+        folder = os.path.splitext(dict_file)[0] + "_tables"
+        d = self._extract_tables(d, folder, tables)
+
+        if tables:
+            os.makedirs(os.path.join(path, folder), exist_ok=True)
+            results = self._map(
+                self._serialize_table,
+                [table for table, _ in tables],
+                [path] * len(tables),
+                [ref for _, ref in tables],
+            )
+            # tables which could not be written natively stay in the joblib file
+            fallbacks = {
+                id(ref): table for (table, ref), ok in zip(tables, results) if not ok
+            }
+            if fallbacks:
+                d = self._restore_tables(d, lambda ref: fallbacks.get(id(ref), ref))
+
+        joblib.dump(d, path + "/%s" % dict_file)
+
+    def _deserialize_dict(self, path, dict_file, mmap_mode=None):
+        d = joblib.load(path + "/%s" % dict_file, mmap_mode=mmap_mode)
+        return self._restore_tables(
+            d,
+            lambda ref: self.serializers.get(ref.format).deserialize(
+                None, path, ref.path, mmap_mode=mmap_mode
+            ),
+        )
+
+    def _extract_tables(self, value, folder, tables):
+        """
+        Return a copy of ``value`` where tables are replaced with a ``_TableRef``,
+        the pairs of table and reference are appended to ``tables``
+        """
+        if type(value) == dict:
+            return {k: self._extract_tables(v, folder, tables) for k, v in value.items()}
+
+        if type(value) == list:
+            return [self._extract_tables(v, folder, tables) for v in value]
+
+        serializer = self.serializers.lookup(value)
+        if (
+            serializer is not None
+            and serializer.format in self.TABLE_FORMATS
+            and _nbytes(value) >= self.TABLE_MIN_BYTES
+        ):
+            ref = _TableRef(serializer.format, "%s/table_%d" % (folder, len(tables)))
+            tables.append((value, ref))
+            return ref
+
+        return value
+
+    def _restore_tables(self, value, restore):
+        if type(value) == dict:
+            return {k: self._restore_tables(v, restore) for k, v in value.items()}
+
+        if type(value) == list:
+            return [self._restore_tables(v, restore) for v in value]
+
+        if isinstance(value, _TableRef):
+            return restore(value)
+
+        return value
+
+    def _serialize_table(self, table, path, ref):
+        try:
+            ref.path = self.serializers.get(ref.format).serialize(table, path, ref.path)
+            return True
+        except (ValueError, TypeError, NotImplementedError, ImportError) as ex:
+            # e.g. non-string column names in Parquet or object arrays in .npy
+            logger.debug("Could not write %s as %s: %s", ref.path, ref.format, ex)
+            return False
+
+    def _get_rule_engine_type(self, rules):
+        serializer = self.serializers.lookup(rules)
+        if serializer is not None and serializer.format in self._get_supported_rule_engines():
+            return serializer.format
+        else:
+            return "custom"
+
+    def _get_model_type(self, model):
+        if model is None:
+            return "custom"
+
+        serializer = self.serializers.lookup(model)
+        if serializer is not None:
+            return serializer.format
+
+    def _get_supported_rule_engines(self):
+        return set(["skfuzzy"])
+
+    def _serialize_rule_engine(self, rules, path, rules_name="rules"):
+        rule_engine_type = self._get_rule_engine_type(rules)
+
+        if rule_engine_type in self._get_supported_rule_engines():
+            serializer = self.serializers.get(rule_engine_type)
+            rules_path = serializer.serialize(rules, path, rules_name)
+        else:
+            raise ValueError("Unsupported model!!!")
+
+        return rule_engine_type, rules_path
+
+    def _deserialize_rule_engine(self, model, path, rule_engine_type, rules_path):
+        if rule_engine_type in self._get_supported_rule_engines():
+            serializer = self.serializers.get(rule_engine_type)
+            model = serializer.deserialize(model, path, rules_path)
+        else:
+            model = joblib.load(path + "/%s" % rules_path)
+
+        return model
+
+    def _serialize_single_model(self, model, path, model_name="model"):
+        model_type = self._get_model_type(model)
+
+        if model_type == "custom":
+            model_path = model_name  # XXX
+        elif model_type is not None:
+            model_path = self.serializers.get(model_type).serialize(model, path, model_name)
+        else:
+            raise ValueError("Unsupported model!!!")
+
+        return model_type, model_path
+
+    def _deserialize_single_model(self, model, path, model_type, model_path):
+        if model_type == "custom":
+            return None
+
+        serializer = self.serializers.get(model_type)
+        return serializer.deserialize(model, path, model_path, mmap_mode=self.mmap_mode)
+
+    def serialize(self, model, path):
+        """
+        Serialize a H1ST model's model property to disk.
+
+        :param model: H1ST Model
+        :param path: path to save models to
+        """
+        from h1st.model.ml_model import MLModel
+        from h1st.model.rule_based_model import RuleBasedModel
+
+        meta_info = {}
+
+        if model.metrics:
+            logger.info("Saving metrics property...")
+            meta_info["metrics"] = self.METRICS_PATH
+            self._serialize_dict(model.metrics, path, self.METRICS_PATH)
+
+        if model.stats is not None:
+            logger.info("Saving stats property...")
+            meta_info["stats"] = self.STATS_PATH
+            self._serialize_dict(model.stats, path, self.STATS_PATH)
+
+        if isinstance(model, MLModel):
+            if model.base_model:
+                logger.info("Saving model property...")
+                if type(model.base_model) == list:
+                    n_models = len(model.base_model)
+                    results = self._map(
+                        self._serialize_single_model,
+                        model.base_model,
+                        [path] * n_models,
+                        ["model_%d" % i for i in range(n_models)],
+                    )
+                    meta_info["models"] = [
+                        {"model_type": model_type, "model_path": model_path}
+                        for model_type, model_path in results
+                    ]
+                elif isinstance(model.base_model, dict):  # incl. lazily loaded dicts
+                    keys = list(model.base_model.keys())
+                    results = self._map(
+                        self._serialize_single_model,
+                        model.base_model.values(),
+                        [path] * len(keys),
+                        ["model_%s" % k for k in keys],
+                    )
+                    meta_info["models"] = {
+                        k: {"model_type": model_type, "model_path": model_path}
+                        for k, (model_type, model_path) in zip(keys, results)
+                    }
+                else:
+                    # this is a single model
+                    model_type, model_path = self._serialize_single_model(
+                        model.base_model, path
+                    )
+                    meta_info["models"] = [
+                        {"model_type": model_type, "model_path": model_path}
+                    ]
+            else:
+                logger.error(".base_model was not assigned.")
+
+        elif isinstance(model, RuleBasedModel):
+
+            if model.rule_details is not None:
+                logger.info("Saving rule_details property...")
+                meta_info["rule_details"] = self.RULE_DETAILS_PATH
+                self._serialize_dict(model.rule_details, path, self.RULE_DETAILS_PATH)
+
+            if model.rule_engine is not None:
+                logger.info("Saving rule_engine property...")
+                if type(model.rule_engine) in self._get_supported_rule_engines():
+                    rule_engine_type, rules_path = self._serialize_rule_engine(
+                        model.rule_engine, path
+                    )
+                    meta_info["rule_engine"] = [
+                        {"rules_type": rule_engine_type, "rules_path": rules_path}
+                    ]
+                elif (
+                    type(model.rule_engine) == list
+                    and type(model.rule_engine[0]) in self._get_supported_rule_engines()
+                ):
+                    n_rules = len(model.rule_engine)
+                    results = self._map(
+                        self._serialize_rule_engine,
+                        model.rule_engine,
+                        [path] * n_rules,
+                        [f"rules_{i}" for i in range(n_rules)],
+                    )
+                    meta_info["rule_engine"] = [
+                        {"rules_type": rule_engine_type, "rules_path": rules_path}
+                        for rule_engine_type, rules_path in results
+                    ]
+                elif (
+                    isinstance(model.rule_engine, dict)
+                    and type(list(model.rule_engine.values())[0])
+                    in self._get_supported_rule_engines()
+                ):
+                    keys = list(model.rule_engine.keys())
+                    results = self._map(
+                        self._serialize_rule_engine,
+                        model.rule_engine.values(),
+                        [path] * len(keys),
+                        [f"rules_{key}" for key in keys],
+                    )
+                    meta_info["rule_engine"] = {
+                        key: {"rules_type": rule_engine_type, "rules_path": rules_path}
+                        for key, (rule_engine_type, rules_path) in zip(keys, results)
+                    }
+                elif self._is_builtin_class_instance(model.rule_engine):
+                    self._serialize_basic_obj(
+                        model.rule_engine, path, self.RULE_ENGINE_PATH
+                    )
+                    meta_info["rule_engine"] = {
+                        "rules_type": type(model.rule_engine),
+                        "rule_path": self.RULE_ENGINE_PATH,
+                    }
+                else:
+                    logging.warn(
+                        (
+                            "This rule engine is custom, so may not work well with "
+                            "joblib which is the python package that we use to persist rules."
+                        )
+                    )
+                    self._serialize_basic_obj(
+                        model.rule_engine, path, self.RULE_ENGINE_PATH
+                    )
+                    meta_info["rule_engine"] = {
+                        "rules_type": type(model.rule_engine),
+                        "rule_path": self.RULE_ENGINE_PATH,
+                    }
+
+            else:
+                logger.warning(".rule_engine was not assigned.")
+
+        elif hasattr(model, "base_model"):
+            logger.warning(
+                (
+                    "Your .base_model will not be persisted. "
+                    "If you want to persist your .base_model, "
+                    "must inherit from h1st.MLModel."
+                )
+            )
+
+        elif hasattr(model, "rules"):
+            logger.warning(
+                (
+                    "Your .rules will not be persisted. "
+                    "If you want to persist your .rules, "
+                    "must inherit from h1st.RuleBasedModel."
+                )
+            )
+
+        if len(meta_info) == 0:
+            logger.info(
+                "Model persistence currently supports only stats, "
+                "model and metrics properties."
+            )
+            logger.info(
+                "Make sure you store stastistic in stats property, "
+                "models in model property and model metrics in metrics one."
+            )
+
+        with open(os.path.join(path, self.METAINFO_FILE), "w") as file:
+            yaml.dump(meta_info, file)
+
+    def deserialize(self, model, path):
+        """
+        Populate a H1ST model's model property with saved atomic models.
+
+        :param model: H1ST Model
+        :param path: path to model folder
+        :returns: dict of the restored model properties, lazy values unresolved
+        """
+        # Read METAINFO
+        with open(os.path.join(path, self.METAINFO_FILE), "r") as file:
+            meta_info = yaml.load(file, Loader=yaml.Loader)
+
+        state = {}
+        if "metrics" in meta_info.keys():
+            model.metrics = state["metrics"] = self._deserialize_component(
+                self._deserialize_dict, path, self.METRICS_PATH
+            )
+
+        if "stats" in meta_info.keys():
+            model.stats = state["stats"] = self._deserialize_component(
+                self._deserialize_dict, path, self.STATS_PATH, self.mmap_mode
+            )
+
+        if "models" in meta_info.keys():
+            model_infos = meta_info["models"]
+            org_model = model.base_model  # original model object from Model class
+            if type(model_infos) == dict:
+                # in lazy mode, each entry of a dict of models is loaded on access
+                state["base_model"] = self._deserialize_models(org_model, path, model_infos)
+            else:
+                state["base_model"] = self._deserialize_component(
+                    self._deserialize_models, org_model, path, model_infos
+                )
+            model.base_model = state["base_model"]
+
+        if "rule_details" in meta_info.keys():
+            model.rule_details = state["rule_details"] = self._deserialize_component(
+                self._deserialize_dict, path, self.RULE_DETAILS_PATH
+            )
+
+        if "rule_engine" in meta_info.keys():
+            model.rule_engine = state["rule_engine"] = self._deserialize_component(
+                self._deserialize_rule_engines,
+                model.rule_engine,
+                path,
+                meta_info["rule_engine"],
+            )
+
+        return state
+
+    def _deserialize_component(self, func, *args):
+        """
+        Call ``func`` now or, in lazy mode, on first access of the component
+        """
+        if self.lazy:
+            return LazyValue(functools.partial(func, *args))
+        return func(*args)
+
+    def _deserialize_models(self, org_model, path, model_infos):
+        if type(model_infos) == list:
+            if len(model_infos) == 1:
+                # Single model
+                model_info = model_infos[0]
+                model_type = model_info["model_type"]
+                model_path = model_info["model_path"]
+                return self._deserialize_single_model(
+                    org_model, path, model_type, model_path
+                )
+
+            # A list of models
+            org_model = org_model or [None for _ in range(len(model_infos))]
+            return self._map(
+                self._deserialize_single_model,
+                org_model,
+                [path] * len(model_infos),
+                [model_info["model_type"] for model_info in model_infos],
+                [model_info["model_path"] for model_info in model_infos],
+            )
+
+        if type(model_infos) == dict:
+            # A dict of models
+            org_model = org_model or {k: None for k in model_infos.keys()}
+            keys = list(model_infos.keys())
+            if self.lazy:
+                return LazyDict({
+                    k: LazyValue(functools.partial(
+                        self._deserialize_single_model,
+                        org_model[k],
+                        path,
+                        model_infos[k]["model_type"],
+                        model_infos[k]["model_path"],
+                    ))
+                    for k in keys
+                })
+
+            results = self._map(
+                self._deserialize_single_model,
+                [org_model[k] for k in keys],
+                [path] * len(keys),
+                [model_infos[k]["model_type"] for k in keys],
+                [model_infos[k]["model_path"] for k in keys],
+            )
+            return dict(zip(keys, results))
+
+        raise ValueError("Not a valid H1ST Model METAINFO file!")
+
+    def _deserialize_rule_engines(self, org_rules, path, rules_infos):
+        if type(rules_infos) == list:
+            if rules_infos[0]["rules_type"] in self._get_supported_rule_engines():
+                if len(rules_infos) == 1:
+                    return self._deserialize_rule_engine(
+                        org_rules,
+                        path,
+                        rules_infos[0]["rules_type"],
+                        rules_infos[0]["rules_path"],
+                    )
+
+                org_rules = org_rules or [None for _ in range(len(rules_infos))]
+                return self._map(
+                    self._deserialize_rule_engine,
+                    org_rules,
+                    [path] * len(rules_infos),
+                    [rules_info["rules_type"] for rules_info in rules_infos],
+                    [rules_info["rules_path"] for rules_info in rules_infos],
+                )
+        elif type(rules_infos) == dict:
+            if "rules_type" in rules_infos:
+                if not self._is_builtin_class_instance(rules_infos["rules_type"]):
+                    logging.warn(
+                        (
+                            "This rule engine is custom, so may not work well with "
+                            "joblib which is the python package that we use to persist rules."
+                        )
+                    )
+                return self._deserialize_basic_obj(path, self.RULE_ENGINE_PATH)
+
+            if (
+                list(rules_infos.values())[0]["rules_type"]
+                in self._get_supported_rule_engines()
+            ):
+                org_rules = org_rules or {k: None for k in rules_infos.keys()}
+                keys = list(rules_infos.keys())
+                results = self._map(
+                    self._deserialize_rule_engine,
+                    [org_rules[k] for k in keys],
+                    [path] * len(keys),
+                    [rules_infos[k]["rules_type"] for k in keys],
+                    [rules_infos[k]["rules_path"] for k in keys],
+                )
+                return dict(zip(keys, results))
+        else:
+            raise ValueError("Not a valid H1ST Model METAINFO file!")
+
+        return org_rules
+
+
+class _TableRef:
+    """
+    Placeholder of a table written next to the joblib file of a dict property
+    """
+
+    def __init__(self, format, path):
+        self.format = format
+        self.path = path
+
+
+def _nbytes(value):
+    nbytes = getattr(value, "nbytes", None)
+    if nbytes is not None:
+        return nbytes
+
+    # pandas objects
+    return value.memory_usage(index=True, deep=False).sum()
@@ -0,0 +1,401 @@
+import os
+import sys
+import copy
+import threading
+from typing import Any, Optional, Union
+
+import joblib
+
+
+class Serializer:
+    """
+    Base class for the serializers of atomic models.
+
+    A serializer writes one object into a model folder and reads it back. Its
+    ``format`` is recorded as ``model_type`` in METAINFO.yaml so the same serializer
+    is used on load. To plug in a faster or smaller format for your own classes,
+    subclass ``Serializer`` and register it in ``SERIALIZERS``:
+
+        .. code-block:: python
+
+           class MySerializer(Serializer):
+               format = "my-format"
+
+               def serialize(self, obj, path, name):
+                   ...
+                   return name + ".my"
+
+               def deserialize(self, org_obj, path, obj_path, mmap_mode=None):
+                   ...
+
+           SERIALIZERS.register(MyClass, MySerializer())
+    """
+
+    format = None
+
+    def serialize(self, obj: Any, path: str, name: str) -> str:
+        """
+        Write ``obj`` into the folder ``path``
+
+        :param obj: object to serialize
+        :param path: model folder
+        :param name: base name to use for the written file or folder
+        :returns: path of the written file or folder relative to ``path``
+        """
+        raise NotImplementedError()
+
+    def deserialize(self, org_obj: Any, path: str, obj_path: str, mmap_mode: str = None) -> Any:
+        """
+        Read an object written by ``serialize``
+
+        :param org_obj: original object of the model property, if any
+        :param path: model folder
+        :param obj_path: path returned by ``serialize``
+        :param mmap_mode: memory-map mode requested by the caller, if supported
+        """
+        raise NotImplementedError()
+
+
+class JoblibSerializer(Serializer):
+    format = "sklearn"
+
+    def serialize(self, obj, path, name):
+        obj_path = "%s.joblib" % name
+        joblib.dump(obj, os.path.join(path, obj_path))
+        return obj_path
+
+    def deserialize(self, org_obj, path, obj_path, mmap_mode=None):
+        return joblib.load(os.path.join(path, obj_path), mmap_mode=mmap_mode)
+
+
+class SkfuzzySerializer(JoblibSerializer):
+    format = "skfuzzy"
+
+
+class KerasWeightsSerializer(Serializer):
+    """
+    Save the weights of a Keras model, the model architecture must be created by the
+    model class before loading
+    """
+
+    format = "tensorflow-keras"
+
+    def serialize(self, obj, path, name):
+        os.makedirs(os.path.join(path, name), exist_ok=True)
+        obj.save_weights(os.path.join(path, name, "weights"))
+        return name
+
+    def deserialize(self, org_obj, path, obj_path, mmap_mode=None):
+        org_obj.load_weights(os.path.join(path, obj_path, "weights")).expect_partial()
+        return org_obj
+
+
+class NumpySerializer(Serializer):
+    format = "numpy"
+
+    def serialize(self, obj, path, name):
+        import numpy as np
+
+        obj_path = "%s.npy" % name
+        np.save(os.path.join(path, obj_path), obj, allow_pickle=False)
+        return obj_path
+
+    def deserialize(self, org_obj, path, obj_path, mmap_mode=None):
+        import numpy as np
+
+        return np.load(os.path.join(path, obj_path), mmap_mode=mmap_mode)
+
+
+def _check_parquet_columns(frame):
+    """
+    Raise a ``TypeError`` for frames with object columns, Parquet does not restore
+    their values as they were, e.g. lists and tuples are read back as ndarrays
+    """
+    columns = [column for column, dtype in frame.dtypes.items() if dtype == object]
+    if columns:
+        raise TypeError("Object columns %s are not written to Parquet" % columns)
+
+
+class ParquetSerializer(Serializer):
+    format = "pandas-parquet"
+
+    def serialize(self, obj, path, name):
+        _check_parquet_columns(obj)
+        obj_path = "%s.parquet" % name
+        obj.to_parquet(os.path.join(path, obj_path))
+        return obj_path
+
+    def deserialize(self, org_obj, path, obj_path, mmap_mode=None):
+        import pandas as pd
+
+        return pd.read_parquet(os.path.join(path, obj_path), memory_map=mmap_mode is not None)
+
+
+class SeriesParquetSerializer(Serializer):
+    """
+    Store a pandas Series as a single-column Parquet file named after the series
+    """
+
+    format = "pandas-series-parquet"
+    UNNAMED = "__series__"
+
+    def serialize(self, obj, path, name):
+        obj_path = "%s.parquet" % name
+        column = self.UNNAMED if obj.name is None else obj.name
+        frame = obj.to_frame(name=column)
+        _check_parquet_columns(frame)
+        frame.to_parquet(os.path.join(path, obj_path))
+        return obj_path
+
+    def deserialize(self, org_obj, path, obj_path, mmap_mode=None):
+        import pandas as pd
+
+        frame = pd.read_parquet(os.path.join(path, obj_path), memory_map=mmap_mode is not None)
+        series = frame[frame.columns[0]]
+        if series.name == self.UNNAMED:
+            series.name = None
+        return series
+
+
+class ForestSerializer(Serializer):
+    """
+    Store sklearn tree ensembles, e.g. ``RandomForestClassifier``, as contiguous arrays.
+
+    The node arrays of all trees (``left_child``, ``threshold``, ``value``, ...) are
+    concatenated into one ``.npy`` file per column and integer columns are downcast to
+    the smallest dtype holding their values, which is lossless. The rest of the
+    estimator is pickled without its trees. Trees are rebuilt on load and predict
+    exactly like the original estimator. Forests without trees, e.g. not fitted yet,
+    are written with joblib.
+    """
+
+    format = "sklearn-forest"
+    ESTIMATOR_FILE = "forest.joblib"
+    VALUES_FILE = "value.npy"
+
+    def __init__(self, dtype=None):
+        """
+        :param dtype: dtype of the float columns, e.g. ``numpy.float32`` to halve their
+            size, leave blank to keep ``float64``. Thresholds are rounded down so that
+            splits stay exact for the float32 features sklearn trees work on, leaf values
+            lose precision beyond the dtype's resolution.
+        """
+        self.dtype = dtype
+
+    def serialize(self, obj, path, name):
+        import numpy as np
+
+        if not getattr(obj, "estimators_", None):
+            return JoblibSerializer().serialize(obj, path, name)
+
+        folder = os.path.join(path, name)
+        os.makedirs(folder, exist_ok=True)
+
+        states = [estimator.tree_.__getstate__() for estimator in obj.estimators_]
+        nodes = np.concatenate([state["nodes"] for state in states])
+        for field in nodes.dtype.names:
+            column = self._compact(nodes[field])
+            if field == "threshold" and column.dtype != nodes[field].dtype:
+                # no float32 feature lies between a rounded down threshold and the
+                # original one, so `x <= threshold` keeps its outcome
+                rounded_up = column > nodes[field]
+                column[rounded_up] = np.nextafter(column[rounded_up], -np.inf)
+            np.save(os.path.join(folder, "%s.npy" % field), column)
+
+        values = np.concatenate([state["values"] for state in states])
+        np.save(os.path.join(folder, self.VALUES_FILE), self._compact(values))
+
+        forest = copy.copy(obj)
+        forest.estimators_ = []
+        for estimator in obj.estimators_:
+            estimator = copy.copy(estimator)
+            del estimator.tree_
+            forest.estimators_.append(estimator)
+
+        joblib.dump(
+            {
+                "forest": forest,
+                "tree_args": obj.estimators_[0].tree_.__reduce__()[1],
+                "node_counts": [state["node_count"] for state in states],
+                "max_depths": [state["max_depth"] for state in states],
+            },
+            os.path.join(folder, self.ESTIMATOR_FILE),
+        )
+        return name
+
+    def deserialize(self, org_obj, path, obj_path, mmap_mode=None):
+        import numpy as np
+        from sklearn.tree._tree import Tree
+
+        if obj_path.endswith(".joblib"):
+            return JoblibSerializer().deserialize(org_obj, path, obj_path, mmap_mode)
+
+        folder = os.path.join(path, obj_path)
+        info = joblib.load(os.path.join(folder, self.ESTIMATOR_FILE))
+        forest = info["forest"]
+
+        # the node layout of the installed sklearn version
+        template = Tree(*info["tree_args"]).__getstate__()
+        columns = {
+            field: np.load(os.path.join(folder, "%s.npy" % field), mmap_mode=mmap_mode)
+            for field in template["nodes"].dtype.names
+            if os.path.exists(os.path.join(folder, "%s.npy" % field))
+        }
+        values = np.load(os.path.join(folder, self.VALUES_FILE), mmap_mode=mmap_mode)
+
+        start = 0
+        for estimator, node_count, max_depth in zip(
+            forest.estimators_, info["node_counts"], info["max_depths"]
+        ):
+            end = start + node_count
+            nodes = np.zeros(node_count, dtype=template["nodes"].dtype)
+            for field, column in columns.items():
+                nodes[field] = column[start:end]
+
+            tree = Tree(*info["tree_args"])
+            tree.__setstate__({
+                "max_depth": max_depth,
+                "node_count": node_count,
+                "nodes": nodes,
+                "values": np.ascontiguousarray(
+                    values[start:end], dtype=template["values"].dtype
+                ),
+            })
+            estimator.tree_ = tree
+            start = end
+
+        return forest
+
+    def _compact(self, column):
+        import numpy as np
+
+        if np.issubdtype(column.dtype, np.floating):
+            return column.astype(self.dtype) if self.dtype is not None else column
+
+        if np.issubdtype(column.dtype, np.integer) and column.size:
+            return column.astype(np.result_type(
+                np.min_scalar_type(column.min()), np.min_scalar_type(column.max())
+            ))
+
+        return column
+
+
+class SerializerRegistry:
+    """
+    Registry of serializers keyed by type.
+
+    The serializer of an object is the one registered for the first class of its MRO,
+    so the most specific registration wins. Lookups are cached per type.
+
+    Types can be registered with a ``"module:attribute"`` string, e.g.
+    ``"sklearn.base:BaseEstimator"``, which is only resolved once the module has been
+    imported by someone else. This way registering serializers for optional
+    frameworks does not import them.
+    """
+
+    def __init__(self):
+        self._types = {}
+        self._pending = {}
+        self._resolved = {}  # "module:attribute" -> class, once resolved
+        self._formats = {}
+        self._dispatch = {}
+        self._lock = threading.Lock()
+
+    def register(self, type_: Union[type, str], serializer: Serializer) -> None:
+        """
+        Register ``serializer`` for ``type_`` and its subclasses
+
+        :param type_: a class or a ``"module:attribute"`` string
+        :param serializer: serializer instance
+        """
+        with self._lock:
+            if isinstance(type_, str):
+                self._pending[type_] = serializer
+            else:
+                self._types[type_] = serializer
+            self._formats[serializer.format] = serializer
+            self._dispatch.clear()
+
+    def unregister(self, type_: Union[type, str]) -> None:
+        """
+        Remove the serializer registered for ``type_``
+
+        :param type_: a class or a ``"module:attribute"`` string passed to ``register``
+        :raises KeyError: if nothing is registered for ``type_``
+        """
+        with self._lock:
+            cls = self._resolved.get(type_, type_)
+            if type_ in self._pending:
+                serializer = self._pending.pop(type_)
+            elif cls in self._types:
+                serializer = self._types.pop(cls)
+                self._resolved = {
+                    name: value for name, value in self._resolved.items() if value is not cls
+                }
+            else:
+                raise KeyError(f"No serializer registered for {type_}")
+
+            registered = list(self._types.values()) + list(self._pending.values())
+            if all(other.format != serializer.format for other in registered):
+                del self._formats[serializer.format]
+            self._dispatch.clear()
+
+    def lookup(self, obj: Any) -> Optional[Serializer]:
+        """
+        Return the serializer of ``obj`` or None if its type is not supported
+        """
+        cls = type(obj)
+        if self._pending:
+            self._resolve_pending()
+
+        try:
+            return self._dispatch[cls]
+        except KeyError:
+            pass
+
+        serializer = next(
+            (self._types[klass] for klass in cls.__mro__ if klass in self._types), None
+        )
+        self._dispatch[cls] = serializer
+        return serializer
+
+    def get(self, format: str) -> Serializer:
+        """
+        Return the serializer of a format recorded in METAINFO.yaml
+        """
+        if format not in self._formats:
+            raise ValueError(f"No serializer registered for the {format} format")
+        return self._formats[format]
+
+    def _resolve_pending(self):
+        with self._lock:
+            for type_name, serializer in list(self._pending.items()):
+                module_name, attributes = type_name.split(":")
+                value = sys.modules.get(module_name)
+                if value is None:
+                    continue
+
+                try:
+                    for attribute in attributes.split("."):
+                        value = getattr(value, attribute)
+                except AttributeError:
+                    # the module is still being imported
+                    continue
+
+                self._types[value] = serializer
+                self._resolved[type_name] = value
+                del self._pending[type_name]
+                self._dispatch.clear()
+
+
+SERIALIZERS = SerializerRegistry()
+SERIALIZERS.register("sklearn.base:BaseEstimator", JoblibSerializer())
+SERIALIZERS.register("sklearn.ensemble:RandomForestClassifier", ForestSerializer())
+SERIALIZERS.register("sklearn.ensemble:RandomForestRegressor", ForestSerializer())
+SERIALIZERS.register("sklearn.ensemble:ExtraTreesClassifier", ForestSerializer())
+SERIALIZERS.register("sklearn.ensemble:ExtraTreesRegressor", ForestSerializer())
+SERIALIZERS.register("tensorflow:keras.Model", KerasWeightsSerializer())
+SERIALIZERS.register("skfuzzy.control:ControlSystemSimulation", SkfuzzySerializer())
+SERIALIZERS.register("numpy:ndarray", NumpySerializer())
+SERIALIZERS.register("pandas:DataFrame", ParquetSerializer())
+SERIALIZERS.register("pandas:Series", SeriesParquetSerializer())
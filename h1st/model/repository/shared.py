@@ -0,0 +1,262 @@
+import os
+import shutil
+import ctypes
+import hashlib
+import logging
+import tempfile
+import threading
+import contextlib
+from typing import Callable, Dict, List
+
+from h1st.model.repository.storage.base import SEP
+from h1st.model.repository.storage.utils import file_lock
+
+logger = logging.getLogger(__name__)
+
+
+def _default_root():
+    # /dev/shm is a RAM-backed filesystem on Linux, pages of its files are never
+    # written to disk and are shared by all processes mapping them
+    base = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(base, "h1st-models")
+
+
+class SharedModelStore:
+    """
+    Extracted model versions shared by the processes of a host.
+
+    Each version is extracted once into a folder of the store, by default on the
+    RAM-backed ``/dev/shm``. A repository using the store loads arrays, i.e. numpy
+    arrays, ``stats`` and the arrays of sklearn models, as read-only memory maps of
+    these files, so N processes loading the same version hold a single copy of them
+    in RAM instead of N. Typically the parent process of a pre-fork server loads its
+    models once, then the workers it forks load the same versions and attach to the
+    extracted folders instead of downloading them again:
+
+        .. code-block:: python
+
+            store = SharedModelStore()
+            ModelRepository.MODEL_REPO = ModelRepository(storage=url, shared_store=store)
+            model = MyModel().load(version)
+
+    Processes hold a reference on the versions they attached to, recorded as a lease
+    file named after their pid. A version is removed when its last reference is
+    released, and ``cleanup`` removes the leases of dead processes, e.g. killed
+    workers, and the versions nobody references anymore. Removing a version does not
+    invalidate the memory maps of processes still using it.
+    """
+
+    LEASES = ".leases"
+    LOCKS = ".locks"
+
+    def __init__(self, path: str = None):
+        """
+        :param path: folder of the store, leave blank for ``/dev/shm/h1st-models`` or
+            a folder of the temporary directory if ``/dev/shm`` does not exist
+        """
+        self.path = path or _default_root()
+        self._refs = {}
+        self._pid = os.getpid()
+        # guards the references and the locks of the keys
+        self._lock = threading.RLock()
+        self._key_locks = {}
+
+    def attach(self, key: str, fetch: Callable[[str], None]) -> str:
+        """
+        Return the folder of a version, extracting it first if no process did, and
+        take a reference on it
+
+        :param key: repository key of the version
+        :param fetch: function writing the version into the folder passed to it
+        :returns: the folder of the version
+        """
+        path = self.get_path(key)
+        # only the attaches of the same version wait for its extraction
+        with self._key_lock(key):
+            if not os.path.exists(path):
+                self._extract(path, fetch)
+
+            with self._lock:
+                refs = self._get_refs()
+                if refs.get(key, 0) == 0:
+                    folder = self._get_lease_folder(key)
+                    os.makedirs(folder, exist_ok=True)
+                    with open(os.path.join(folder, "key"), "w") as f:
+                        f.write(key)
+                    open(os.path.join(folder, str(os.getpid())), "w").close()
+                refs[key] = refs.get(key, 0) + 1
+
+        return path
+
+    def release(self, key: str) -> None:
+        """
+        Drop a reference taken by ``attach``, the version is removed from the store
+        once no process references it
+
+        :param key: repository key of the version
+        :raises KeyError: if this process does not reference the version
+        """
+        with self._key_lock(key), self._lock:
+            refs = self._get_refs()
+            if refs.get(key, 0) == 0:
+                raise KeyError(f"Version {key} is not attached by this process")
+
+            refs[key] -= 1
+            if refs[key] > 0:
+                return
+
+            del refs[key]
+            lease = os.path.join(self._get_lease_folder(key), str(os.getpid()))
+            if os.path.exists(lease):
+                os.remove(lease)
+            if not self._get_live_pids(key):
+                self._remove(key)
+
+    def remove(self, key: str) -> None:
+        """
+        Remove a version from the store whatever its references, e.g. after it was
+        persisted again. Processes attached to it keep their memory maps.
+        """
+        with self._key_lock(key):
+            self._remove(key)
+
+    def cleanup(self) -> List[str]:
+        """
+        Remove the leases of dead processes and the versions no live process references
+
+        :returns: keys of the removed versions
+        """
+        removed = []
+        for key in self.list_keys():
+            with self._key_lock(key):
+                if not self._get_live_pids(key):
+                    self._remove(key)
+                    removed.append(key)
+        return removed
+
+    def list_keys(self) -> List[str]:
+        """
+        Return the keys of the versions in the store
+        """
+        leases = os.path.join(self.path, self.LEASES)
+        keys = []
+        if not os.path.isdir(leases):
+            return keys
+
+        for digest in sorted(os.listdir(leases)):
+            key_file = os.path.join(leases, digest, "key")
+            if os.path.exists(key_file):
+                with open(key_file) as f:
+                    keys.append(f.read())
+        return keys
+
+    def info(self) -> Dict[str, List[int]]:
+        """
+        Return the pids of the live processes referencing each version
+        """
+        info = {}
+        for key in self.list_keys():
+            with self._key_lock(key):
+                info[key] = self._get_live_pids(key)
+        return info
+
+    def get_path(self, key: str) -> str:
+        """
+        Return the folder a version is extracted into
+        """
+        key = key.replace("/", "_").replace("..", "__").replace(SEP, "/")
+        return os.path.join(self.path, key)
+
+    def _extract(self, path, fetch):
+        os.makedirs(self.path, exist_ok=True)
+        tmpdir = tempfile.mkdtemp(dir=self.path, prefix=".tmp-")
+        try:
+            extracted_dir = os.path.join(tmpdir, "serialized")
+            fetch(extracted_dir)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.rename(extracted_dir, path)
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def _remove(self, key):
+        logger.info("Removing %s from the shared model store" % key)
+        shutil.rmtree(self.get_path(key), ignore_errors=True)
+        shutil.rmtree(self._get_lease_folder(key), ignore_errors=True)
+
+    def _get_refs(self):
+        # a forked process does not inherit the references of its parent
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._refs = {}
+        return self._refs
+
+    def _get_live_pids(self, key):
+        """
+        Return the pids of the live processes referencing ``key``, removing the leases
+        of dead ones
+        """
+        folder = self._get_lease_folder(key)
+        if not os.path.isdir(folder):
+            return []
+
+        pids = []
+        for name in os.listdir(folder):
+            if not name.isdigit():
+                continue
+
+            pid = int(name)
+            if _is_alive(pid):
+                pids.append(pid)
+            else:
+                os.remove(os.path.join(folder, name))
+        return sorted(pids)
+
+    def _get_lease_folder(self, key):
+        digest = hashlib.sha1(key.encode()).hexdigest()
+        return os.path.join(self.path, self.LEASES, digest)
+
+    @contextlib.contextmanager
+    def _key_lock(self, key):
+        """
+        Hold the lock of a version across the threads and processes of the host
+        """
+        with self._lock:
+            lock = self._key_locks.setdefault(key, threading.RLock())
+
+        digest = hashlib.sha1(key.encode()).hexdigest()
+        with lock, file_lock(os.path.join(self.path, self.LOCKS, digest)):
+            yield
+
+
+def _is_alive(pid):
+    if os.name == "nt":
+        # os.kill terminates the process on Windows, whatever the signal
+        return _is_alive_windows(pid)
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # the process exists but belongs to another user
+        return True
+    return True
+
+
+def _is_alive_windows(pid):
+    process_query_limited_information = 0x1000
+    still_active = 259
+
+    kernel32 = ctypes.windll.kernel32
+    handle = kernel32.OpenProcess(process_query_limited_information, False, pid)
+    if not handle:
+        # access is denied to the processes of other users, which exist
+        return ctypes.GetLastError() == 5
+
+    try:
+        exit_code = ctypes.c_ulong()
+        if not kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code)):
+            return True
+        return exit_code.value == still_active
+    finally:
+        kernel32.CloseHandle(handle)
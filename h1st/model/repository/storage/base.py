@@ -1,6 +1,10 @@
-from typing import Union, Any, NoReturn
+import contextlib
+from typing import Any, NoReturn, List, ContextManager
 from abc import ABC, abstractmethod
 
+# separator of the namespaces of names, e.g. ``_models::my.Model::v1``
+SEP = "::"
+
 
 class Storage(ABC):
     """
@@ -31,6 +35,56 @@ class Storage(ABC):
     def delete(self, name: str) -> Any:
         ...
 
+    def get_bytes_many(self, names: List[str]) -> List[bytes]:
+        """
+        Retrieve the values of many objects, storages with a high latency per request
+        should fetch them concurrently or in batches
+
+        :raises KeyError: if an object does not exist
+        """
+        return [self.get_bytes(name) for name in names]
+
+    def get_size(self, name: str) -> int:
+        """
+        Return the size in bytes of an object, storages should read it from the
+        metadata of the object rather than fetch its value
+
+        :raises KeyError: if the object does not exist
+        """
+        return len(self.get_bytes(name))
+
+    def get_size_many(self, names: List[str]) -> List[int]:
+        """
+        Return the sizes in bytes of many objects, storages with a high latency per
+        request should look them up concurrently or in batches
+
+        :raises KeyError: if an object does not exist
+        """
+        return [self.get_size(name) for name in names]
+
+    def exists_many(self, names: List[str]) -> List[bool]:
+        """
+        Return for each name whether the object exists, storages with a high latency
+        per request should check the names concurrently or in batches
+        """
+        return [self.exists(name) for name in names]
+
+    def delete_many(self, names: List[str]) -> NoReturn:
+        """
+        Delete many objects, missing objects are ignored. Storages with a high latency
+        per request should delete in batches.
+        """
+        for name in names:
+            self.delete(name)
+
+    def lock(self, name: str) -> ContextManager:
+        """
+        Return a context manager holding an exclusive lock on a name across processes,
+        e.g. around read-modify-write updates of the ``latest`` pointer. Storages
+        without locking support return a no-op context.
+        """
+        return contextlib.nullcontext()
+
     def delete_namespace(self, namespace: str):
         raise NotImplementedError()
 
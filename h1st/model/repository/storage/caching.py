@@ -0,0 +1,168 @@
+import os
+import logging
+from typing import Any, List, NoReturn
+
+from h1st.model.repository.storage.base import Storage
+from h1st.model.repository.storage.utils import atomic_open, file_lock
+
+logger = logging.getLogger(__name__)
+
+
+class CachingStorage(Storage):
+    """
+    Read-through cache on local disk in front of another storage.
+
+    Byte values, i.e. model archives, fetched from the backend storage are kept in a
+    local folder bounded by ``max_bytes``; the least recently used files are evicted
+    first. Objects such as the ``latest`` pointer are mutable and always go to the
+    backend.
+
+    Cache files are written atomically and eviction runs under an advisory lock, so
+    several processes of the same host can share one cache folder.
+
+        .. code-block:: python
+           :caption: Caching S3 model archives on local disk
+
+           storage = CachingStorage(S3Storage("my-bucket", "models"), "/var/cache/h1st")
+           repo = ModelRepository(storage=storage)
+    """
+
+    LOCK_FILE = ".lock"
+
+    def __init__(self, storage: Storage, cache_dir: str, max_bytes: int = 10 * 2 ** 30):
+        """
+        :param storage: backend storage
+        :param cache_dir: local folder to keep cached values in
+        :param max_bytes: maximum size of the cache folder
+        """
+        self.storage = storage
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def get_obj(self, name: str) -> Any:
+        return self.storage.get_obj(name)
+
+    def set_obj(self, name: str, value: Any) -> NoReturn:
+        self.storage.set_obj(name, value)
+
+    def get_bytes(self, name: str) -> bytes:
+        """
+        Retrieve object value in bytes from the cache, or from the backend on a miss
+
+        :param name: object name
+        """
+        path = self._to_path(name)
+        try:
+            with open(path, "rb") as f:
+                value = f.read()
+            os.utime(path)  # mark as recently used
+            self.hits += 1
+            return value
+        except FileNotFoundError:
+            # not cached or evicted by another process in the meantime
+            pass
+
+        self.misses += 1
+        value = self.storage.get_bytes(name)
+        self._cache(name, value)
+        return value
+
+    def set_bytes(self, name: str, value: bytes) -> NoReturn:
+        """
+        Write the value through to the backend and keep it in the cache
+        """
+        self.storage.set_bytes(name, value)
+        self._cache(name, value)
+
+    def get_size(self, name: str) -> int:
+        return self.storage.get_size(name)
+
+    def get_size_many(self, names: List[str]) -> List[int]:
+        return self.storage.get_size_many(names)
+
+    def exists(self, name: str) -> bool:
+        return self.storage.exists(name)
+
+    def exists_many(self, names: List[str]) -> List[bool]:
+        return self.storage.exists_many(names)
+
+    def delete(self, name: str) -> NoReturn:
+        self.storage.delete(name)
+        self._discard(name)
+
+    def delete_many(self, names: List[str]) -> NoReturn:
+        self.storage.delete_many(names)
+        for name in names:
+            self._discard(name)
+
+    def lock(self, name: str):
+        return self.storage.lock(name)
+
+    def list_keys(self, namespace: str = "") -> list:
+        return self.storage.list_keys(namespace)
+
+    def delete_namespace(self, namespace: str):
+        self.storage.delete_namespace(namespace)
+        self.clear()
+
+    def clear(self):
+        """
+        Remove all cached values
+        """
+        with file_lock(os.path.join(self.cache_dir, self.LOCK_FILE)):
+            for path, _, _ in self._cached_files():
+                _remove(path)
+
+    def _cache(self, name, value):
+        if len(value) > self.max_bytes:
+            return
+
+        try:
+            with atomic_open(self._to_path(name)) as f:
+                f.write(value)
+            self._evict()
+        except OSError:
+            # caching is best effort, the backend is the source of truth
+            logger.warning("Unable to cache %s in %s", name, self.cache_dir, exc_info=True)
+
+    def _discard(self, name):
+        _remove(self._to_path(name))
+
+    def _evict(self):
+        with file_lock(os.path.join(self.cache_dir, self.LOCK_FILE)):
+            files = sorted(self._cached_files(), key=lambda file: file[2])
+            total = sum(size for _, size, _ in files)
+            for path, size, _ in files:
+                if total <= self.max_bytes:
+                    break
+                _remove(path)
+                total -= size
+
+    def _cached_files(self):
+        """
+        Yield (path, size, last used time) of all cached files
+        """
+        for root, _, filenames in os.walk(self.cache_dir):
+            for filename in filenames:
+                if filename == self.LOCK_FILE or filename.startswith(".tmp-"):
+                    continue
+
+                path = os.path.join(root, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+    def _to_path(self, name):
+        key = name.replace("/", "_").replace("..", "__").replace("::", "/")
+        return os.path.join(self.cache_dir, key)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,154 @@
+import posixpath
+from typing import Any, List, NoReturn
+
+from h1st.model.repository.storage import pickling
+from h1st.model.repository.storage.base import Storage
+
+
+class FsspecStorage(Storage):
+    """
+    Provide data storage on top of any fsspec filesystem, e.g. ``file://``,
+    ``memory://``, ``s3://`` or ``gcs://`` urls.
+
+    The filesystem instance is shared by all storages of the same protocol and
+    options in the process, so connections are reused. Batches of objects are
+    read with a single ``cat`` call, which async filesystems run concurrently.
+    """
+
+    def __init__(self, url: str, **storage_options):
+        """
+        :param url: fsspec url of the root folder, e.g. ``gcs://bucket/models``
+        :param storage_options: options of the filesystem, e.g. credentials
+        """
+        from fsspec.core import url_to_fs
+
+        self.url = url
+        self.fs, self.root = url_to_fs(url, **storage_options)
+        self.root = self.root.rstrip("/")
+        # local folders have to be created before writing, object stores have no folders
+        self._mkdirs = "file" in self.fs.protocol
+
+    def get_obj(self, name: str) -> Any:
+        """
+        Retrieve object value
+
+        :param name: object name
+        """
+        return pickling.loads(self.get_bytes(name))
+
+    def get_bytes(self, name: str) -> bytes:
+        """
+        Retrieve object value in bytes
+
+        :param name: object name
+        """
+        try:
+            return self.fs.cat_file(self._to_key(name))
+        except FileNotFoundError as ex:
+            raise KeyError(name) from ex
+
+    def get_bytes_many(self, names: List[str]) -> List[bytes]:
+        """
+        Retrieve many objects with a single ``cat`` call
+        """
+        keys = [self._to_key(name) for name in names]
+        if not keys:
+            return []
+
+        values = self.fs.cat(keys, on_error="return")
+        result = []
+        for name, key in zip(names, keys):
+            value = values.get(key, values.get(self.fs._strip_protocol(key)))
+            if value is None or isinstance(value, FileNotFoundError):
+                raise KeyError(name)
+            if isinstance(value, Exception):
+                raise value
+            result.append(value)
+
+        return result
+
+    def set_obj(self, name: str, value: Any) -> NoReturn:
+        """
+        Set key value to a python object
+
+        :param name: object name
+        :param value: value in python object
+        """
+        self.set_bytes(name, pickling.dumps(value))
+
+    def set_bytes(self, name: str, value: bytes) -> NoReturn:
+        """
+        Set a key value to a list of bytes
+
+        :param name: object name
+        :param value: value in bytes
+        """
+        key = self._to_key(name)
+        if self._mkdirs:
+            self.fs.makedirs(posixpath.dirname(key), exist_ok=True)
+        self.fs.pipe_file(key, value)
+
+    def get_size(self, name: str) -> int:
+        """
+        Return the size of an object from its metadata
+
+        :param name: object name
+        """
+        try:
+            return self.fs.size(self._to_key(name))
+        except FileNotFoundError as ex:
+            raise KeyError(name) from ex
+
+    def exists(self, name: str) -> bool:
+        """
+        Return true if object exists in the storage
+        """
+        return self.fs.exists(self._to_key(name))
+
+    def delete(self, name: str) -> NoReturn:
+        """
+        Delete an object in storage
+        """
+        try:
+            self.fs.rm(self._to_key(name))
+        except FileNotFoundError:
+            pass
+
+    def delete_many(self, names: List[str]) -> NoReturn:
+        """
+        Delete many objects with a single bulk ``rm`` call
+        """
+        keys = [self._to_key(name) for name in names]
+        try:
+            if keys:
+                self.fs.rm(keys)
+        except FileNotFoundError:
+            # some objects were already deleted
+            super().delete_many(names)
+
+    def list_keys(self, namespace: str = "") -> list:
+        """
+        List the names directly under a namespace with a single listing
+        """
+        try:
+            paths = self.fs.ls(self._to_key(namespace), detail=False)
+        except FileNotFoundError:
+            return []
+
+        return sorted(posixpath.basename(path.rstrip("/")) for path in paths)
+
+    def delete_namespace(self, namespace: str):
+        """
+        Delete all objects under a namespace with one recursive removal
+        """
+        if not namespace:
+            return
+
+        try:
+            self.fs.rm(self._to_key(namespace), recursive=True)
+        except FileNotFoundError:
+            pass
+
+    def _to_key(self, name):
+        name = name.replace("/", "_").replace("..", "__").replace("::", "/")
+        return f"{self.root}/{name}" if name else self.root
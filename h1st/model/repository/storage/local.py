@@ -1,9 +1,11 @@
 import os
 import pathlib
-from typing import Any, NoReturn
-import cloudpickle
-from distutils import dir_util
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, NoReturn
+from h1st.model.repository.storage import pickling
 from h1st.model.repository.storage.base import Storage
+from h1st.model.repository.storage.utils import atomic_open, file_lock
 
 
 class LocalStorage(Storage):
@@ -11,8 +13,15 @@ class LocalStorage(Storage):
     Provide data storage on top of local file system
     """
 
-    def __init__(self, storage_path=None):
+    def __init__(self, storage_path=None, use_locks=True):
+        """
+        :param storage_path: root folder of the storage
+        :param use_locks: make ``lock`` hold an advisory file lock so processes sharing
+            the folder update pointers one at a time, values are always written
+            atomically
+        """
         self.storage_path = storage_path
+        self.use_locks = use_locks
 
     def get_obj(self, name: str) -> Any:
         """
@@ -24,8 +33,7 @@ class LocalStorage(Storage):
         if not os.path.exists(key):
             raise KeyError(name)
 
-        with open(key, "rb") as f:
-            return cloudpickle.load(f)
+        return pickling.load_file(key)
 
     def get_bytes(self, name: str) -> bytes:
         """
@@ -49,9 +57,8 @@ class LocalStorage(Storage):
         """
         key = self._to_key(name)
 
-        os.makedirs(os.path.dirname(key), mode=0o777, exist_ok=True)
-        with open(key, "wb") as f:
-            return cloudpickle.dump(value, f)
+        with atomic_open(key) as f:
+            pickling.dump_file(value, f)
 
     def set_bytes(self, name, value):
         """
@@ -62,10 +69,21 @@ class LocalStorage(Storage):
         """
         key = self._to_key(name)
 
-        os.makedirs(os.path.dirname(key), mode=0o777, exist_ok=True)
-        with open(key, "wb") as f:
+        # readers see either the previous or the complete new value
+        with atomic_open(key) as f:
             return f.write(value)
 
+    def get_size(self, name: str) -> int:
+        """
+        Return the size of the file of an object
+
+        :param name: object name
+        """
+        try:
+            return os.path.getsize(self._to_key(name))
+        except FileNotFoundError:
+            raise KeyError(name) from None
+
     def exists(self, name: str) -> bool:
         """
         Return true if object exists in the storage
@@ -82,6 +100,26 @@ class LocalStorage(Storage):
         if os.path.exists(key):
             os.remove(key)
 
+    def delete_many(self, names: List[str]) -> NoReturn:
+        """
+        Delete many objects with concurrent unlinks
+        """
+        if len(names) <= 1:
+            return super().delete_many(names)
+
+        with ThreadPoolExecutor(max_workers=min(len(names), 16)) as pool:
+            list(pool.map(self.delete, names))
+
+    def lock(self, name: str):
+        """
+        Hold an advisory lock on a name, shared by all processes of the host
+        """
+        if not self.use_locks:
+            return super().lock(name)
+
+        key = self._to_key(name)
+        return file_lock(os.path.join(os.path.dirname(key), ".%s.lock" % os.path.basename(key)))
+
     def list_keys(self, namespace="") -> list:
         key = namespace.replace("/", "_").replace("..", "__").replace("::", "/")
         if key:
@@ -89,7 +127,10 @@ class LocalStorage(Storage):
         else:
             path = self.storage_path
 
-        return list(sorted([p.name for p in pathlib.Path(path).glob('*')]))
+        # hidden files are locks and temporary files of writes in progress
+        return list(sorted([
+            p.name for p in pathlib.Path(path).glob('*') if not p.name.startswith(".")
+        ]))
 
     def delete_namespace(self, namespace):
         if not namespace:
@@ -98,7 +139,7 @@ class LocalStorage(Storage):
         key = namespace.replace("/", "_").replace("..", "__").replace("::", "/")
         path = pathlib.Path(os.path.join(self.storage_path, key))
         if path.exists() and path.is_dir():
-            dir_util.remove_tree(str(path))
+            shutil.rmtree(str(path))
 
     def _to_key(self, key):
         # TODO: make sure it is a safe name
@@ -0,0 +1,64 @@
+import threading
+from typing import Any, NoReturn
+
+from h1st.model.repository.storage import pickling
+from h1st.model.repository.storage.base import Storage
+
+
+class MemoryStorage(Storage):
+    """
+    Provide data storage in the memory of the current process, e.g. as the fastest
+    tier of a ``TieredStorage`` or for tests
+    """
+
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def get_obj(self, name: str) -> Any:
+        """
+        Retrieve object value
+
+        :param name: object name
+        """
+        return pickling.loads(self.get_bytes(name))
+
+    def get_bytes(self, name: str) -> bytes:
+        """
+        Retrieve object value in bytes
+
+        :param name: object name
+        """
+        try:
+            return self._values[name]
+        except KeyError:
+            raise KeyError(name) from None
+
+    def set_obj(self, name: str, value: Any) -> NoReturn:
+        self.set_bytes(name, pickling.dumps(value))
+
+    def set_bytes(self, name: str, value: bytes) -> NoReturn:
+        with self._lock:
+            self._values[name] = bytes(value)
+
+    def exists(self, name: str) -> bool:
+        return name in self._values
+
+    def delete(self, name: str) -> NoReturn:
+        with self._lock:
+            self._values.pop(name, None)
+
+    def list_keys(self, namespace: str = "") -> list:
+        prefix = namespace + "::" if namespace else ""
+        with self._lock:
+            names = [name[len(prefix):] for name in self._values if name.startswith(prefix)]
+        return sorted({name.split("::", 1)[0] for name in names})
+
+    def delete_namespace(self, namespace: str):
+        if not namespace:
+            return
+
+        prefix = namespace + "::"
+        with self._lock:
+            for name in [name for name in self._values if name.startswith(prefix)]:
+                del self._values[name]
@@ -0,0 +1,127 @@
+"""
+Pickle protocol 5 format with out-of-band buffers used by ``Storage.set_obj``.
+
+Large contiguous buffers, e.g. the data of numpy arrays, are not copied into the
+pickle stream but stored after it, each aligned on 64 bytes::
+
+    MAGIC | n_buffers | pickle_size | (offset, size) * n_buffers | pickle | buffers
+
+so they can be handed back to ``pickle.loads`` as zero-copy slices of the stored bytes
+or of a memory-mapped file. Values without out-of-band buffers, e.g. the ``latest``
+pointer, are stored as a plain pickle, as are values written with ``cloudpickle.dump``
+before this format existed.
+"""
+import mmap
+import ctypes
+import pickle
+import struct
+from typing import Any, List, Union
+
+import cloudpickle
+
+MAGIC = b"H1STPK5\n"
+ALIGNMENT = 64
+MIN_OUT_OF_BAND_SIZE = 4096
+
+_COUNTS = struct.Struct("<QQ")
+_ENTRY = struct.Struct("<QQ")
+
+
+def dump_chunks(value: Any) -> List[Union[bytes, memoryview]]:
+    """
+    Pickle a value into the chunks of the stored format, buffers are not copied
+    """
+    buffers = []
+
+    def buffer_callback(buffer):
+        try:
+            raw = buffer.raw()
+        except BufferError:  # not contiguous
+            return True
+
+        if raw.nbytes < MIN_OUT_OF_BAND_SIZE:
+            return True
+
+        buffers.append(raw)
+        return False
+
+    data = cloudpickle.dumps(value, protocol=5, buffer_callback=buffer_callback)
+    if not buffers:
+        return [data]
+
+    offset = len(MAGIC) + _COUNTS.size + _ENTRY.size * len(buffers) + len(data)
+    entries, chunks = [], []
+    for buffer in buffers:
+        padding = -offset % ALIGNMENT
+        if padding:
+            chunks.append(b"\0" * padding)
+        offset += padding
+        entries.append(_ENTRY.pack(offset, buffer.nbytes))
+        chunks.append(buffer)
+        offset += buffer.nbytes
+
+    return [MAGIC, _COUNTS.pack(len(buffers), len(data)), *entries, data, *chunks]
+
+
+def dumps(value: Any) -> bytes:
+    """
+    Pickle a value into the bytes of the stored format
+    """
+    return b"".join(dump_chunks(value))
+
+
+def loads(data: Union[bytes, memoryview, mmap.mmap]) -> Any:
+    """
+    Unpickle a value, out-of-band buffers are slices of ``data`` and are not copied
+    unless ``data`` is read-only
+    """
+    view = memoryview(data)
+    if bytes(view[:len(MAGIC)]) != MAGIC:
+        return cloudpickle.loads(view)
+
+    position = len(MAGIC)
+    n_buffers, pickle_size = _COUNTS.unpack_from(view, position)
+    position += _COUNTS.size
+    if n_buffers and view.readonly:
+        # e.g. bytes, loaded arrays would be read-only
+        view = _aligned_copy(view)
+
+    buffers = []
+    for _ in range(n_buffers):
+        offset, size = _ENTRY.unpack_from(view, position)
+        buffers.append(view[offset:offset + size])
+        position += _ENTRY.size
+
+    return pickle.loads(view[position:position + pickle_size], buffers=buffers)
+
+
+def _aligned_copy(view):
+    buffer = bytearray(view.nbytes + ALIGNMENT)
+    address = ctypes.addressof(ctypes.c_char.from_buffer(buffer))
+    start = -address % ALIGNMENT
+    copy = memoryview(buffer)[start:start + view.nbytes]
+    copy[:] = view
+    return copy
+
+
+def load_file(path: str) -> Any:
+    """
+    Unpickle a stored file, out-of-band buffers are memory-mapped copy-on-write so
+    arrays are loaded without reading them and stay writable
+    """
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            f.seek(0)
+            return cloudpickle.load(f)
+
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+
+    return loads(data)
+
+
+def dump_file(value: Any, f) -> None:
+    """
+    Write a value to a binary file in the stored format
+    """
+    for chunk in dump_chunks(value):
+        f.write(chunk)
@@ -1,22 +1,60 @@
-from typing import Any, NoReturn
-import cloudpickle
-import s3fs
+import re
+import errno
+import base64
+import asyncio
+import hashlib
+import logging
+from typing import Any, NoReturn, List
+from concurrent.futures import ThreadPoolExecutor
+from h1st.model.repository.storage import pickling
 from h1st.model.repository.storage.base import Storage
 
+logger = logging.getLogger(__name__)
+
+# metadata recording the part size of multipart uploads, to verify their ETag
+PART_SIZE_METADATA = "h1st-part-size"
+
 
 class S3Storage(Storage):
     """
     Provide data storage on top of AWS S3
+
+    S3 has no locks, ``lock`` is a no-op. Read-modify-write updates of the same key
+    from several processes, e.g. of the version index of a model persisted
+    concurrently on several hosts, may overwrite each other.
     """
 
-    def __init__(self, bucket_name: str = "", prefix: str = ""):
+    def __init__(
+        self,
+        bucket_name: str = "",
+        prefix: str = "",
+        part_size: int = 64 * 2 ** 20,
+        max_concurrency: int = 8,
+        verify_checksums: bool = True,
+        storage_options: dict = None,
+    ):
         """
         :param bucket_name: s3 bucket name to store data into
         :param prefix: s3 object prefix, leave blank to store at bucket root
+        :param part_size: size of the parts of multipart uploads and ranged downloads,
+            at least 5MB. Values larger than a part are transferred in parallel.
+        :param max_concurrency: maximum number of parts transferred concurrently
+        :param verify_checksums: send the MD5 of each uploaded part for S3 to verify and
+            check downloaded bytes against the ETag, part by part for multipart uploads.
+            Objects encrypted with SSE-KMS or SSE-C, whose ETags are not MD5 digests,
+            are not checked.
+        :param storage_options: options of ``s3fs.S3FileSystem``, e.g. credentials or
+            ``client_kwargs`` with an ``endpoint_url``
         """
         self.bucket_name = bucket_name
         self.prefix = prefix
-        self.fs = s3fs.S3FileSystem()
+        self.part_size = part_size
+        self.max_concurrency = max_concurrency
+        self.verify_checksums = verify_checksums
+
+        import s3fs  # imported on use, it pulls in botocore and aiohttp
+
+        self.fs = s3fs.S3FileSystem(**(storage_options or {}))
 
     def get_obj(self, name: str) -> Any:
         """
@@ -27,23 +65,79 @@ class S3Storage(Storage):
         key = self._to_key(name)
         try:
             with self.fs.open(key, 'rb') as f:
-                return cloudpickle.load(f)
+                data = bytearray(f.size)
+                f.readinto(data)
+            return pickling.loads(data)
         except FileNotFoundError as ex:
             raise KeyError(name) from ex
 
     def get_bytes(self, name) -> bytes:
         """
-        Retrieve object value in bytes
+        Retrieve object value in bytes, large objects are downloaded as concurrent
+        ranged requests of ``part_size`` bytes
 
         :param name: object name
         """
-        key = self._to_key(name)
+        from fsspec.asyn import sync
+
+        bucket, key = self._to_key(name).split("/", 1)
         try:
-            with self.fs.open(key, 'rb') as f:
-                return f.read()
+            response, parts = sync(self.fs.loop, self._get_parts, bucket, key)
         except FileNotFoundError as ex:
             raise KeyError(name) from ex
 
+        value = b"".join(parts)
+        if not self.verify_checksums:
+            return value
+
+        if response.get("ServerSideEncryption", "").startswith("aws:kms") or response.get(
+            "SSECustomerAlgorithm"
+        ):
+            logger.debug("%s is encrypted with SSE-KMS or SSE-C, not verified" % name)
+            return value
+
+        part_size = response.get("Metadata", {}).get(PART_SIZE_METADATA)
+        self._verify(name, value, response.get("ETag"), int(part_size or self.part_size))
+        return value
+
+    async def _get_parts(self, bucket, key):
+        """
+        Download an object as concurrent ranged requests of ``part_size`` bytes, the
+        first response, e.g. its ETag and metadata, is returned with the parts
+        """
+        try:
+            response, first = await self._get_range(bucket, key, 0, self.part_size)
+        except OSError as ex:
+            if ex.errno != errno.EINVAL:
+                raise
+            # ranges of empty objects are not satisfiable
+            response, first = await self._get_range(bucket, key)
+
+        match = re.match(r"bytes \d+-\d+/(\d+)", response.get("ContentRange") or "")
+        size = int(match.group(1)) if match else len(first)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def get_part(start):
+            async with semaphore:
+                # fails if the object is replaced in the meantime
+                _, part = await self._get_range(
+                    bucket, key, start, self.part_size, IfMatch=response["ETag"]
+                )
+            return part
+
+        others = await asyncio.gather(
+            *[get_part(start) for start in range(self.part_size, size, self.part_size)]
+        )
+        return response, [first] + list(others)
+
+    async def _get_range(self, bucket, key, start=None, length=None, **kwargs):
+        if start is not None:
+            kwargs["Range"] = "bytes=%d-%d" % (start, start + length - 1)
+        response = await self.fs._call_s3("get_object", Bucket=bucket, Key=key, **kwargs)
+        body = response.pop("Body")
+        async with body:
+            return response, await body.read()
+
     def set_obj(self, name: str, value: Any) -> NoReturn:
         """
         Set key value to a python object
@@ -54,19 +148,100 @@ class S3Storage(Storage):
         key = self._to_key(name)
 
         with self.fs.open(key, 'wb') as f:
-            return cloudpickle.dump(value, f)
+            pickling.dump_file(value, f)
 
     def set_bytes(self, name: str, value: bytes) -> NoReturn:
         """
-        Set a key value to a list of bytes
+        Set a key value to a list of bytes, values larger than ``part_size`` are sent as
+        a multipart upload whose parts are uploaded concurrently
 
         :param name: object name
         :param value: value in bytes
         """
-        key = self._to_key(name)
+        bucket, key = self._to_key(name).split("/", 1)
+        if len(value) <= self.part_size:
+            self.fs.call_s3("put_object", Bucket=bucket, Key=key, Body=value, **self._md5(value))
+        else:
+            self._multipart_upload(bucket, key, value)
 
-        with self.fs.open(key, 'wb') as f:
-            f.write(value)
+        self.fs.invalidate_cache(f"{bucket}/{key}")
+
+    def _multipart_upload(self, bucket, key, value):
+        upload_id = self.fs.call_s3(
+            "create_multipart_upload",
+            Bucket=bucket,
+            Key=key,
+            Metadata={PART_SIZE_METADATA: str(self.part_size)},
+        )["UploadId"]
+
+        def upload_part(number):
+            part = value[(number - 1) * self.part_size:number * self.part_size]
+            response = self.fs.call_s3(
+                "upload_part",
+                Bucket=bucket,
+                Key=key,
+                UploadId=upload_id,
+                PartNumber=number,
+                Body=part,
+                **self._md5(part),
+            )
+            return {"PartNumber": number, "ETag": response["ETag"]}
+
+        n_parts = -(-len(value) // self.part_size)
+        try:
+            with ThreadPoolExecutor(max_workers=min(n_parts, self.max_concurrency)) as pool:
+                parts = list(pool.map(upload_part, range(1, n_parts + 1)))
+
+            self.fs.call_s3(
+                "complete_multipart_upload",
+                Bucket=bucket,
+                Key=key,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": parts},
+            )
+        except BaseException:
+            self.fs.call_s3(
+                "abort_multipart_upload", Bucket=bucket, Key=key, UploadId=upload_id
+            )
+            raise
+
+    def _md5(self, value):
+        if not self.verify_checksums:
+            return {}
+        return {"ContentMD5": base64.b64encode(hashlib.md5(value).digest()).decode()}
+
+    def _verify(self, name, value, etag, part_size=None):
+        """
+        Compare downloaded bytes with the ETag of the object, the ETag of a multipart
+        upload is the MD5 of the MD5s of its parts
+
+        :param part_size: part size of the upload, recorded in the metadata of the
+            multipart uploads of this storage, ``part_size`` by default
+        """
+        etag = (etag or "").strip('"')
+        if not etag:
+            return
+
+        if "-" in etag:
+            part_size = part_size or self.part_size
+            n_parts = int(etag.split("-")[1])
+            if n_parts != -(-len(value) // part_size):
+                # e.g. uploaded by another client without the part size metadata
+                logger.warning(
+                    "%s was uploaded with an unknown part size, not verified" % name
+                )
+                return
+
+            digests = b"".join(
+                hashlib.md5(value[start:start + part_size]).digest()
+                for start in range(0, len(value), part_size)
+            )
+            digest = "%s-%d" % (hashlib.md5(digests).hexdigest(), n_parts)
+        else:
+            digest = hashlib.md5(value).hexdigest()
+
+        if digest != etag:
+            raise IOError(f"Checksum mismatch of {name}: expected {etag}, got {digest}")
 
     def exists(self, name: str) -> bool:
         """
@@ -75,6 +250,45 @@ class S3Storage(Storage):
         key = self._to_key(name)
         return self.fs.exists(key)
 
+    def get_size(self, name: str) -> int:
+        """
+        Return the size of an object with a HEAD request
+
+        :param name: object name
+        """
+        try:
+            return self.fs.size(self._to_key(name))
+        except FileNotFoundError:
+            raise KeyError(name) from None
+
+    def get_size_many(self, names: List[str]) -> List[int]:
+        """
+        Return the sizes of many objects with concurrent HEAD requests
+        """
+        if len(names) <= 1:
+            return [self.get_size(name) for name in names]
+
+        with ThreadPoolExecutor(max_workers=min(len(names), 32)) as pool:
+            return list(pool.map(self.get_size, names))
+
+    def get_bytes_many(self, names: List[str]) -> List[bytes]:
+        """
+        Retrieve many objects concurrently with a single batch of s3fs requests
+        """
+        keys = [self._to_key(name) for name in names]
+        values = self.fs.cat(keys, on_error="return") if keys else {}
+        return [_raise_missing(name, values[key]) for name, key in zip(names, keys)]
+
+    def exists_many(self, names: List[str]) -> List[bool]:
+        """
+        Check the existence of many objects with concurrent HEAD requests
+        """
+        if len(names) <= 1:
+            return [self.exists(name) for name in names]
+
+        with ThreadPoolExecutor(max_workers=min(len(names), 32)) as pool:
+            return list(pool.map(self.exists, names))
+
     def delete(self, name: str) -> NoReturn:
         """
         Delete an object in storage
@@ -85,6 +299,65 @@ class S3Storage(Storage):
         except FileNotFoundError:
             pass
 
+    def delete_many(self, names: List[str]) -> NoReturn:
+        """
+        Delete many objects with batched DeleteObjects requests of up to 1000 keys
+
+        :raises IOError: if some objects could not be deleted, once all batches are sent
+        """
+        keys = [self._to_key(name) for name in names]
+        errors = []
+        for start in range(0, len(keys), 1000):
+            response = self.fs.call_s3(
+                "delete_objects",
+                Bucket=self.bucket_name,
+                Delete={
+                    "Objects": [
+                        {"Key": key.split("/", 1)[1]} for key in keys[start:start + 1000]
+                    ],
+                    "Quiet": True,
+                },
+            )
+            # quiet responses only list the failures, missing objects are ignored
+            errors.extend(
+                error for error in response.get("Errors", []) if error.get("Code") != "NoSuchKey"
+            )
+
+        for key in keys:
+            self.fs.invalidate_cache(key)
+
+        if errors:
+            raise IOError(
+                "Could not delete %d objects: %s"
+                % (
+                    len(errors),
+                    ", ".join("%s (%s)" % (error["Key"], error.get("Code")) for error in errors),
+                )
+            )
+
+    def list_keys(self, namespace: str = "") -> list:
+        """
+        List the names directly under a namespace
+        """
+        try:
+            paths = self.fs.ls(self._to_key(namespace), detail=False, refresh=True)
+        except FileNotFoundError:
+            return []
+
+        return sorted(path.rstrip("/").rsplit("/", 1)[-1] for path in paths)
+
+    def delete_namespace(self, namespace: str):
+        """
+        Delete all objects under a namespace, in batches
+        """
+        if not namespace:
+            return
+
+        try:
+            self.fs.rm(self._to_key(namespace), recursive=True)
+        except FileNotFoundError:
+            pass
+
     def _to_key(self, key):
         """
         Convert a key to s3 object key with bucket and prefix
@@ -95,3 +368,11 @@ class S3Storage(Storage):
             key = f"{self.prefix}/{key}"
 
         return f"{self.bucket_name}/{key}"
+
+
+def _raise_missing(name, value):
+    if isinstance(value, FileNotFoundError):
+        raise KeyError(name) from value
+    if isinstance(value, Exception):
+        raise value
+    return value
@@ -0,0 +1,338 @@
+import os
+import logging
+import itertools
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, NoReturn, Optional
+
+from h1st.model.repository.storage.base import Storage
+from h1st.model.repository.storage.local import LocalStorage
+from h1st.model.repository.storage.memory import MemoryStorage
+
+logger = logging.getLogger(__name__)
+
+
+class Tier:
+    """
+    Cache tier of a ``TieredStorage``, bounded by a byte budget
+    """
+
+    def __init__(self, storage: Storage, max_bytes: Optional[int] = None, name: str = None):
+        """
+        :param storage: storage holding the cached values, e.g. ``MemoryStorage`` or a
+            ``LocalStorage`` on a local disk
+        :param max_bytes: maximum size of the values cached in the tier, leave blank for
+            no limit. Values already in a ``LocalStorage`` or ``MemoryStorage`` tier, e.g.
+            cached on disk by a previous process, count towards it.
+        :param name: name of the tier in ``TieredStorage.info``
+        """
+        self.storage = storage
+        self.max_bytes = max_bytes
+        self.name = name or storage.__class__.__name__
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.size = 0
+        self._entries = OrderedDict()  # name -> size, least recently used first
+        self._writing = {}  # name -> number of writes to the tier in progress
+
+
+class TieredStorage(Storage):
+    """
+    Compose cache tiers in front of a backend storage, e.g. memory, then local disk,
+    then S3.
+
+    Reads are served by the fastest tier holding the value, which is then promoted to
+    the faster tiers, and fall back to the backend on a miss. Each tier evicts its least
+    recently used values when over its byte budget. Writes go through to the backend,
+    or are written back on ``flush`` or when evicted from the last tier holding them.
+
+    Objects, e.g. the ``latest`` pointer, are mutable so ``get_obj`` and ``set_obj``
+    always go to the backend. In write-back mode, pending values are flushed before an
+    object is written, so a pointer never refers to a value missing from the backend.
+
+    Tiers are read and written without holding the lock of the storage, which only
+    protects the bookkeeping, so slow writes to a tier do not block readers.
+    """
+
+    def __init__(self, backend: Storage, tiers: List[Tier], write_back: bool = False):
+        """
+        :param backend: storage of record
+        :param tiers: cache tiers, fastest first
+        :param write_back: defer backend writes of ``set_bytes`` until ``flush``
+        """
+        self.backend = backend
+        self.tiers = tiers
+        self.write_back = write_back
+        # name -> generation of the values pending in write-back mode, a value
+        # written again while being flushed stays pending
+        self._dirty = {}
+        self._generations = itertools.count()
+        self._lock = threading.RLock()
+        for tier in self.tiers:
+            self._load_entries(tier)
+
+    def get_obj(self, name: str) -> Any:
+        return self.backend.get_obj(name)
+
+    def set_obj(self, name: str, value: Any) -> NoReturn:
+        self.flush()
+        self.backend.set_obj(name, value)
+
+    def get_bytes(self, name: str) -> bytes:
+        """
+        Retrieve object value in bytes from the fastest tier holding it
+
+        :param name: object name
+        """
+        for i, tier in enumerate(self.tiers):
+            try:
+                value = tier.storage.get_bytes(name)
+            except KeyError:
+                with self._lock:
+                    tier.misses += 1
+                continue
+
+            with self._lock:
+                tier.hits += 1
+                self._touch(tier, name, len(value))
+            for faster_tier in self.tiers[:i]:
+                self._put(faster_tier, name, value)
+            return value
+
+        value = self.backend.get_bytes(name)
+        for tier in self.tiers:
+            self._put(tier, name, value)
+        return value
+
+    def set_bytes(self, name: str, value: bytes) -> NoReturn:
+        """
+        Write a value to the backend, or only to the tiers in write-back mode, and
+        cache it in all tiers
+        """
+        if not self.write_back:
+            self.backend.set_bytes(name, value)
+        else:
+            with self._lock:
+                generation = self._dirty[name] = next(self._generations)
+
+        for tier in self.tiers:
+            self._put(tier, name, value)
+
+        if self.write_back:
+            with self._lock:
+                cached = any(name in tier._entries for tier in self.tiers)
+            if not cached:
+                # too large for all tiers, or evicted and written back already
+                self._write_back(name, value, generation)
+
+    def flush(self) -> None:
+        """
+        Write all values pending in write-back mode to the backend
+        """
+        with self._lock:
+            pending = dict(self._dirty)
+
+        for name, generation in pending.items():
+            try:
+                value = self._get_cached(name)
+            except KeyError:
+                with self._lock:
+                    if self._dirty.get(name) != generation:
+                        # written back by an eviction or written again in the meantime
+                        continue
+                raise IOError(f"The pending value of {name} is missing from all tiers")
+            self._write_back(name, value, generation)
+
+    def get_size(self, name: str) -> int:
+        """
+        Return the size of a value from the bookkeeping of the tiers caching it, or
+        from the backend
+        """
+        with self._lock:
+            for tier in self.tiers:
+                if name in tier._entries:
+                    return tier._entries[name]
+        return self.backend.get_size(name)
+
+    def exists(self, name: str) -> bool:
+        if name in self._dirty:
+            return True
+        return self.backend.exists(name)
+
+    def delete(self, name: str) -> NoReturn:
+        with self._lock:
+            self._dirty.pop(name, None)
+            for tier in self.tiers:
+                self._remove(tier, name)
+        self.backend.delete(name)
+
+    def delete_many(self, names: List[str]) -> NoReturn:
+        with self._lock:
+            for name in names:
+                self._dirty.pop(name, None)
+                for tier in self.tiers:
+                    self._remove(tier, name)
+        self.backend.delete_many(names)
+
+    def lock(self, name: str):
+        return self.backend.lock(name)
+
+    def list_keys(self, namespace: str = "") -> list:
+        self.flush()
+        return self.backend.list_keys(namespace)
+
+    def delete_namespace(self, namespace: str):
+        self.flush()
+        prefix = namespace + "::"
+        with self._lock:
+            for tier in self.tiers:
+                for name in [name for name in tier._entries if name.startswith(prefix)]:
+                    self._remove(tier, name)
+        self.backend.delete_namespace(namespace)
+
+    def info(self) -> List[Dict]:
+        """
+        Return hit/miss metrics of each tier, fastest first
+        """
+        with self._lock:
+            return [
+                {
+                    "name": tier.name,
+                    "hits": tier.hits,
+                    "misses": tier.misses,
+                    "hit_rate": tier.hits / (tier.hits + tier.misses)
+                    if tier.hits + tier.misses
+                    else 0.0,
+                    "evictions": tier.evictions,
+                    "size": tier.size,
+                    "max_bytes": tier.max_bytes,
+                }
+                for tier in self.tiers
+            ]
+
+    def _put(self, tier, name, value):
+        if tier.max_bytes is not None and len(value) > tier.max_bytes:
+            return
+
+        with self._lock:
+            # evictions of the name must not delete the value being written
+            tier._writing[name] = tier._writing.get(name, 0) + 1
+        try:
+            tier.storage.set_bytes(name, value)
+        except BaseException:
+            with self._lock:
+                self._end_write(tier, name)
+            raise
+
+        with self._lock:
+            self._end_write(tier, name)
+            self._touch(tier, name, len(value))
+            victims = self._select_victims(tier)
+        self._evict(tier, victims)
+
+    def _end_write(self, tier, name):
+        tier._writing[name] -= 1
+        if not tier._writing[name]:
+            del tier._writing[name]
+
+    def _touch(self, tier, name, size):
+        tier.size += size - tier._entries.pop(name, 0)
+        tier._entries[name] = size
+
+    def _select_victims(self, tier):
+        """
+        Drop the least recently used entries of a tier over its budget, returns their
+        names along with the generation of the ones to write back first
+        """
+        victims = []
+        while tier.max_bytes is not None and tier.size > tier.max_bytes:
+            name, size = tier._entries.popitem(last=False)
+            tier.size -= size
+            tier.evictions += 1
+            generation = self._dirty.get(name)
+            if generation is not None and (
+                # the tier is being given a newer value, which stays pending
+                name in tier._writing
+                or any(name in other._entries for other in self.tiers if other is not tier)
+            ):
+                generation = None
+            victims.append((name, generation))
+        return victims
+
+    def _evict(self, tier, victims):
+        """
+        Write back the victims holding the last copy of a pending value, then delete
+        them from the tier unless they were cached again or are being cached
+        """
+        for name, generation in victims:
+            if generation is not None:
+                # last copy of a value not written to the backend yet
+                self._write_back(name, tier.storage.get_bytes(name), generation)
+
+            with self._lock:
+                # unless cached again or being cached in the meantime
+                if name not in tier._entries and name not in tier._writing:
+                    tier.storage.delete(name)
+
+    def _remove(self, tier, name):
+        tier.size -= tier._entries.pop(name, 0)
+        tier.storage.delete(name)
+
+    def _get_cached(self, name):
+        # values being evicted are deleted from their tier once written back
+        for tier in self.tiers:
+            try:
+                return tier.storage.get_bytes(name)
+            except KeyError:
+                continue
+        raise KeyError(name)
+
+    def _write_back(self, name, value, generation):
+        self.backend.set_bytes(name, value)
+        with self._lock:
+            if self._dirty.get(name) == generation:
+                del self._dirty[name]
+
+    def _load_entries(self, tier):
+        """
+        Account for the values already stored in a tier, least recently modified first
+        """
+        entries = sorted(_list_values(tier.storage), key=lambda entry: entry[2])
+        with self._lock:
+            for name, size, _ in entries:
+                self._touch(tier, name, size)
+            victims = self._select_victims(tier)
+        self._evict(tier, victims)
+
+
+def _list_values(storage):
+    """
+    Return the name, size and modification time of the values of a tier storage
+    """
+    if isinstance(storage, MemoryStorage):
+        return [(name, len(value), 0) for name, value in list(storage._values.items())]
+
+    if isinstance(storage, LocalStorage):
+        values = []
+        if not os.path.isdir(storage.storage_path):
+            return values
+
+        for root, dirs, names in os.walk(storage.storage_path):
+            # hidden files are locks and temporary files of writes in progress
+            dirs[:] = [d for d in dirs if not d.startswith(".")]
+            for name in names:
+                if name.startswith("."):
+                    continue
+                path = os.path.join(root, name)
+                rel_path = os.path.relpath(path, storage.storage_path)
+                stat = os.stat(path)
+                values.append(
+                    ("::".join(rel_path.split(os.sep)), stat.st_size, stat.st_mtime)
+                )
+        return values
+
+    logger.info(
+        "Values already in the %s tier are not accounted for" % storage.__class__.__name__
+    )
+    return []
@@ -0,0 +1,79 @@
+import os
+import tempfile
+import contextlib
+
+try:
+    import fcntl
+except ImportError:  # advisory locks are not available on Windows
+    fcntl = None
+
+
+def _get_umask():
+    # the umask can only be read by setting it
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+# read once, changing it temporarily is not thread-safe
+_UMASK = _get_umask()
+
+
+@contextlib.contextmanager
+def atomic_open(path: str):
+    """
+    Open a temporary file next to ``path`` for writing and move it in place on success.
+
+    Readers either see the previous content of ``path`` or the complete new content,
+    never a partially written file. The file gets the permissions of files created
+    with ``open``, not the owner-only ones of ``mkstemp``, and the rename is synced
+    to disk.
+    """
+    dirname = os.path.dirname(path) or "."
+    os.makedirs(dirname, mode=0o777, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=dirname, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            os.chmod(tmp_path, 0o666 & ~_UMASK)
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(tmp_path, path)
+        _fsync_dir(dirname)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _fsync_dir(dirname):
+    """
+    Persist the entries of a folder, e.g. a rename, on platforms which can open folders
+    """
+    if os.name == "nt":
+        return
+
+    fd = os.open(dirname, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+@contextlib.contextmanager
+def file_lock(path: str, shared: bool = False):
+    """
+    Hold an advisory lock on ``path`` across processes of the same host.
+
+    The lock is a no-op on platforms without ``fcntl``.
+    """
+    os.makedirs(os.path.dirname(path) or ".", mode=0o777, exist_ok=True)
+    with open(path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
@@ -0,0 +1,254 @@
+import json
+import time
+import logging
+
+from h1st.model.repository.manifest import MANIFEST_HEADER
+from h1st.model.repository.storage.base import SEP
+
+VERSION_INDEX = "__versions__"
+logger = logging.getLogger(__name__)
+
+
+class VersionIndexMixin:
+    """
+    Version index of ``ModelRepository``: listing, tags and retention of the versions
+    of a model
+    """
+
+    def list_versions(self, model):
+        """
+        List the versions of a model, oldest first
+
+        Versions are read from an index stored next to the versions and maintained by
+        ``persist`` and ``delete``, so listing does not scan the storage. For
+        repositories written before the index existed, the versions are listed from
+        the storage if it supports ``list_keys``, and the index is filled from them
+        when it is created. Versions listed from the storage have no ``timestamp``
+        and come first.
+
+        The index is updated under ``Storage.lock``. Storages without locks, e.g.
+        ``S3Storage``, may lose the records of persists of the same model running
+        concurrently on several hosts, the versions themselves are not affected.
+
+        :param model: model instance or model class
+        :returns: a list of dicts with the ``version`` name and, when known, the
+            ``timestamp`` of persist, the ``size`` in bytes and ``checksum`` of the
+            stored archive or manifest and its ``tags``
+        """
+        try:
+            records = self._storage.get_obj(self._get_key(model, VERSION_INDEX))
+        except KeyError:
+            return self._list_versions_from_keys(self._get_key(model, "")[: -len(SEP)])
+
+        return _compact_index(records)
+
+    def latest_n(self, model, n):
+        """
+        Return the ``n`` most recently persisted versions of a model, newest first
+
+        :param model: model instance or model class
+        :param n: number of versions
+        """
+        return list(reversed(self.list_versions(model)))[:n]
+
+    def tag(self, model, version, *tags):
+        """
+        Add tags to a version, e.g. to keep it with ``RetentionPolicy(keep_tags=...)``
+
+        :param model: model instance or model class
+        :param version: version name
+        :param tags: tag names
+        """
+        with self._pointer_lock, self._storage.lock(self._get_key(model, VERSION_INDEX)):
+            self._append_index(model, {"version": version, "tags": list(tags)})
+
+    def gc(self, model, policy, dry_run=False, collect_blobs=False):
+        """
+        Delete the versions of a model which the retention policy does not keep
+
+        Versions are deleted in bulk with ``Storage.delete_many``. Blobs of versions
+        persisted with ``dedup`` or ``base_version`` may be shared with other models,
+        they are collected with ``collect_blobs`` by marking the blobs listed by the
+        manifests of all the models of the repository and deleting the others. The
+        background persists of this repository are waited for before marking, but
+        blobs uploaded by a persist running concurrently in another thread or process
+        may be collected before its manifest is written, only collect blobs when no
+        such persist can run.
+
+        :param model: model instance or model class
+        :param policy: a ``RetentionPolicy``
+        :param dry_run: only report what would be deleted
+        :param collect_blobs: also delete the blobs no manifest refers to, requires a
+            storage supporting ``list_keys``
+        :returns: a report dict with the ``deleted`` and ``kept`` version names, the
+            ``reclaimed_bytes`` of the deleted versions, as far as their size is known,
+            the number of ``deleted_blobs`` and their ``reclaimed_blob_bytes``, and
+            ``dry_run``
+        """
+        if collect_blobs:
+            # blobs of background persists are not referred to until their manifest
+            # is written
+            self._wait_pending()
+
+        versions = self.list_versions(model)
+        try:
+            latest = self._storage.get_obj(self._get_key(model, "latest"))
+        except KeyError:
+            latest = None
+
+        keep, delete = policy.select(versions, latest)
+        keys = [self._get_key(model, info["version"]) for info in delete]
+        report = {
+            "deleted": [info["version"] for info in delete],
+            "kept": [info["version"] for info in keep],
+            "reclaimed_bytes": sum(info.get("size", 0) for info in delete),
+            "deleted_blobs": 0,
+            "reclaimed_blob_bytes": 0,
+            "dry_run": dry_run,
+        }
+        if collect_blobs:
+            # the deleted versions do not keep their blobs
+            blob_keys = self._find_unused_blobs(set(keys))
+            report["deleted_blobs"] = len(blob_keys)
+            report["reclaimed_blob_bytes"] = sum(self._storage.get_size_many(blob_keys))
+        if dry_run:
+            return report
+
+        if collect_blobs and blob_keys:
+            self._storage.delete_many(blob_keys)
+        if not delete:
+            return report
+
+        self._storage.delete_many(keys)
+        for key, info in zip(keys, delete):
+            self._invalidate(key)
+            self._delete_components(key, info.get("components", []))
+
+        now = time.time()
+        with self._pointer_lock, self._storage.lock(self._get_key(model, VERSION_INDEX)):
+            self._append_index(model, *[
+                {"version": info["version"], "timestamp": now, "deleted": True}
+                for info in delete
+            ])
+
+        logger.info(
+            "Deleted %d versions, %d bytes" % (len(delete), report["reclaimed_bytes"])
+        )
+        return report
+
+    def _find_unused_blobs(self, excluded_keys=()):
+        """
+        Return the keys of the blobs no manifest of the repository refers to
+
+        :param excluded_keys: keys of versions whose manifests are not read, e.g. the
+            versions about to be deleted
+        """
+        blob_namespace = self._get_blob_namespace()
+        try:
+            blob_keys = [
+                f"{blob_namespace}{SEP}{shard}{SEP}{digest}"
+                for shard in self._storage.list_keys(blob_namespace)
+                for digest in self._storage.list_keys(f"{blob_namespace}{SEP}{shard}")
+            ]
+        except NotImplementedError:
+            logger.info("Blobs are not collected, the storage cannot list keys")
+            return []
+
+        if not blob_keys:
+            return []
+
+        # mark the blobs of the manifests of every model of the repository
+        used = set()
+        for folder in self._storage.list_keys(self._NAMESPACE):
+            if folder == "_blobs" or folder.startswith("."):
+                continue
+
+            namespace = f"{self._NAMESPACE}{SEP}{folder}" if self._NAMESPACE else folder
+            try:
+                records = _compact_index(
+                    self._storage.get_obj(f"{namespace}{SEP}{VERSION_INDEX}")
+                )
+            except KeyError:
+                records = [
+                    {"version": key}
+                    for key in self._storage.list_keys(namespace)
+                    if key not in ("latest", VERSION_INDEX) and not key.startswith(".")
+                ]
+
+            for record in records:
+                key = f"{namespace}{SEP}{record['version']}"
+                # archives are not read, older records do not tell
+                if record.get("manifest") is False or key in excluded_keys:
+                    continue
+
+                try:
+                    data = self._storage.get_bytes(key)
+                except KeyError:
+                    continue
+                if data.startswith(MANIFEST_HEADER):
+                    manifest = json.loads(data[len(MANIFEST_HEADER):])
+                    used.update(
+                        self._get_blob_key(info["digest"])
+                        for info in manifest["files"].values()
+                    )
+
+        return [key for key in blob_keys if key not in used]
+
+    def _list_versions_from_keys(self, namespace):
+        try:
+            keys = self._storage.list_keys(namespace)
+        except NotImplementedError:
+            return []
+
+        return [
+            {"version": key}
+            for key in keys
+            if key not in ("latest", VERSION_INDEX) and not key.startswith(".")
+        ]
+
+    def _append_index(self, model, *records):
+        """
+        Add records to the version index of a model. The index is compacted to one
+        record per live version, so its size is bounded by the versions kept, e.g.
+        by ``gc``.
+        """
+        self._append_namespace_index(self._get_key(model, "")[: -len(SEP)], *records)
+
+    def _append_namespace_index(self, namespace, *records):
+        """
+        Add records to the version index of the model whose versions are stored under
+        ``namespace``, e.g. of a component only known by its key
+        """
+        key = f"{namespace}{SEP}{VERSION_INDEX}"
+        try:
+            index = self._storage.get_obj(key)
+        except KeyError:
+            # versions persisted before the index existed, of unknown age
+            index = [
+                dict(info, timestamp=None)
+                for info in self._list_versions_from_keys(namespace)
+            ]
+
+        self._storage.set_obj(key, _compact_index(index + list(records)))
+
+
+def _compact_index(records):
+    """
+    Merge the records of a version index into one record per live version, oldest
+    first. The last persist or delete of a version wins and tags are accumulated.
+    """
+    versions = {}
+    for record in records:
+        if set(record) == {"version", "tags"}:
+            # tags added to a persisted version
+            if record["version"] in versions:
+                info = versions[record["version"]]
+                info["tags"] = sorted(set(info.get("tags", [])) | set(record["tags"]))
+            continue
+
+        versions.pop(record["version"], None)
+        if not record.get("deleted"):
+            versions[record["version"]] = dict(record)
+
+    # versions listed from the storage before the index existed have no timestamp
+    return sorted(versions.values(), key=lambda record: record.get("timestamp") or 0)
@@ -3,12 +3,13 @@ from typing import Dict, Any
 import pandas as pd
 
 from h1st.model.predictive_model import PredictiveModel
+from h1st.model.repository.lazy import resolve_attr
 
 
 class RuleBasedModel(PredictiveModel):
     @property
     def rule_engine(self) -> Any:
-        return getattr(self, "__rule_engine", None)
+        return resolve_attr(self, "__rule_engine")
 
     @rule_engine.setter
     def rule_engine(self, value):
@@ -16,7 +17,7 @@ class RuleBasedModel(PredictiveModel):
 
     @property
     def rule_details(self) -> Any:
-        return getattr(self, "__rule_details", None)
+        return resolve_attr(self, "__rule_details")
 
     @rule_details.setter
     def rule_details(self, value):
@@ -1,4 +1,3 @@
-from .shap_model_describer import SHAPModelDescriber  # TODO: fix
 from .enums import Constituency, Aspect
 from .describer import Describer
 
@@ -30,6 +29,8 @@ class Describable:
             Returns:
                 out : Description of Model's behavior and properties
         """
+        from .shap_model_describer import SHAPModelDescriber  # shap is heavy, import on use
+
         describer = Describer(self)
         describer.shap_describer = SHAPModelDescriber(self._native_model, self.prepared_data)
         describer.generate_report(constituency, aspect)
@@ -1,4 +1,3 @@
-from .lime_model_explainer import LIMEModelExplainer
 from .enums import Constituency, Aspect
 from .explainer import Explainer
 
@@ -23,6 +22,8 @@ class Explainable:
             Returns:
                 out : Specific decision explanation (e.g., SHAP or LIME)
         """
+        from .lime_model_explainer import LIMEModelExplainer  # lime is heavy, import on use
+
         explainer = Explainer(self, decision)
         explainer.lime_explainer = LIMEModelExplainer(
             decision, self._native_model, self.prepared_data
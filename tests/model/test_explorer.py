@@ -0,0 +1,116 @@
+import os
+import sys
+import textwrap
+from unittest import mock
+
+import pytest
+
+from h1st.model.repository import explorer
+from h1st.model.repository.explorer import ModelExplorer
+
+
+def _write(path, source):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(textwrap.dedent(source))
+
+
+@pytest.fixture
+def project(tmp_path):
+    root = tmp_path / 'fraud_project'
+    _write(root / '__init__.py', '')
+    _write(root / 'config.py', f'MODEL_REPO_PATH = {str(tmp_path / "repo")!r}\n')
+    _write(root / 'models' / '__init__.py', '')
+    _write(root / 'models' / 'base.py', '''
+        from h1st.model import ml_model
+
+        class BaseModel(ml_model.MLModel):
+            def __init__(self, alpha: float = 0.5, name: str = "base", *, n_trees: int = 10):
+                self.alpha = alpha
+
+        class Helper:
+            pass
+    ''')
+    _write(root / 'models' / 'child.py', '''
+        from .base import BaseModel as Base
+        from h1st.model.kswe import KSWE
+
+        class ChildModel(Base):
+            pass
+
+        class SegmentedModel(KSWE):
+            pass
+    ''')
+    _write(root / 'fraud_model.py', '''
+        from fraud_project.models.child import ChildModel
+
+        class FraudModel(ChildModel):
+            def __init__(self, threshold=0.1, features=None):
+                pass
+    ''')
+    return root
+
+
+class TestModelExplorer:
+    def test_static_discovery(self, project):
+        result = ModelExplorer(str(project)).discover_models()
+
+        assert sorted(result) == [
+            'fraud_project.fraud_model.FraudModel',
+            'fraud_project.models.base.BaseModel',
+            'fraud_project.models.child.ChildModel',
+            'fraud_project.models.child.SegmentedModel',
+        ]
+        assert 'fraud_project' not in sys.modules
+
+        base = result['fraud_project.models.base.BaseModel']
+        assert [(p['name'], p['default'], p['type']) for p in base['hyperparameters']] == [
+            ('alpha', 0.5, 'float'), ('name', 'base', 'str'), ('n_trees', 10, 'int')
+        ]
+        # inherited constructor
+        child = result['fraud_project.models.child.ChildModel']
+        assert child['hyperparameters'] == base['hyperparameters']
+        assert child['filename'] == project / 'models' / 'child.py'
+        assert not result['fraud_project.models.child.SegmentedModel']['tunable']
+
+        fraud = result['fraud_project.fraud_model.FraudModel']
+        assert [p['name'] for p in fraud['hyperparameters']] == ['threshold', 'features']
+
+    def test_cache(self, project):
+        cache_path = project / '.h1st' / 'model_discovery.json'
+        result = ModelExplorer(str(project)).discover_models()
+        assert cache_path.exists()
+
+        with mock.patch.object(
+            explorer, '_analyze_module', wraps=explorer._analyze_module
+        ) as analyze:
+            assert ModelExplorer(str(project)).discover_models() == result
+            assert analyze.call_count == 0
+
+            # only the modified file is parsed again
+            model_file = project / 'fraud_model.py'
+            model_file.write_text(model_file.read_text().replace('FraudModel', 'ScamModel'))
+            os.utime(model_file, (1, 1))
+            result = ModelExplorer(str(project)).discover_models()
+            assert analyze.call_count == 1
+            assert 'fraud_project.fraud_model.ScamModel' in result
+            assert 'fraud_project.fraud_model.FraudModel' not in result
+
+            ModelExplorer(str(project), cache_path=False).discover_models()
+            assert analyze.call_count > 1
+
+        with pytest.raises(ValueError):
+            ModelExplorer(str(project), mode='eager')
+
+    def test_import_discovery(self, project, monkeypatch):
+        # the import mode adds the project to sys.path, e.g. its config module
+        monkeypatch.setattr(sys, 'path', list(sys.path))
+        static = ModelExplorer(str(project)).discover_models()
+        try:
+            imported = ModelExplorer(str(project), mode='import').discover_models()
+        finally:
+            for name in list(sys.modules):
+                if name == 'config' or name.split('.')[0] == 'fraud_project':
+                    del sys.modules[name]
+
+        for name, info in static.items():
+            assert imported[name]['hyperparameters'] == info['hyperparameters']
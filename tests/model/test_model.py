@@ -1,14 +1,28 @@
+import os
+import subprocess
+import sys
 import tempfile
 
+import numpy as np
+import pytest
 import tensorflow as tf
+import yaml
 from sklearn.base import BaseEstimator, ClassifierMixin
 from sklearn.datasets import load_iris
+from sklearn.ensemble import ExtraTreesRegressor, RandomForestClassifier
 from sklearn.linear_model import LogisticRegression
 
 from h1st.model.ml_model import MLModel
 from h1st.model.ml_modeler import MLModeler
 from h1st.model.model import Model
 from h1st.model.repository.model_repository import ModelSerDe
+from h1st.model.repository.serializers import (
+    SERIALIZERS,
+    ForestSerializer,
+    NumpySerializer,
+    Serializer,
+    SerializerRegistry,
+)
 from h1st.model.rule_based_model import RuleBasedModel
 
 
@@ -195,6 +209,170 @@ class TestModelSerDe:
         self.assert_models(MyModeler, MyModel, 'tensorflow-keras', 'model_Iris', 'dict')
 
 
+    def test_parallel_serialize_dict_model(self):
+        X, y = load_iris(return_X_y=True)
+
+        class MyModel(MLModel):
+            pass
+
+        model = MyModel()
+        model.base_model = {
+            'segment_%d' % i: LogisticRegression(C=i + 1, max_iter=500).fit(X, y)
+            for i in range(20)
+        }
+
+        metainfos = []
+        with tempfile.TemporaryDirectory() as path:
+            for max_workers in [1, 8]:
+                model_serde = ModelSerDe(max_workers=max_workers)
+                model_path = '%s/%d' % (path, max_workers)
+                os.makedirs(model_path)
+                model_serde.serialize(model, model_path)
+                with open('%s/METAINFO.yaml' % model_path) as file:
+                    metainfos.append(file.read())
+
+                model_2 = MyModel()
+                model_serde.deserialize(model_2, model_path)
+                assert sorted(model_2.base_model) == sorted(model.base_model)
+                for name, sub_model in model.base_model.items():
+                    assert (model_2.base_model[name].predict(X) == sub_model.predict(X)).all()
+
+        assert metainfos[0] == metainfos[1]
+
+
+class Thresholds:
+    def __init__(self, values):
+        self.values = values
+
+
+class WeightedThresholds(Thresholds):
+    pass
+
+
+class ThresholdsSerializer(Serializer):
+    format = 'thresholds-csv'
+
+    def serialize(self, obj, path, name):
+        obj_path = '%s.csv' % name
+        np.savetxt(os.path.join(path, obj_path), obj.values)
+        return obj_path
+
+    def deserialize(self, org_obj, path, obj_path, mmap_mode=None):
+        return WeightedThresholds(np.loadtxt(os.path.join(path, obj_path)))
+
+
+class TestSerializerRegistry:
+    def test_dispatch(self):
+        registry = SerializerRegistry()
+        serializer = ThresholdsSerializer()
+        registry.register(Thresholds, serializer)
+        registry.register('numpy:ndarray', NumpySerializer())
+
+        assert registry.lookup(WeightedThresholds([1.0])) is serializer
+        assert registry.lookup(object()) is None
+        assert registry.lookup(np.zeros(3)).format == 'numpy'
+        assert registry.get('thresholds-csv') is serializer
+        with pytest.raises(ValueError):
+            registry.get('unknown')
+
+        registry.unregister(Thresholds)
+        assert registry.lookup(WeightedThresholds([1.0])) is None
+        with pytest.raises(ValueError):
+            registry.get('thresholds-csv')
+        with pytest.raises(KeyError):
+            registry.unregister(Thresholds)
+
+        # strings still work once resolved by a lookup
+        registry.unregister('numpy:ndarray')
+        assert registry.lookup(np.zeros(3)) is None
+        with pytest.raises(KeyError):
+            registry.unregister('numpy:ndarray')
+
+    def test_custom_serializer(self):
+        class MyModel(MLModel):
+            pass
+
+        SERIALIZERS.register(Thresholds, ThresholdsSerializer())
+        try:
+            model = MyModel()
+            model.base_model = {'thresholds': Thresholds([0.5, 0.7]), 'weights': np.arange(3.0)}
+
+            model_serde = ModelSerDe()
+            with tempfile.TemporaryDirectory() as path:
+                model_serde.serialize(model, path)
+                with open('%s/METAINFO.yaml' % path, 'r') as file:
+                    meta_info = yaml.load(file, Loader=yaml.Loader)
+                assert meta_info['models']['thresholds']['model_type'] == 'thresholds-csv'
+                assert meta_info['models']['weights'] == {
+                    'model_type': 'numpy', 'model_path': 'model_weights.npy'
+                }
+
+                model_2 = MyModel()
+                model_serde.deserialize(model_2, path)
+                assert list(model_2.base_model['thresholds'].values) == [0.5, 0.7]
+                assert list(model_2.base_model['weights']) == [0.0, 1.0, 2.0]
+        finally:
+            SERIALIZERS.unregister(Thresholds)
+        assert SERIALIZERS.lookup(Thresholds([0.5])) is None
+
+
+class TestForestSerializer:
+    def test_serialize_forests(self):
+        X, y = load_iris(return_X_y=True)
+
+        class MyModel(MLModel):
+            pass
+
+        model = MyModel()
+        model.base_model = {
+            'classifier': RandomForestClassifier(n_estimators=20, random_state=0).fit(X, y),
+            'regressor': ExtraTreesRegressor(n_estimators=20, random_state=0).fit(X, y),
+        }
+
+        model_serde = ModelSerDe()
+        with tempfile.TemporaryDirectory() as path:
+            model_serde.serialize(model, path)
+            with open('%s/METAINFO.yaml' % path, 'r') as file:
+                meta_info = yaml.load(file, Loader=yaml.Loader)
+            assert meta_info['models']['classifier']['model_type'] == 'sklearn-forest'
+
+            model_2 = MyModel()
+            model_serde.deserialize(model_2, path)
+            for name, estimator in model.base_model.items():
+                loaded = model_2.base_model[name]
+                assert type(loaded) == type(estimator)
+                assert (loaded.predict(X) == estimator.predict(X)).all()
+                assert (loaded.feature_importances_ == estimator.feature_importances_).all()
+
+    def test_forests_without_trees(self):
+        X, y = load_iris(return_X_y=True)
+        serializer = ForestSerializer()
+        unfitted = RandomForestClassifier(n_estimators=5)
+        empty = RandomForestClassifier(n_estimators=5).fit(X, y)
+        empty.estimators_ = []
+        with tempfile.TemporaryDirectory() as path:
+            for name, forest in [('unfitted', unfitted), ('empty', empty)]:
+                forest_path = serializer.serialize(forest, path, name)
+                assert forest_path == '%s.joblib' % name
+
+                loaded = serializer.deserialize(None, path, forest_path)
+                assert loaded.get_params() == forest.get_params()
+                assert getattr(loaded, 'estimators_', None) == getattr(forest, 'estimators_', None)
+
+    def test_float32_columns(self):
+        X, y = load_iris(return_X_y=True)
+        forest = RandomForestClassifier(n_estimators=20, random_state=0).fit(X, y)
+        serializer = ForestSerializer(dtype=np.float32)
+        with tempfile.TemporaryDirectory() as path:
+            forest_path = serializer.serialize(forest, path, 'forest')
+            assert np.load(os.path.join(path, forest_path, 'threshold.npy')).dtype == np.float32
+            assert np.load(os.path.join(path, forest_path, 'left_child.npy')).itemsize < 8
+
+            loaded = serializer.deserialize(None, path, forest_path)
+            assert (loaded.apply(X) == forest.apply(X)).all()
+            assert np.abs(loaded.predict_proba(X) - forest.predict_proba(X)).max() < 1e-6
+
+
 class TestModelStatsSerDe:
     def test_serialize_dict(self):
         class MyModeler(MLModeler):
@@ -235,6 +413,48 @@ class TestModelStatsSerDe:
                 assert 'CarSpeed' in model_2.stats
 
 
+    def test_serialize_tables(self):
+        import pandas as pd
+
+        class MyModel(MLModel):
+            pass
+
+        rows = 10000
+        segments = pd.DataFrame({"min": np.arange(rows), "max": np.arange(rows) + 1.0})
+        model = MyModel()
+        model.stats = {
+            "segment_info": {"all": segments, "counts": pd.Series(np.arange(rows))},
+            "weights": [np.ones((rows, 4))],
+            "mixed": pd.DataFrame({"value": [1, "x"] * (rows // 2)}),
+            "lists": pd.DataFrame({"value": [[1, 2], (3,)] * (rows // 2)}),
+            "pairs": pd.Series([(1, 2), (3, 4)] * (rows // 2)),
+            "small": np.zeros(3),
+            "n_segments": 1,
+        }
+
+        model_serde = ModelSerDe()
+        with tempfile.TemporaryDirectory() as path:
+            model_serde.serialize(model, path)
+
+            tables = sorted(os.listdir(os.path.join(path, "stats_tables")))
+            assert tables == ["table_0.parquet", "table_1.parquet", "table_2.npy"]
+
+            model_2 = MyModel()
+            model_serde.deserialize(model_2, path)
+            pd.testing.assert_frame_equal(model_2.stats["segment_info"]["all"], segments)
+            pd.testing.assert_series_equal(
+                model_2.stats["segment_info"]["counts"], model.stats["segment_info"]["counts"]
+            )
+            assert (model_2.stats["weights"][0] == 1).all()
+            # columns of mixed types cannot be written to Parquet
+            pd.testing.assert_frame_equal(model_2.stats["mixed"], model.stats["mixed"])
+            # neither are object columns, Parquet would read lists and tuples as ndarrays
+            assert model_2.stats["lists"]["value"].tolist() == [[1, 2], (3,)] * (rows // 2)
+            pd.testing.assert_series_equal(model_2.stats["pairs"], model.stats["pairs"])
+            assert model_2.stats["small"].shape == (3,)
+            assert model_2.stats["n_segments"] == 1
+
+
 class TestRuleModel:
     def test_ruled_based_model(self):
         class MyRule(RuleBasedModel):
@@ -243,3 +463,23 @@ class TestRuleModel:
 
         model = MyRule()
         assert {'result': 42} == model.predict({'X': [1, 1, 10, 10, 20]})
+
+
+class TestImports:
+    def test_frameworks_are_imported_lazily(self):
+        root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        output = subprocess.run(
+            [
+                sys.executable,
+                '-c',
+                'import sys, h1st.model.model, h1st.model.rule_based_model; '
+                'print([m for m in ["tensorflow", "sklearn", "skfuzzy", "shap", "lime", "s3fs"] '
+                'if m in sys.modules])',
+            ],
+            cwd=root,
+            env={**os.environ, 'PYTHONPATH': root},
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        assert output.strip() == '[]'
@@ -1,16 +1,79 @@
+import os
+import json
+import copy
+import pickle
 import tempfile
-from unittest import TestCase
+import threading
+import multiprocessing
+import time
+from datetime import timedelta
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from unittest import TestCase, mock
 
+import numpy as np
+import pytest
 from typing import Any, Dict
 from sklearn.datasets import load_iris
 from sklearn.linear_model import LogisticRegression
 
 from h1st.model.ml_model import MLModel
 from h1st.model.ml_modeler import MLModeler
+from h1st.model.repository.codec import CODECS
+from h1st.model.repository.cache import ModelCache
+from h1st.model.repository.lazy import LazyDict, LazyValue
 from h1st.model.repository.model_repository import ModelRepository
+from h1st.model.repository import shared
+from h1st.model.repository.retention import RetentionPolicy
+from h1st.model.repository.shared import SharedModelStore
 from h1st.model.repository.storage.local import LocalStorage
 
 
+class MyModeler(MLModeler):
+    def load_data(self) -> dict:
+        data = load_iris()
+        return {'X': data.data, 'y': data.target}
+
+    def train_base_model(self, prepared_data):
+        model = LogisticRegression(random_state=0)
+        X, y = prepared_data['X'], prepared_data['y']
+        model.fit(X, y)
+        return model
+
+
+class MyModel(MLModel):
+    pass
+
+
+class MyBundle(MLModel):
+    pass
+
+
+class SlowModel(MLModel):
+    def persist(self, version=None):
+        time.sleep(self.stats['delay'])
+        return super().persist(version)
+
+
+def build_model():
+    my_modeler = MyModeler()
+    my_modeler.model_class = MyModel
+    return my_modeler.build_model()
+
+
+def _persist_versions(args):
+    path, worker = args
+    model = build_model()
+    mm = ModelRepository(storage=LocalStorage(storage_path=path))
+    return [mm.persist(model=model, version=f'w{worker}_{i}') for i in range(5)]
+
+
+def _load_shared(args):
+    path, store_path, version = args
+    model = MyModel()
+    ModelRepository(storage=path, shared_store=store_path).load(model, version)
+    return os.getpid(), model.base_model.coef_.filename
+
+
 class ModelRepositoryTestCase(TestCase):
     def test_serialize_sklearn_model(self):
         class MyModeler(MLModeler):
@@ -40,3 +103,631 @@ class ModelRepositoryTestCase(TestCase):
 
             assert 'sklearn' in str(type(model_2.base_model))
 
+    def test_codecs(self):
+        model = build_model()
+        X = load_iris().data
+        with tempfile.TemporaryDirectory() as path:
+            storage = LocalStorage(storage_path=path)
+            versions = {}
+            for name, codec_class in CODECS.items():
+                if not codec_class().available():
+                    continue
+                versions[name] = ModelRepository(storage=storage, codec=name).persist(model=model)
+
+            # any repository loads archives written with any codec
+            mm = ModelRepository(storage=storage)
+            for name, version in versions.items():
+                model_2 = MyModel()
+                mm.load(model=model_2, version=version)
+                assert (model_2.base_model.predict(X) == model.base_model.predict(X)).all()
+
+    def test_unknown_codec(self):
+        with tempfile.TemporaryDirectory() as path:
+            with pytest.raises(ValueError):
+                ModelRepository(storage=path, codec='rar')
+
+    def test_load_cache(self):
+        model = build_model()
+        X = load_iris().data
+        with tempfile.TemporaryDirectory() as path:
+            mm = ModelRepository(storage=path, cache_size=1)
+            version = mm.persist(model=model)
+
+            model_2, model_3 = MyModel(), MyModel()
+            mm.load(model=model_2)
+            mm.load(model=model_3, version=version)
+            assert model_3.version == version
+            assert model_3.base_model is model_2.base_model
+            assert (model_3.base_model.predict(X) == model.base_model.predict(X)).all()
+
+            # persisting the same version again invalidates the cached entry
+            mm.persist(model=model, version=version)
+            mm.load(model=MyModel(), version=version)
+
+            # a second version evicts the first one
+            version_2 = mm.persist(model=model)
+            mm.load(model=MyModel(), version=version_2)
+            mm.load(model=MyModel(), version=version)
+            mm.load(model=MyModel(), version=version)
+
+            info = mm.cache_info()
+            assert info['hits'] == 2
+            assert info['misses'] == 4
+            assert info['evictions'] == 2
+            assert info['size'] == 1
+
+    def test_load_cache_bounds(self):
+        model = build_model()
+        with tempfile.TemporaryDirectory() as path:
+            mm = ModelRepository(storage=path, cache_size=10)
+            version = mm.persist(model=model)
+            version_2 = mm.persist(model=model)
+
+            loaded = MyModel()
+            loaded.request_count = 3
+            mm.load(model=loaded, version=version)
+
+            # only the persisted properties are restored from the cache
+            model_2 = MyModel()
+            mm.load(model=model_2, version=version)
+            assert model_2.base_model is loaded.base_model
+            assert not hasattr(model_2, 'request_count')
+
+            size = mm.cache_info()['bytes']
+            assert size > 0
+
+            # the versions do not fit together in a cache of 1.5 versions
+            mm = ModelRepository(storage=path, cache_size=10, cache_max_bytes=size * 3 // 2)
+            mm.load(model=MyModel(), version=version)
+            mm.load(model=MyModel(), version=version_2)
+            info = mm.cache_info()
+            assert (info['size'], info['bytes'], info['evictions']) == (1, size, 1)
+
+            # a version larger than the cache is not cached
+            mm = ModelRepository(storage=path, cache_size=10, cache_max_bytes=size - 1)
+            mm.load(model=MyModel(), version=version)
+            assert mm.cache_info()['size'] == 0
+
+    def test_mmap_load(self):
+        model = build_model()
+        model.stats = {'means': np.arange(1000, dtype=float)}
+        X = load_iris().data
+        with tempfile.TemporaryDirectory() as path, tempfile.TemporaryDirectory() as mmap_dir:
+            mm = ModelRepository(storage=path, mmap_dir=mmap_dir)
+            version = mm.persist(model=model)
+
+            model_2, model_3 = MyModel(), MyModel()
+            mm.load(model=model_2, version=version)
+            ModelRepository(storage=path, mmap_dir=mmap_dir).load(model=model_3, version=version)
+
+            for loaded in [model_2, model_3]:
+                assert isinstance(loaded.stats['means'], np.memmap)
+                assert isinstance(loaded.base_model.coef_, np.memmap)
+                assert (loaded.base_model.predict(X) == model.base_model.predict(X)).all()
+
+            assert model_2.stats['means'].filename == model_3.stats['means'].filename
+
+            # a version persisted again, e.g. by another process, after deleting it is
+            # extracted again
+            mm.delete(MyModel, version)
+            model.stats = {'means': np.zeros(1000)}
+            ModelRepository(storage=path).persist(model=model, version=version)
+            model_4 = MyModel()
+            mm.load(model=model_4, version=version)
+            assert not model_4.stats['means'].any()
+
+    def test_lazy_load(self):
+        X, y = load_iris(return_X_y=True)
+        model = MyModel()
+        model.base_model = {
+            'segment_%d' % i: LogisticRegression(max_iter=500).fit(X, y) for i in range(4)
+        }
+        model.metrics = {'accuracy': 0.9}
+        with tempfile.TemporaryDirectory() as path:
+            mm = ModelRepository(storage=path, lazy=True)
+            version = mm.persist(model=model)
+
+            calls = []
+            deserialize_single_model = mm._serder._deserialize_single_model
+
+            def counting_deserialize_single_model(*args):
+                calls.append(args[-1])
+                return deserialize_single_model(*args)
+
+            mm._serder._deserialize_single_model = counting_deserialize_single_model
+
+            model_2 = MyModel()
+            mm.load(model=model_2, version=version)
+            assert calls == []
+            assert isinstance(model_2.__dict__['__metrics__'], LazyValue)
+
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                predictions = list(pool.map(
+                    lambda _: model_2.base_model['segment_1'].predict(X), range(16)
+                ))
+            assert calls == ['model_segment_1.joblib']
+            assert all((p == model.base_model['segment_1'].predict(X)).all() for p in predictions)
+            assert model_2.metrics == {'accuracy': 0.9}
+            assert sorted(model_2.base_model) == sorted(model.base_model)
+
+            # caching a lazily loaded version does not load its components
+            calls.clear()
+            mm._cache = ModelCache(4)
+            model_3, model_4 = MyModel(), MyModel()
+            mm.load(model=model_3, version=version)
+            mm.load(model=model_4, version=version)
+            assert calls == []
+            model_4.base_model['segment_2'].predict(X)
+            assert calls == ['model_segment_2.joblib']
+
+            # a lazily loaded version can be persisted again
+            version_2 = mm.persist(model=model_4)
+            model_5 = MyModel()
+            ModelRepository(storage=path).load(model=model_5, version=version_2)
+            assert sorted(model_5.base_model) == sorted(model.base_model)
+            predictions = model_5.base_model['segment_3'].predict(X)
+            assert (predictions == model.base_model['segment_3'].predict(X)).all()
+            assert model_5.metrics == {'accuracy': 0.9}
+
+    def test_lazy_dict(self):
+        calls = []
+        lazy = LazyDict(
+            a=LazyValue(lambda: calls.append('a') or 1),
+            b=LazyValue(lambda: calls.append('b') or 2),
+        )
+
+        # shallow copies keep the values lazy
+        clone = copy.copy(lazy)
+        assert isinstance(clone, LazyDict)
+        assert list(clone.keys()) == list(lazy) == ['a', 'b']
+        assert calls == []
+        assert clone['a'] == 1
+        assert calls == ['a']
+        assert isinstance(dict.__getitem__(lazy.copy(), 'b'), LazyValue)
+
+        # plain dicts hold the resolved values
+        assert dict(lazy) == {'a': 1, 'b': 2}
+        assert {**LazyDict(c=LazyValue(lambda: 3))} == {'c': 3}
+        assert calls == ['a', 'b']
+
+        restored = pickle.loads(pickle.dumps(LazyDict(d=LazyValue(lambda: 4))))
+        assert isinstance(restored, LazyDict)
+        assert dict.__getitem__(restored, 'd') == 4
+
+    def test_dedup(self):
+        X, y = load_iris(return_X_y=True)
+        model = MyModel()
+        model.base_model = {
+            'segment_%d' % i: LogisticRegression(C=1.0 + i, max_iter=500).fit(X, y)
+            for i in range(3)
+        }
+        with tempfile.TemporaryDirectory() as path:
+            storage = LocalStorage(storage_path=path)
+            mm = ModelRepository(storage=storage, dedup=True)
+            version = mm.persist(model=model)
+
+            uploaded = []
+            set_bytes = storage.set_bytes
+            storage.set_bytes = lambda name, value: (uploaded.append(name), set_bytes(name, value))
+
+            # only the retrained segment and the manifest are written again
+            model.base_model['segment_0'] = LogisticRegression(C=0.5, max_iter=500).fit(X, y)
+            version_2 = mm.persist(model=model)
+            assert len([key for key in uploaded if '_blobs' in key]) == 1
+            assert len(uploaded) == 2
+
+            for v in [version, version_2]:
+                model_2 = MyModel()
+                ModelRepository(storage=storage).load(model=model_2, version=v)
+                assert sorted(model_2.base_model) == sorted(model.base_model)
+
+            assert (
+                model_2.base_model['segment_0'].predict(X)
+                == model.base_model['segment_0'].predict(X)
+            ).all()
+
+    def test_dedup_codecs(self):
+        X, y = load_iris(return_X_y=True)
+        model = MyModel()
+        model.base_model = {
+            'segment_%d' % i: LogisticRegression(C=1.0 + i, max_iter=500).fit(X, y)
+            for i in range(2)
+        }
+        with tempfile.TemporaryDirectory() as path:
+            storage = LocalStorage(storage_path=path)
+            versions = []
+            for name in ['xz', 'gzip', 'none']:
+                # each persist reuses the blobs of the previous ones and adds one
+                model.metrics = {'codec': name}
+                mm = ModelRepository(storage=storage, codec=name, dedup=True)
+                versions.append(mm.persist(model=model))
+
+            for name, version in zip(['xz', 'gzip', 'none'], versions):
+                model_2 = MyModel()
+                ModelRepository(storage=storage).load(model=model_2, version=version)
+                assert model_2.metrics == {'codec': name}
+                assert (
+                    model_2.base_model['segment_1'].predict(X)
+                    == model.base_model['segment_1'].predict(X)
+                ).all()
+
+    def test_bundle(self):
+        model = build_model()
+        X = load_iris().data
+        with tempfile.TemporaryDirectory() as path:
+            storage = LocalStorage(storage_path=path)
+            mm = ModelRepository(storage=storage)
+            legacy_version = mm.persist(model=model)
+
+            written = []
+            set_bytes = storage.set_bytes
+            storage.set_bytes = lambda name, value: (written.append(name), set_bytes(name, value))
+
+            parent = MyBundle()
+            with mm.bundle(parent, 'v1') as bundle:
+                parent.stats = {
+                    'versions': bundle.map(lambda i: mm.persist(model, f'v1_{i}'), range(3))
+                    + [legacy_version]
+                }
+                mm.persist(parent, 'v1')
+            # the archive, then a reference to each component's folder in it
+            assert written[0] == mm._get_key(parent, 'v1')
+            assert sorted(written[1:]) == [mm._get_key(model, f'v1_{i}') for i in range(3)]
+
+            # components load on their own and their latest pointer is updated
+            child = MyModel()
+            mm.load(child, 'v1_1')
+            assert (child.base_model.predict(X) == model.base_model.predict(X)).all()
+            mm.load(child)
+            assert child.version in ['v1_0', 'v1_1', 'v1_2']
+
+            with pytest.raises(RuntimeError):
+                with mm.bundle(parent, 'v2'):
+                    mm.persist(model, 'v2_0')
+                    raise RuntimeError()
+            assert not storage.exists(mm._get_key(model, 'v2_0'))
+
+            def load(version):
+                loaded = MyModel()
+                mm.load(loaded, version)
+                return loaded
+
+            parent_2 = MyBundle()
+            with mm.open_bundle(parent_2) as bundle:
+                mm.load(parent_2)
+                children = bundle.map(load, parent_2.stats['versions'])
+
+            assert parent_2.version == 'v1'
+            assert [child.version for child in children] == parent.stats['versions']
+            for child in children:
+                assert (child.base_model.predict(X) == model.base_model.predict(X)).all()
+
+            # the references of the components are deleted with the bundle
+            mm.delete(parent, 'v1')
+            assert not any(storage.exists(mm._get_key(model, f'v1_{i}')) for i in range(3))
+            assert [info['version'] for info in mm.list_versions(model)] == [legacy_version]
+
+            # also by gc, unless persisted again on their own
+            for version in ['v2', 'v3']:
+                with mm.bundle(parent, version):
+                    mm.persist(model, f'{version}_0')
+                    mm.persist(model, f'{version}_1')
+                    mm.persist(parent, version)
+            mm.persist(model, 'v2_0')
+            assert mm.gc(parent, RetentionPolicy(keep_last=1))['deleted'] == ['v2']
+            assert not storage.exists(mm._get_key(model, 'v2_1'))
+            mm.load(MyModel(), 'v2_0')
+            mm.load(MyModel(), 'v3_1')
+
+    def test_bundle_invalidation(self):
+        model = build_model()
+        with tempfile.TemporaryDirectory() as path:
+            mm = ModelRepository(storage=path, cache_size=4)
+            parent = MyBundle()
+            for accuracy in [0.9, 0.95]:
+                model.metrics = {'accuracy': accuracy}
+                with mm.bundle(parent, 'v1'):
+                    mm.persist(model, 'v1_0')
+                    mm.persist(parent, 'v1')
+
+                # the component cached by the previous load is persisted again
+                child = MyModel()
+                mm.load(child, 'v1_0')
+                assert child.metrics == {'accuracy': accuracy}
+
+    def test_list_versions(self):
+        model = build_model()
+        with tempfile.TemporaryDirectory() as path:
+            storage = LocalStorage(storage_path=path)
+            mm = ModelRepository(storage=storage)
+            for i in range(4):
+                mm.persist(model=model, version=f'v{i}')
+            mm.delete(MyModel, 'v1')
+            mm.persist(model=model, version='v0')
+
+            listed = mm.list_versions(MyModel)
+            assert [info['version'] for info in listed] == ['v2', 'v3', 'v0']
+            assert all(info['size'] > 0 for info in listed)
+            assert listed[-1]['checksum'].startswith('sha256:')
+            assert [info['version'] for info in mm.latest_n(model, 2)] == ['v0', 'v3']
+
+            # repositories without an index are listed from the storage
+            storage.delete(mm._get_key(MyModel, '__versions__'))
+            listed = mm.list_versions(MyModel)
+            assert sorted(info['version'] for info in listed) == ['v0', 'v2', 'v3']
+
+            # the index created by the next persist keeps them, compacted
+            mm.persist(model=model, version='v4')
+            mm.tag(MyModel, 'v2', 'production')
+            listed = mm.list_versions(MyModel)
+            assert [info['version'] for info in listed] == ['v0', 'v2', 'v3', 'v4']
+            assert listed[1] == {'version': 'v2', 'timestamp': None, 'tags': ['production']}
+            assert storage.get_obj(mm._get_key(MyModel, '__versions__')) == listed
+
+    def test_persist_async(self):
+        model = build_model()
+        with tempfile.TemporaryDirectory() as path:
+            mm = ModelRepository(storage=path, async_workers=2, max_pending=2)
+            futures = []
+            for i in range(6):
+                model.stats = {'round': i}
+                futures.append(mm.persist_async(model=model, version=f'v{i}'))
+                # the snapshot is not affected by changes made after the call
+                model.stats['round'] = -1
+
+            mm.flush()
+            assert [future.result() for future in futures] == [f'v{i}' for i in range(6)]
+            assert model.version == 'v5'
+            for i in range(6):
+                model_2 = MyModel()
+                mm.load(model=model_2, version=f'v{i}')
+                assert model_2.stats == {'round': i}
+
+            # the version of the last call wins, whatever the order persists finish in
+            model = SlowModel()
+            model.base_model = LogisticRegression()
+            with mock.patch.object(ModelRepository, 'MODEL_REPO', mm, create=True):
+                for delay in [0.5, 0]:
+                    model.stats = {'delay': delay}
+                    future = model.persist_async()
+                assert model.version == future.result()
+                mm.flush()
+                assert model.version == future.result()
+
+            model.stats = {'not picklable': lambda: None}
+            future = mm.persist_async(model=model)
+            with pytest.raises(Exception):
+                mm.flush()
+            assert future.exception() is not None
+
+    def test_delta_persist(self):
+        model = build_model()
+        model.metrics = {'accuracy': 0.9}
+        with tempfile.TemporaryDirectory() as path:
+            storage = LocalStorage(storage_path=path)
+            mm = ModelRepository(storage=storage)
+            mm.persist(model=model, version='v1')
+            # the base version is an archive, all files are uploaded
+            mm.persist(model=model, version='v2', base_version='v1')
+
+            written, checked = [], []
+            set_bytes, exists_many = storage.set_bytes, storage.exists_many
+            storage.set_bytes = lambda name, value: (written.append(name), set_bytes(name, value))
+            storage.exists_many = lambda names: (checked.extend(names), exists_many(names))[1]
+
+            model.metrics = {'accuracy': 0.95}
+            mm.persist(model=model, version='v3', base_version='latest')
+            assert len([key for key in written if '_blobs' in key]) == 1
+            assert len(checked) == 1
+
+            model_2 = MyModel()
+            mm.load(model=model_2, version='v3')
+            assert model_2.metrics == {'accuracy': 0.95}
+            mm.load(model=model_2, version='v2')
+            assert model_2.metrics == {'accuracy': 0.9}
+
+            # deltas of another codec keep the codec of the reused blobs
+            model.metrics = {'accuracy': 0.97}
+            mm_xz = ModelRepository(storage=storage, codec='xz')
+            with mock.patch.object(ModelRepository, 'MODEL_REPO', mm_xz, create=True):
+                model.persist('v4', base_version='v3')
+                model.persist_async('v5', base_version='v4').result()
+            manifest = json.loads(storage.get_bytes(mm._get_key(model, 'v5')).split(b'\n', 1)[1])
+            assert sorted(info['codec'] for info in manifest['files'].values()).count('xz') == 1
+            mm.load(model=model_2, version='v5')
+            assert model_2.metrics == {'accuracy': 0.97}
+
+    def test_concurrent_processes(self):
+        X = load_iris().data
+        with tempfile.TemporaryDirectory() as path:
+            # forked workers may inherit locks held by BLAS threads of the parent
+            spawn = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(max_workers=4, mp_context=spawn) as pool:
+                versions = sum(pool.map(_persist_versions, [(path, i) for i in range(4)]), [])
+
+            mm = ModelRepository(storage=LocalStorage(storage_path=path))
+            assert sorted(info['version'] for info in mm.list_versions(MyModel)) == sorted(versions)
+
+            model = MyModel()
+            mm.load(model=model)
+            assert model.version in versions
+            assert model.base_model.predict(X).shape == (150,)
+
+    def test_latest_ttl_and_watch(self):
+        model = build_model()
+        with tempfile.TemporaryDirectory() as path:
+            storage = LocalStorage(storage_path=path)
+            writer = ModelRepository(storage=storage)
+            reader = ModelRepository(storage=storage, latest_ttl=3600)
+            writer.persist(model=model, version='v1')
+
+            reads = []
+            get_obj = storage.get_obj
+            storage.get_obj = lambda name: (reads.append(name), get_obj(name))[1]
+
+            for _ in range(3):
+                reader.load(model=MyModel())
+            assert len([name for name in reads if name.endswith('latest')]) == 1
+
+            # versions persisted by another repository are only seen by watchers
+            writer.persist(model=model, version='v2')
+            model_2 = MyModel()
+            reader.load(model=model_2)
+            assert model_2.version == 'v1'
+
+            changes = []
+            watcher = reader.watch(MyModel, changes.append, interval=0.05, current='v1')
+            try:
+                for _ in range(100):
+                    if changes:
+                        break
+                    time.sleep(0.05)
+            finally:
+                watcher.stop()
+
+            assert changes == ['v2']
+            reader.load(model=model_2)
+            assert model_2.version == 'v2'
+
+    def test_gc(self):
+        model = build_model()
+        with tempfile.TemporaryDirectory() as path:
+            storage = LocalStorage(storage_path=path)
+            mm = ModelRepository(storage=storage)
+            for i in range(6):
+                mm.persist(model=model, version=f'v{i}')
+            mm.tag(MyModel, 'v1', 'production')
+            mm.persist(model=model, version='v0')  # v0 is the latest version again
+
+            policy = RetentionPolicy(keep_last=2, keep_tags={'production'})
+            report = mm.gc(MyModel, policy, dry_run=True)
+            assert report['deleted'] == ['v2', 'v3', 'v4']
+            assert report['kept'] == ['v1', 'v5', 'v0']
+            assert report['reclaimed_bytes'] > 0
+            assert storage.exists(mm._get_key(MyModel, 'v2'))
+
+            assert mm.gc(MyModel, policy) == dict(report, dry_run=False)
+            assert not storage.exists(mm._get_key(MyModel, 'v2'))
+            assert [info['version'] for info in mm.list_versions(MyModel)] == report['kept']
+            assert mm.list_versions(MyModel)[0]['tags'] == ['production']
+
+            # everything is recent
+            assert mm.gc(MyModel, RetentionPolicy(keep_newer_than=timedelta(days=1)))['deleted'] == []
+
+            # blobs are collected once no manifest of any model refers to them
+            X, y = load_iris(return_X_y=True)
+            dedup = ModelRepository(storage=storage, dedup=True)
+            for i in range(3):
+                model.base_model = LogisticRegression(C=1.0 + i, max_iter=500).fit(X, y)
+                dedup.persist(model=model, version=f'd{i}')
+            other = MyBundle()
+            dedup.persist(model=other, version='d0')
+
+            policy = RetentionPolicy(keep_last=1)
+            assert dedup.gc(MyModel, policy, dry_run=True)['deleted_blobs'] == 0
+            with mock.patch.object(storage, 'get_bytes_many', side_effect=AssertionError):
+                report = dedup.gc(MyModel, policy, dry_run=True, collect_blobs=True)
+            assert report['deleted'] == ['v1', 'v5', 'v0', 'd0', 'd1']
+            # the models of d0 and d1, the other files are shared with d2 or MyBundle
+            assert report['deleted_blobs'] == 2
+            assert report['reclaimed_blob_bytes'] > 0
+            assert dedup.gc(MyModel, policy, collect_blobs=True) == dict(report, dry_run=False)
+            assert dedup.gc(MyModel, policy, collect_blobs=True)['deleted_blobs'] == 0
+            for loaded, version in [(MyModel(), 'd2'), (MyBundle(), 'd0')]:
+                dedup.load(loaded, version)
+            with pytest.raises(ValueError):
+                RetentionPolicy()
+
+    def test_gc_during_persist_async(self):
+        model = build_model()
+        with tempfile.TemporaryDirectory() as path:
+            mm = ModelRepository(storage=path, dedup=True)
+            for i in range(2):
+                mm.persist(model=MyBundle(), version=f'b{i}')
+
+            uploaded, release = threading.Event(), threading.Event()
+            upload_blob = mm._upload_blob
+
+            def slow_upload(*args):
+                upload_blob(*args)
+                uploaded.set()
+                release.wait(10)
+
+            with mock.patch.object(mm, '_upload_blob', side_effect=slow_upload), \
+                    ThreadPoolExecutor(max_workers=1) as pool:
+                future = mm.persist_async(model=model, version='a1')
+                assert uploaded.wait(10)
+                # the blobs of a1 are uploaded, its manifest is not written yet
+                gc = pool.submit(mm.gc, MyBundle, RetentionPolicy(keep_last=1), collect_blobs=True)
+                time.sleep(0.2)
+                assert not gc.done()
+                release.set()
+                assert gc.result(10)['deleted'] == ['b0']
+
+            assert future.result() == 'a1'
+            mm.load(MyModel(), 'a1')
+
+    def test_shared_store(self):
+        model = build_model()
+        with tempfile.TemporaryDirectory() as path, tempfile.TemporaryDirectory() as store_path:
+            mm = ModelRepository(storage=path, shared_store=store_path)
+            version = mm.persist(model=model)
+            key = mm._get_key(model, version)
+
+            loaded = MyModel()
+            mm.load(loaded, version)
+            assert isinstance(loaded.base_model.coef_, np.memmap)
+
+            spawn = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(max_workers=2, mp_context=spawn) as pool:
+                results = list(pool.map(_load_shared, [(path, store_path, version)] * 4))
+                pids = {pid for pid, _ in results}
+                # all workers map the folder extracted by the parent
+                assert {filename for _, filename in results} == {loaded.base_model.coef_.filename}
+                assert mm._shared_store.info()[key] == sorted(pids | {os.getpid()})
+
+            # the leases of the exited workers are dropped
+            assert mm._shared_store.cleanup() == []
+            assert mm._shared_store.info() == {key: [os.getpid()]}
+
+            # the version is removed with the last reference of the parent
+            mm.load(MyModel(), version)
+            mm.release(model, version)
+            assert os.path.exists(mm._shared_store.get_path(key))
+            mm.release(model, version)
+            assert not os.path.exists(mm._shared_store.get_path(key))
+            assert mm._shared_store.info() == {}
+            with self.assertRaises(KeyError):
+                mm.release(model, version)
+
+            # gc removes the deleted versions from the store
+            mm.load(MyModel(), version)
+            mm.persist(model=model)
+            mm.gc(MyModel, RetentionPolicy(keep_last=1))
+            assert not os.path.exists(mm._shared_store.get_path(key))
+
+    def test_shared_store_locks(self):
+        with tempfile.TemporaryDirectory() as store_path:
+            store = SharedModelStore(store_path)
+            extracting, done = threading.Event(), threading.Event()
+
+            def slow_fetch(target):
+                os.makedirs(target)
+                extracting.set()
+                assert done.wait(10)
+
+            with ThreadPoolExecutor(max_workers=1) as pool:
+                future = pool.submit(store.attach, 'model::v1', slow_fetch)
+                assert extracting.wait(10)
+                # other versions are attached while v1 is being extracted
+                store.attach('model::v2', os.makedirs)
+                assert store.list_keys() == ['model::v2']
+                done.set()
+                future.result()
+
+            assert sorted(store.info()) == ['model::v1', 'model::v2']
+            assert shared._is_alive(os.getpid())
+            process = multiprocessing.get_context('spawn').Process(target=time.sleep, args=(0,))
+            process.start()
+            process.join()
+            assert not shared._is_alive(process.pid)
@@ -0,0 +1,366 @@
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pytest
+from unittest import mock
+
+from h1st.model.repository.storage import pickling
+from h1st.model.repository.storage.caching import CachingStorage
+from h1st.model.repository.storage.fsspec_storage import FsspecStorage
+from h1st.model.repository.storage.local import LocalStorage
+from h1st.model.repository.storage.memory import MemoryStorage
+from h1st.model.repository.storage.tiered import Tier, TieredStorage
+
+
+def _read_through_cache(args):
+    backend_path, cache_dir, names = args
+    storage = CachingStorage(LocalStorage(backend_path), cache_dir, max_bytes=3 * 1024)
+    return [storage.get_bytes(name) == name.encode() * 128 for name in names]
+
+
+class TestCachingStorage:
+    def test_read_through(self):
+        with tempfile.TemporaryDirectory() as backend_path, \
+                tempfile.TemporaryDirectory() as cache_dir:
+            backend = LocalStorage(backend_path)
+            backend.set_bytes('model::v1', b'v1' * 100)
+            backend.set_obj('model::latest', 'v1')
+
+            storage = CachingStorage(backend, cache_dir, max_bytes=1024)
+            assert storage.get_obj('model::latest') == 'v1'
+            assert storage.get_bytes('model::v1') == b'v1' * 100
+            assert storage.get_bytes('model::v1') == b'v1' * 100
+            assert (storage.hits, storage.misses) == (1, 1)
+
+            # cached values survive the backend
+            backend.delete('model::v1')
+            assert storage.get_bytes('model::v1') == b'v1' * 100
+
+            storage.delete('model::v1')
+            with pytest.raises(KeyError):
+                storage.get_bytes('model::v1')
+
+    def test_eviction(self):
+        with tempfile.TemporaryDirectory() as backend_path, \
+                tempfile.TemporaryDirectory() as cache_dir:
+            storage = CachingStorage(LocalStorage(backend_path), cache_dir, max_bytes=250)
+            for i, version in enumerate(['v1', 'v2', 'v3']):
+                storage.set_bytes(f'model::{version}', b'x' * 100)
+                # v3 is written last, v1 is the least recently used
+                os.utime(storage._to_path(f'model::{version}'), (i, i))
+
+            cached = sorted(path for path, _, _ in storage._cached_files())
+            assert cached == [storage._to_path('model::v2'), storage._to_path('model::v3')]
+            assert storage.get_bytes('model::v1') == b'x' * 100
+
+    def test_shared_between_processes(self):
+        with tempfile.TemporaryDirectory() as backend_path, \
+                tempfile.TemporaryDirectory() as cache_dir:
+            backend = LocalStorage(backend_path)
+            names = [f'model::v{i}' for i in range(10)]
+            for name in names:
+                backend.set_bytes(name, name.encode() * 128)
+
+            with ProcessPoolExecutor(max_workers=4) as pool:
+                tasks = [(backend_path, cache_dir, names[i:] + names[:i]) for i in range(8)]
+                for result in pool.map(_read_through_cache, tasks):
+                    assert all(result)
+
+            size = sum(size for _, size, _ in CachingStorage(backend, cache_dir)._cached_files())
+            assert size <= 3 * 1024
+
+
+class TestFsspecStorage:
+    def test_storage(self):
+        with tempfile.TemporaryDirectory() as path:
+            for url in ['memory://test_fsspec_storage', 'file://' + path]:
+                storage = FsspecStorage(url)
+                storage.set_bytes('model::v1', b'v1')
+                storage.set_bytes('model::v2', b'v2')
+                storage.set_obj('model::latest', 'v2')
+
+                assert storage.get_obj('model::latest') == 'v2'
+                assert storage.get_bytes_many(['model::v2', 'model::v1']) == [b'v2', b'v1']
+                assert storage.exists_many(['model::v1', 'model::v3']) == [True, False]
+                assert storage.get_size_many(['model::v1', 'model::v2']) == [2, 2]
+                assert storage.list_keys('model') == ['latest', 'v1', 'v2']
+                with pytest.raises(KeyError):
+                    storage.get_bytes_many(['model::v1', 'model::v3'])
+                with pytest.raises(KeyError):
+                    storage.get_size('model::v3')
+
+                storage.delete('model::v1')
+                assert not storage.exists('model::v1')
+                storage.delete_namespace('model')
+                assert storage.list_keys('model') == []
+
+    def test_model_repository(self):
+        from sklearn.datasets import load_iris
+        from sklearn.linear_model import LogisticRegression
+
+        from h1st.model.ml_model import MLModel
+        from h1st.model.repository.model_repository import ModelRepository
+
+        class MyModel(MLModel):
+            pass
+
+        X, y = load_iris(return_X_y=True)
+        model = MyModel()
+        model.base_model = LogisticRegression(max_iter=500).fit(X, y)
+        for dedup in [False, True]:
+            mm = ModelRepository(storage='memory://test_fsspec_repository', dedup=dedup)
+            assert isinstance(mm._storage, FsspecStorage)
+            version = mm.persist(model)
+
+            model_2 = MyModel()
+            mm.load(model_2, version)
+            assert (model_2.base_model.predict(X) == model.base_model.predict(X)).all()
+
+
+class TestTieredStorage:
+    def test_read_promotion(self):
+        with tempfile.TemporaryDirectory() as backend_path, \
+                tempfile.TemporaryDirectory() as disk_path:
+            backend = LocalStorage(backend_path)
+            for i in range(4):
+                backend.set_bytes(f'model::v{i}', b'x' * 100)
+
+            storage = TieredStorage(backend, [
+                Tier(MemoryStorage(), max_bytes=200, name='memory'),
+                Tier(LocalStorage(disk_path), max_bytes=1000, name='disk'),
+            ])
+            for i in range(4):
+                assert storage.get_bytes(f'model::v{i}') == b'x' * 100
+
+            # v0 was evicted from memory but is still on disk
+            assert storage.get_bytes('model::v0') == b'x' * 100
+            memory, disk = storage.info()
+            assert (memory['hits'], memory['misses'], memory['evictions']) == (0, 5, 3)
+            assert (disk['hits'], disk['misses']) == (1, 4)
+            assert memory['size'] == 200
+
+            # promoted to memory
+            backend.delete('model::v0')
+            assert storage.get_bytes('model::v0') == b'x' * 100
+            assert storage.info()[0]['hits'] == 1
+
+    def test_write_back(self):
+        backend = MemoryStorage()
+        storage = TieredStorage(
+            backend, [Tier(MemoryStorage(), max_bytes=250)], write_back=True
+        )
+        storage.set_bytes('model::v1', b'1' * 100)
+        storage.set_bytes('model::v2', b'2' * 100)
+        assert not backend.exists('model::v1')
+        assert storage.exists('model::v1')
+
+        # evicting the only copy writes it to the backend
+        storage.set_bytes('model::v3', b'3' * 100)
+        assert backend.get_bytes('model::v1') == b'1' * 100
+        assert not backend.exists('model::v2')
+
+        storage.flush()
+        assert backend.get_bytes('model::v3') == b'3' * 100
+        assert storage.list_keys('model') == ['v1', 'v2', 'v3']
+
+        # pointers are written after the values they refer to
+        storage.set_bytes('model::v4', b'4' * 100)
+        storage.set_obj('model::latest', 'v4')
+        assert backend.get_bytes('model::v4') == b'4' * 100
+
+    def test_existing_values(self):
+        with tempfile.TemporaryDirectory() as disk_path:
+            disk = LocalStorage(disk_path)
+            for i in range(3):
+                disk.set_bytes(f'model::v{i}', b'x' * 100)
+                os.utime(disk._to_key(f'model::v{i}'), (i, i))
+
+            # values cached by a previous process count towards the budget
+            storage = TieredStorage(MemoryStorage(), [Tier(disk, max_bytes=250)])
+            assert storage.info()[0]['size'] == 200
+            assert not disk.exists('model::v0')
+            storage.set_bytes('model::v3', b'x' * 100)
+            assert disk.list_keys('model') == ['v2', 'v3']
+
+    def test_reads_during_tier_writes(self):
+        class SlowStorage(MemoryStorage):
+            def __init__(self):
+                super().__init__()
+                self.release = threading.Event()
+
+            def set_bytes(self, name, value):
+                if name != 'model::v0':
+                    assert self.release.wait(10)
+                super().set_bytes(name, value)
+
+        backend, tier = MemoryStorage(), SlowStorage()
+        backend.set_bytes('model::v1', b'1')
+        storage = TieredStorage(backend, [Tier(tier)])
+        storage.set_bytes('model::v0', b'0')
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            # caching v1 in the tier blocks, reading v0 does not
+            future = pool.submit(storage.get_bytes, 'model::v1')
+            assert storage.get_bytes('model::v0') == b'0'
+            tier.release.set()
+            assert future.result() == b'1'
+
+    def test_evictions_during_tier_writes(self):
+        class SlowStorage(MemoryStorage):
+            def __init__(self):
+                super().__init__()
+                self.slow = set()
+                self.writing, self.release = threading.Event(), threading.Event()
+
+            def set_bytes(self, name, value):
+                if name in self.slow:
+                    self.writing.set()
+                    assert self.release.wait(10)
+                super().set_bytes(name, value)
+
+        backend, tier = MemoryStorage(), SlowStorage()
+        storage = TieredStorage(backend, [Tier(tier, max_bytes=150)], write_back=True)
+        storage.set_bytes('model::v1', b'1' * 100)
+        tier.slow.add('model::v1')
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            future = pool.submit(storage.set_bytes, 'model::v1', b'n' * 100)
+            assert tier.writing.wait(10)
+            # evicts v1 while its new value is being written to the tier
+            storage.set_bytes('model::v2', b'2' * 100)
+            tier.release.set()
+            future.result()
+
+        storage.flush()
+        assert backend.get_bytes('model::v1') == b'n' * 100
+        assert backend.get_bytes('model::v2') == b'2' * 100
+        assert storage._dirty == {}
+
+        # a pending value lost from the tiers is not taken for written back
+        storage.set_bytes('model::v3', b'3' * 100)
+        tier.delete('model::v3')
+        with pytest.raises(IOError):
+            storage.flush()
+
+
+@pytest.fixture
+def s3_endpoint(monkeypatch):
+    server_module = pytest.importorskip('moto.server')
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+
+    server = server_module.ThreadedMotoServer(port=0, verbose=False)
+    server.start()
+    host, port = server.get_host_and_port()
+    yield f'http://{host}:{port}'
+    server.stop()
+
+
+class TestS3Storage:
+    def test_multipart_transfers(self, s3_endpoint):
+        from h1st.model.repository.storage.s3 import S3Storage
+
+        part_size = 5 * 2 ** 20
+        storage = S3Storage(
+            'models',
+            'repo',
+            part_size=part_size,
+            storage_options={'client_kwargs': {'endpoint_url': s3_endpoint}},
+        )
+        storage.fs.mkdir('models')
+
+        value = os.urandom(2 * part_size + 123)
+        storage.set_bytes('model::v1', value)
+        assert storage.fs.info('models/repo/model/v1')['ETag'].strip('"').endswith('-3')
+        assert storage.get_bytes('model::v1') == value
+
+        storage.set_bytes('model::v2', b'small')
+        storage.set_obj('model::latest', 'v2')
+        assert storage.get_bytes_many(['model::v2', 'model::v1']) == [b'small', value]
+        assert storage.get_size_many(['model::v2', 'model::v1']) == [5, len(value)]
+        assert storage.get_obj('model::latest') == 'v2'
+
+        # a reader configured with another part size downloads in different ranges
+        reader = S3Storage(
+            'models',
+            'repo',
+            part_size=part_size * 2,
+            storage_options={'client_kwargs': {'endpoint_url': s3_endpoint}},
+        )
+        with mock.patch.object(reader, '_verify', wraps=reader._verify) as verify, \
+                mock.patch.object(reader.fs, 'info', side_effect=AssertionError):
+            # verified with the part size of the upload, without a HEAD request
+            assert reader.get_bytes('model::v1') == value
+            assert verify.call_args[0][3] == part_size
+            with pytest.raises(IOError):
+                reader._verify('model::v1', value[:-1] + b'x', *verify.call_args[0][2:])
+
+            # ETags of SSE-KMS objects are not MD5 digests
+            bucket, key = storage._to_key('model::kms').split('/', 1)
+            storage.fs.call_s3(
+                'put_object', Bucket=bucket, Key=key, Body=b'kms', ServerSideEncryption='aws:kms'
+            )
+            verify.reset_mock()
+            assert reader.get_bytes('model::kms') == b'kms'
+            assert not verify.called
+
+        storage.set_bytes('model::empty', b'')
+        assert storage.get_bytes('model::empty') == b''
+        storage.delete_many(['model::kms', 'model::empty'])
+
+        with pytest.raises(IOError):
+            storage._verify('model::v2', b'corrupted', storage.fs.info('models/repo/model/v2')['ETag'])
+
+        assert storage.list_keys('model') == ['latest', 'v1', 'v2']
+        storage.delete_many(['model::v1', 'model::v2', 'model::v3'])
+        assert storage.list_keys('model') == ['latest']
+        storage.delete_namespace('model')
+        assert storage.list_keys('model') == []
+
+        errors = {'Errors': [{'Key': 'repo/model/v1', 'Code': 'AccessDenied'}]}
+        with mock.patch.object(storage.fs, 'call_s3', return_value=errors):
+            with pytest.raises(IOError):
+                storage.delete_many(['model::v1'])
+
+
+class TestLocalStorage:
+    def test_atomic_writes(self):
+        with tempfile.TemporaryDirectory() as path:
+            storage = LocalStorage(path)
+            storage.set_bytes('model::v1', b'v1')
+            umask = os.umask(0o022)
+            os.umask(umask)
+            # the permissions of a plain open, mkstemp creates owner-only files
+            assert os.stat(storage._to_key('model::v1')).st_mode & 0o777 == 0o666 & ~umask
+            assert storage.list_keys('model') == ['v1']
+
+
+class TestPickling:
+    def test_out_of_band_buffers(self):
+        import cloudpickle
+        import numpy as np
+
+        value = {'weights': np.arange(100000, dtype=np.float64), 'name': 'segment_1'}
+        with tempfile.TemporaryDirectory() as path:
+            for storage in [LocalStorage(path), MemoryStorage()]:
+                storage.set_obj('model::stats', value)
+                loaded = storage.get_obj('model::stats')
+                assert loaded['name'] == 'segment_1'
+                assert (loaded['weights'] == value['weights']).all()
+                # a view on the stored bytes, aligned for vectorized reads
+                assert not loaded['weights'].flags.owndata
+                assert loaded['weights'].ctypes.data % pickling.ALIGNMENT == 0
+                loaded['weights'][0] = -1
+                if isinstance(storage, LocalStorage):
+                    # the file is memory-mapped copy-on-write
+                    assert storage.get_obj('model::stats')['weights'][0] == 0
+
+            # values without out-of-band buffers are plain pickles
+            assert not pickling.dumps('v1').startswith(pickling.MAGIC)
+            assert pickling.loads(pickling.dumps('v1')) == 'v1'
+
+            # values written before the format existed
+            with open(os.path.join(path, 'model', 'legacy'), 'wb') as f:
+                cloudpickle.dump(value, f)
+            assert LocalStorage(path).get_obj('model::legacy')['name'] == 'segment_1'